@@ -0,0 +1,471 @@
+"""Many snakes on one shared board
+
+Arena runs N snakes under the engine's rules on one board. Apples,
+power-ups and obstacles are shared, and one occupancy grid counts the
+segments of every snake. A head that lands on a cell holding any other
+segment crashes, whether the segment is its own, another snake's body or
+another head. So a tick costs one lookup per moved head, however many
+snakes there are and however long they grow. All snakes move first, then
+collisions are resolved against the new positions. Two heads meeting on a
+cell, or passing through each other, both crash.
+
+Snake 0 is the player's, steered through step(action) as in Engine, unless
+the arena is all bots. More snakes can join() and leave() between steps;
+the ones not driven by bots are steered by whoever joined them (server.py).
+The others follow a greedy bot that heads for the
+nearest apple and avoids cells it would die on. Arena has the attributes
+main.Game reads from an Engine (snake, apple, score, power-up timers...),
+all about snake 0, so the front end plays an arena like a normal game.
+
+    python arena.py --snakes 200 --board 100x100 --ticks 5000    tick timings of an all-bot arena
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from array import array
+from collections import Counter
+
+import engine
+from engine import (Board, FreeCells, Snake, Apple, PowerUp, Obstacle, DEFAULT_BOARD, DIFFICULTIES, POWER_TYPES,
+                    OPPOSITE, STEPS, OUTSIDE, SIZE, EAT_APPLE, EAT_POWER_UP, CRASH)
+
+SNAKES_PER_APPLE = 4  # apples on the board when none are asked for: one per this many snakes
+TICKS = 5000
+
+# Crash causes counted in Arena.crashes
+WALL = "wall"
+OBSTACLE = "obstacle"
+BODY = "body"
+HEAD_ON = "head_on"
+
+class Player:
+    """A snake in the arena and the power-up effects on it"""
+    def __init__(self, snake, bot, id):
+        self.bot = bot
+        self.id = id  # stays the same when a crashed snake starts again
+        self.start(snake)
+
+    def start(self, snake):
+        self.snake = snake
+        self.alive = True
+        self.target = None  # bot: (apple, x, y) it is heading for
+        self.score_multiplier = 1
+        self.multiplier_timer = 0
+        self.speed_boost = 1.0
+        self.speed_boost_timer = 0
+        self.progress = 0  # ms of simulation time since the snake last walked
+
+    @property
+    def score(self):
+        return (self.snake.length - 2) * self.score_multiplier
+
+class Arena:
+    """snakes snakes on board, advanced together with step(action)"""
+    def __init__(self, snakes=2, difficulty=1, seed=None, board=None, apples=None, human=True, respawn=True):
+        self.difficulties = DIFFICULTIES
+        self.board = board or DEFAULT_BOARD
+        self.count = snakes
+        self.apple_count = apples or max(1, snakes // SNAKES_PER_APPLE)
+        self.human = human  # snake 0 is steered by step(action) rather than the bot
+        self.respawn = respawn  # crashed snakes other than the player's start again on a random free cell
+        self.reset(difficulty, seed)
+
+    def reset(self, difficulty=None, seed=None):
+        """Start a new game; a fresh random seed is drawn when none is given"""
+        if difficulty is not None:
+            self.difficulty = difficulty
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+
+        board = self.board
+        # Collision world: segment counts of every snake by cell, the apples, power-ups
+        # and obstacles by cell, and every cell none of them cover
+        self.grid = array('H', [0]) * board.size
+        self.items = {}
+        self.free = FreeCells(board.size)
+        self.apples = []
+        self.obstacles = []
+        self.power_ups = []
+        self.sim_time = 0
+        self.ticks = 0
+        self.power_up_timer = 0
+        self.over = False
+        self.read_rules()
+        self.moved = []  # players whose snake walked this tick
+        self.heads = set()  # cells of the live heads, for the bots to keep apart
+        self.crashes = Counter()  # cause -> crashes so far
+
+        # Snake 0 starts where the single-player snake does; obstacles and the
+        # other snakes keep out of its corner
+        self.players = []
+        self.next_id = 0
+        if self.count:
+            self.add_player(self.spawn(board.index(SIZE, SIZE), 'down'), not self.human)
+        safe = [i for i in board.safe_zone() if i in self.free]
+        for i in safe:
+            self.free.remove(i)
+        if self.difficulties[self.difficulty]["obstacles"]:
+            for _ in range(board.obstacles):
+                obstacle = Obstacle(0, 0)
+                if self.place(obstacle):
+                    self.obstacles.append(obstacle)
+        for _ in range(self.count - 1):
+            if not self.free:
+                break
+            self.add_player(self.spawn(self.free.choice(self.rng)), True)
+        for _ in range(self.apple_count):
+            apple = Apple()
+            if self.place(apple):
+                self.apples.append(apple)
+        for i in safe:
+            self.free.add(i)
+
+    def read_rules(self):
+        """Take this game's power-up rules from the engine module's constants"""
+        # Read per game so that tournament.py's overrides of the constants apply
+        self.spawn_interval = engine.SPAWN_INTERVAL
+        self.spawn_chance = engine.SPAWN_CHANCE
+        self.power_up_lifetime = engine.POWER_UP_LIFETIME
+        self.effect_time = engine.EFFECT_TIME
+
+    def spawn(self, i, direction=None):
+        """A new snake of length 2 on the free cell i, facing direction or else the longer way across the board"""
+        board = self.board
+        snake = Snake(2, board, self.grid, board.position(i))
+        self.free.remove(i)
+        if direction is None:
+            col, row = i % board.cols, i // board.cols
+            dx, dy = board.cols - 1 - 2*col, board.rows - 1 - 2*row
+            if abs(dx) > abs(dy):
+                direction = 'right' if dx > 0 else 'left'
+            else:
+                direction = 'down' if dy > 0 else 'up'
+        snake.direction = direction
+        return snake
+
+    def add_player(self, snake, bot):
+        player = Player(snake, bot, self.next_id)
+        self.next_id += 1
+        self.players.append(player)
+        return player
+
+    def join(self, bot=False):
+        """Add a snake on a random free cell; returns its Player, or None if the board is full"""
+        if not self.free:
+            return None
+        return self.add_player(self.spawn(self.free.choice(self.rng)), bot)
+
+    def leave(self, player):
+        """Take player's snake off the board for good"""
+        if player.alive:
+            self.kill(player)
+        self.players.remove(player)
+
+    def take(self, item):
+        """Register item on its cell"""
+        i = self.board.index(item.x, item.y)
+        self.items[i] = item
+        self.free.remove(i)
+
+    def place(self, item):
+        """Move item to a uniformly random free cell; False if the board is full"""
+        if not self.free:
+            return False
+        item.x, item.y = self.board.position(self.free.choice(self.rng))
+        self.take(item)
+        return True
+
+    def release(self, i):
+        """Give cell i back to the free set if nothing covers it any more"""
+        if i not in self.items and not self.grid[i]:
+            self.free.add(i)
+
+    def remove_item(self, item):
+        i = self.board.index(item.x, item.y)
+        del self.items[i]
+        self.release(i)
+
+    # What main.Game reads from an Engine, about snake 0
+    @property
+    def snake(self):
+        return self.players[0].snake
+
+    @property
+    def snakes(self):
+        """Snake 0 (even after it crashed) and every live bot"""
+        return [self.players[0].snake] + [p.snake for p in self.players[1:] if p.alive]
+
+    @property
+    def apple(self):
+        return self.apples[0]
+
+    @property
+    def score(self):
+        return self.players[0].score
+
+    @property
+    def score_multiplier(self):
+        return self.players[0].score_multiplier
+
+    @property
+    def multiplier_timer(self):
+        return self.players[0].multiplier_timer
+
+    @property
+    def speed_boost(self):
+        return self.players[0].speed_boost
+
+    @property
+    def speed_boost_timer(self):
+        return self.players[0].speed_boost_timer
+
+    def step_time(self):
+        """Length of one simulation step in ms: the step of the fastest live snake
+
+        A snake's step is the difficulty's speed times its speed boost, as in
+        Engine, so while one has the speed power-up the arena takes shorter
+        steps and the others only walk once a step of their own has passed.
+        """
+        boost = min((player.speed_boost for player in self.players if player.alive), default=1.0)
+        return round(self.difficulties[self.difficulty]["speed"] * boost * 1000)
+
+    def step(self, action=None):
+        """Turn snake 0 towards action, let the bots choose, and advance every snake one step
+
+        Returns the events (EAT_APPLE, EAT_POWER_UP, CRASH) that happened to snake 0.
+        """
+        if self.over:
+            return []
+        if action is not None and self.human and self.players[0].alive:
+            getattr(self.players[0].snake, "move_" + action)()
+        bots = [player for player in self.players if player.alive and player.bot]
+        if bots:
+            self.heads = {player.snake.cells[0] for player in self.players if player.alive}
+            for player in bots:
+                self.steer(player)
+
+        step = self.step_time()
+        self.sim_time += step
+        self.ticks += 1
+        self.walk(step)
+        self.spawn_power_up()
+        self.update_power_ups(step)
+        events = self.handle_collisions()
+        if self.human and not self.players[0].alive:
+            self.over = True
+        elif not self.human and not self.respawn and not any(p.alive for p in self.players):
+            self.over = True
+        return events
+
+    def walk(self, step):
+        free = self.free
+        speed = self.difficulties[self.difficulty]["speed"]
+        self.moved = []
+        for player in self.players:
+            if not player.alive:
+                continue
+            player.progress += step
+            own = round(speed * player.speed_boost * 1000)
+            if player.progress < own:
+                continue
+            player.progress -= own
+            tail = player.snake.walk()
+            head = player.snake.cells[0]
+            if head != OUTSIDE:
+                free.remove(head)
+            if tail is not None:
+                self.release(tail)
+            self.moved.append(player)
+
+    def spawn_power_up(self):
+        """Randomly spawn power-ups"""
+        if self.sim_time - self.power_up_timer > self.spawn_interval:
+            if self.rng.random() < self.spawn_chance:
+                power_up = PowerUp(self.rng.choice(POWER_TYPES), self.sim_time)
+                power_up.lifetime = self.power_up_lifetime
+                if self.place(power_up):
+                    self.power_ups.append(power_up)
+            self.power_up_timer = self.sim_time
+
+    def update_power_ups(self, step):
+        """Remove expired power-ups and run down every snake's effects"""
+        for power_up in [pu for pu in self.power_ups if pu.is_expired(self.sim_time)]:
+            self.power_ups.remove(power_up)
+            self.remove_item(power_up)
+
+        for player in self.players:
+            if player.speed_boost_timer > 0:
+                player.speed_boost_timer -= step
+                if player.speed_boost_timer <= 0:
+                    player.speed_boost = 1.0
+            if player.multiplier_timer > 0:
+                player.multiplier_timer -= step
+                if player.multiplier_timer <= 0:
+                    player.score_multiplier = 1
+
+    def handle_collisions(self):
+        items = self.items
+        first = self.players[0] if self.human else None
+        heads = Counter(player.snake.cells[0] for player in self.moved)
+
+        # Every snake that moved is checked against the board as it is after all of them moved
+        crashed = []
+        for player in self.moved:
+            i = player.snake.cells[0]
+            if i == OUTSIDE:
+                cause = WALL
+            elif isinstance(items.get(i), Obstacle):
+                cause = OBSTACLE
+            elif heads[i] > 1:
+                cause = HEAD_ON
+            # With the shared grid this counts the other snakes' segments too
+            elif player.snake.bites_itself():
+                cause = BODY
+            else:
+                continue
+            crashed.append(player)
+            self.crashes[cause] += 1
+        for player in crashed:
+            self.kill(player)
+
+        events = [CRASH] if first in crashed else []
+        for player in self.moved:
+            if not player.alive:
+                continue
+            i = player.snake.cells[0]
+            item = items.get(i)
+            if isinstance(item, Apple):
+                player.snake.increase_length()
+                # The head covers the old cell, so the apple just moves to a free one
+                del items[i]
+                if not self.place(item):
+                    self.take(item)
+                if player is first:
+                    events.append(EAT_APPLE)
+            elif isinstance(item, PowerUp):
+                if item.power_type == 'double':
+                    player.score_multiplier = 2
+                    player.multiplier_timer = self.effect_time
+                elif item.power_type == 'shrink':
+                    tail = player.snake.decrease_length()
+                    if tail is not None:
+                        self.release(tail)
+                elif item.power_type == 'speed':
+                    player.speed_boost = 0.5  # as in Engine: half the step, so twice as fast
+                    player.speed_boost_timer = self.effect_time
+                self.power_ups.remove(item)
+                self.remove_item(item)
+                if player is first:
+                    events.append(EAT_POWER_UP)
+
+        if self.respawn:
+            # Snakes that found no free cell before try again on every step
+            for player in self.players:
+                if not player.alive and player is not first:
+                    self.revive(player)
+        return events
+
+    def kill(self, player):
+        """Take a crashed snake off the grid; its body stays for drawing"""
+        player.alive = False
+        grid = self.grid
+        for i in player.snake.cells:
+            if i != OUTSIDE:
+                grid[i] -= 1
+                self.release(i)
+
+    def revive(self, player):
+        """Start a crashed bot again as a new snake on a random free cell"""
+        if not self.free:
+            return
+        player.start(self.spawn(self.free.choice(self.rng)))
+
+    def steer(self, player):
+        """Turn a bot towards its apple, avoiding the cells it would crash on"""
+        snake = player.snake
+        target = player.target
+        if target is None or (target[0].x, target[0].y) != target[1:]:
+            target = player.target = self.nearest_apple(*snake.head)
+        if target is None:
+            return
+        cols, rows = self.board.cols, self.board.rows
+        heads, items, grid = self.heads, self.items, self.grid
+        col, row = snake.head[0] // SIZE, snake.head[1] // SIZE
+        goal_col, goal_row = target[1] // SIZE, target[2] // SIZE
+        tail = snake.cells[-1] if not snake.growth else None
+        best = None
+        for action, (dc, dr) in STEPS.items():
+            if action == OPPOSITE[snake.direction]:
+                continue
+            c, r = col + dc, row + dr
+            if not (0 <= c < cols and 0 <= r < rows):
+                continue
+            j = r*cols + c
+            # Its own tail moves out of the way unless it is growing
+            if isinstance(items.get(j), Obstacle) or grid[j] and j != tail:
+                continue
+            # A cell another head could also move into risks a head-on crash
+            contested = ((c > 0 and j - 1 in heads) + (c < cols - 1 and j + 1 in heads) +
+                         (r > 0 and j - cols in heads) + (r < rows - 1 and j + cols in heads)) > 1
+            rank = (contested, abs(goal_col - c) + abs(goal_row - r), action != snake.direction)
+            if best is None or rank < best[0]:
+                best = (rank, action)
+        if best is not None:
+            getattr(snake, "move_" + best[1])()
+
+    def nearest_apple(self, x, y):
+        best, nearest = None, None
+        for apple in self.apples:
+            distance = abs(apple.x - x) + abs(apple.y - y)
+            if best is None or distance < best:
+                best, nearest = distance, apple
+        return (nearest, nearest.x, nearest.y) if nearest is not None else None
+
+def board_size(text):
+    cols, _, rows = text.lower().partition("x")
+    try:
+        return Board(int(cols), int(rows))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"bad board size {text!r}: {e}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time an arena of bot snakes stepped headless")
+    parser.add_argument("--snakes", type=int, default=100)
+    parser.add_argument("--board", type=board_size, default=Board(100, 100), metavar="COLSxROWS")
+    parser.add_argument("--difficulty", type=int, choices=sorted(DIFFICULTIES), default=1)
+    parser.add_argument("--apples", type=int, default=None, help=f"default: one per {SNAKES_PER_APPLE} snakes")
+    parser.add_argument("--ticks", type=int, default=TICKS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-respawn", action="store_true", help="crashed snakes stay out")
+    args = parser.parse_args(argv)
+
+    arena = Arena(args.snakes, args.difficulty, args.seed, args.board, args.apples, human=False,
+                  respawn=not args.no_respawn)
+    times = []
+    alive = 0
+    for _ in range(args.ticks):
+        if arena.over:
+            break
+        start = time.perf_counter()
+        arena.step()
+        times.append(time.perf_counter() - start)
+        alive += sum(p.alive for p in arena.players)
+    times.sort()
+    total = sum(times)
+    print(json.dumps({
+        "snakes": args.snakes,
+        "board": [arena.board.cols, arena.board.rows],
+        "ticks": len(times),
+        "ticks_per_sec": round(len(times) / total, 1) if total else None,
+        "p50_ms": round(times[len(times) // 2] * 1000, 3) if times else None,
+        "p99_ms": round(times[int(len(times) * 0.99)] * 1000, 3) if times else None,
+        "mean_alive": round(alive / len(times), 1) if times else 0,
+        "longest": max(p.snake.length for p in arena.players),
+        "crashes": dict(arena.crashes),
+    }, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
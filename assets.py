@@ -0,0 +1,83 @@
+import os
+import threading
+
+import pygame
+
+RESOURCES = "Snake_Apple_Game/resources"
+
+class Assets:
+    """Decodes each image and sound under resources/ once and hands out the cached copies
+
+    Images may be decoded ahead of time on another thread (decode), but they are
+    converted to the display format only by image(), on the thread that draws.
+    The caches are shared by both threads and guarded by lock.
+    """
+    def __init__(self, root=RESOURCES):
+        self.root = root
+        self.lock = threading.Lock()
+        self.decoded = {}  # name -> surface as loaded, not yet converted
+        self.images = {}  # (name, size) -> converted surface
+        self.sounds = {}  # name -> pygame.mixer.Sound
+        self.solids = {}  # (color, size) -> converted surface filled with color
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def image(self, name, size=None):
+        """Return the image converted to the display format, scaled to size if given"""
+        key = (name, size)
+        with self.lock:
+            surface = self.images.get(key)
+            if surface is not None:
+                return surface
+            loaded = self.decoded.pop(name, None) if size is None else None
+        if size is None:
+            if loaded is None:
+                loaded = pygame.image.load(self.path(name))
+            surface = loaded.convert()
+        else:
+            surface = pygame.transform.scale(self.image(name), size)
+        with self.lock:
+            self.decoded.pop(name, None)  # the loader may have finished it meanwhile
+            return self.images.setdefault(key, surface)
+
+    def solid(self, color, size):
+        """Return a surface of size filled with color, in the display format, shared by every caller"""
+        key = (color, size)
+        surface = self.solids.get(key)
+        if surface is None:
+            surface = pygame.Surface(size).convert()
+            surface.fill(color)
+            self.solids[key] = surface
+        return surface
+
+    def sound(self, name):
+        """Return the decoded sound, loading it on first use"""
+        with self.lock:
+            sound = self.sounds.get(name)
+        if sound is None:
+            sound = pygame.mixer.Sound(self.path(name))
+            with self.lock:
+                sound = self.sounds.setdefault(name, sound)
+        return sound
+
+    def decode(self, names):
+        """Load the named images ahead of their first image() call, without converting them
+
+        Safe to run off the main thread: image() does the conversion when the game asks.
+        """
+        for name in names:
+            if self.cached(name):
+                continue
+            try:
+                surface = pygame.image.load(self.path(name))
+            except (pygame.error, OSError):
+                print(f"Could not load {self.path(name)}")
+                continue
+            with self.lock:
+                if (name, None) not in self.images:
+                    self.decoded.setdefault(name, surface)
+
+    def cached(self, name):
+        with self.lock:
+            return name in self.decoded or (name, None) in self.images
@@ -0,0 +1,114 @@
+"""Sound effects and music with preloaded sounds and a channel per effect category
+
+Effects are decoded into pygame.mixer.Sound objects by open(), which main.py
+runs on its loader thread at startup, never while a game is running. Each category (eat, power-up, crash) owns a
+reserved mixer channel, so an effect never waits for or steals a free
+channel, and a new effect replaces the one still playing in its category.
+play() only queues a category; flush() runs once per frame and starts only
+the highest-priority effect queued since the last one, so a burst of effects
+within a frame plays once, and an effect repeated sooner than its minimum
+interval is dropped.
+
+Until open() has finished, and for good when the mixer can't be opened (no
+audio device, SDL built without sound) or audio is switched off, Audio runs in
+no-audio mode and every call does nothing.
+"""
+import time
+
+import pygame
+
+FREQUENCY = 44100  # Hz
+BUFFER = 512  # samples per mixer callback: smaller is lower latency, larger is more robust
+MUSIC = "bg.mp3"
+
+# category -> (sound file, priority, min ms between two plays, volume)
+EFFECTS = {
+    "eat": ("ding-sound-effect_2.mp3", 0, 60, 1.0),
+    "power_up": ("ding-sound-effect_2.mp3", 1, 60, 1.0),
+    "crash": ("Crash.mp3", 2, 250, 1.0),
+}
+
+class Audio:
+    def __init__(self, assets, enabled=True, frequency=FREQUENCY, buffer=BUFFER):
+        self.assets = assets
+        self.wanted = enabled
+        self.frequency = frequency
+        self.buffer = buffer
+        self.enabled = False
+        self.channels = {}  # category -> reserved pygame.mixer.Channel
+        self.sounds = {}  # category -> pygame.mixer.Sound
+        self.pending = set()  # categories queued since the last flush
+        self.last_played = {}  # category -> ms of the last play
+        self.music_paused = False  # paused before the music started counts too
+
+    def open(self):
+        """Open the mixer, reserve a channel per category and decode the effects"""
+        if not self.wanted:
+            return
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init(self.frequency, -16, 2, self.buffer)
+        except pygame.error as e:
+            print(f"Audio initialization failed ({e}) - continuing without sound")
+            return
+
+        pygame.mixer.set_reserved(len(EFFECTS))
+        channels, sounds = {}, {}
+        for channel, (category, (name, priority, interval, volume)) in enumerate(EFFECTS.items()):
+            channels[category] = pygame.mixer.Channel(channel)
+            try:
+                sound = self.assets.sound(name)
+            except (pygame.error, OSError):
+                print(f"Could not load {self.assets.path(name)}")
+                continue
+            sound.set_volume(volume)
+            sounds[category] = sound
+        self.channels, self.sounds = channels, sounds
+        self.enabled = True
+
+    def play(self, category):
+        """Queue the effect of category for the next flush"""
+        if self.enabled:
+            self.pending.add(category)
+
+    def flush(self, now=None):
+        """Start the most important effect queued since the last flush"""
+        if not self.pending:
+            return
+        # Not pygame.time.get_ticks(): the timer only runs after pygame.init(), which the game skips
+        now = time.monotonic() * 1000 if now is None else now
+        for category in sorted(self.pending, key=lambda c: -EFFECTS[c][1]):
+            name, priority, interval, volume = EFFECTS[category]
+            sound = self.sounds.get(category)
+            if sound is None or now - self.last_played.get(category, -interval) < interval:
+                continue
+            # A more important effect cuts the lesser ones short
+            for other, channel in self.channels.items():
+                if EFFECTS[other][1] < priority and channel.get_busy():
+                    channel.fadeout(50)
+            self.channels[category].play(sound)
+            self.last_played[category] = now
+            break
+        self.pending.clear()
+
+    def play_music(self, name=MUSIC):
+        if not self.enabled:
+            return
+        try:
+            pygame.mixer.music.load(self.assets.path(name))
+        except pygame.error:
+            print(f"Could not load {self.assets.path(name)}")
+            return
+        pygame.mixer.music.play(-1)  # Play indefinitely
+        if self.music_paused:
+            pygame.mixer.music.pause()
+
+    def pause_music(self):
+        self.music_paused = True
+        if self.enabled:
+            pygame.mixer.music.pause()
+
+    def unpause_music(self):
+        self.music_paused = False
+        if self.enabled:
+            pygame.mixer.music.unpause()
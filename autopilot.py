@@ -0,0 +1,306 @@
+"""A pathfinding autopilot for the snake
+
+Autopilot plans a shortest path from the head to the apple or a wanted
+power-up with an A* search over the board cells, guided by the distance to
+the nearest target and stopped as soon as one is reached. The search is
+time-aware: a body segment k places from the head leaves its cell after
+len(body) - k (+ pending growth) steps, so a cell counts as passable if the
+tail will have left it by the time the head gets there. A path is only taken
+if, once the snake has eaten at the end of it, its tail would still be
+reachable, checked by another A* search that gives up after BUDGET cells,
+as that much room will do as well; otherwise the snake follows its own
+tail, or as a last resort turns towards the largest open area, counted up
+to BUDGET cells.
+
+action() runs inside a simulation step, so every search is bounded: those
+for a target and for the tail share BUDGET expanded cells per call, and each
+safety check or room count stops at BUDGET cells too. A target too far to
+reach within the budget is approached by the path to the cell that got
+closest, and the search carries on from there once the snake has walked it.
+Ties between equally promising cells go to the one found first, which plays
+like a breadth-first search.
+
+A plan is kept across ticks and followed one cell per step for as long as its
+target is still there and the next cell is clear, so a search runs roughly
+once per apple rather than on every tick. While chasing its tail the snake
+takes one step at a time, and only looks for a safe target again every RETRY
+steps. The search buffers are allocated once and reused, marked with a stamp
+per search instead of being cleared, and obstacles are looked up in a
+bytearray per game. On large boards the neighbours of a cell are worked out
+when the search reaches it instead of being tabulated.
+
+With other snakes on the board (arena.Arena), their segments block the
+search wherever they are when it runs.
+
+The returned actions are what Engine.step(action) feeds to the snake's
+move_up/move_down/move_left/move_right.
+"""
+from array import array
+from collections import deque
+from heapq import heappush, heappop
+
+from engine import PowerUp, OUTSIDE
+
+WANTED = ('double', 'speed')  # power-ups worth a detour; shrinking costs score
+RETRY = 4  # steps of tail chasing between searches for a safe target
+TABLE_CELLS = 10000  # boards up to this many cells get a precomputed neighbour table
+BUDGET = 2000  # cells the searches of one action() call may expand, a few ms of Python
+
+class Neighbours:
+    """(cell, action) pairs next to a board cell, indexed by cell"""
+    def __init__(self, board):
+        self.cols = board.cols
+        self.rows = board.rows
+
+    def __getitem__(self, i):
+        cols = self.cols
+        col, row = i % cols, i // cols
+        cells = []
+        if row > 0:
+            cells.append((i - cols, 'up'))
+        if row < self.rows - 1:
+            cells.append((i + cols, 'down'))
+        if col > 0:
+            cells.append((i - 1, 'left'))
+        if col < cols - 1:
+            cells.append((i + 1, 'right'))
+        return cells
+
+def neighbours(board):
+    """Neighbour lookup for board: a table when it is small, Neighbours otherwise"""
+    lookup = Neighbours(board)
+    if board.size > TABLE_CELLS:
+        return lookup
+    return [lookup[i] for i in range(board.size)]
+
+def free_times(body, growth):
+    """Steps until each cell of body is vacated (the latest segment on a cell decides)"""
+    times = {}
+    length = len(body)
+    for k in range(length - 1, -1, -1):
+        times[body[k]] = length - k + growth
+    return times
+
+class Autopilot:
+    """Chooses the snake's next action for an engine"""
+    def __init__(self, engine, wanted=WANTED, budget=BUDGET):
+        self.engine = engine
+        self.wanted = wanted
+        self.budget = budget
+        self.board = engine.board
+        self.neighbours = neighbours(self.board)
+        size = self.board.size
+        self.stamp = 0
+        self.seen = array('i', [0]) * size
+        self.dist = array('i', [0]) * size
+        self.parent = array('i', [0]) * size
+        self.walls = bytearray(size)  # 1 on the cells of the game's obstacles
+        self.snake = None
+        self.path = deque()  # (cell, action) still to follow
+        self.target = None  # (cell, item) the path leads to
+        self.chase = 0  # tail-chasing steps left before looking for targets again
+        self.blocked = set()  # cells of the other snakes when planning
+        self.left = 0  # cells the searches of this call may still expand
+        self.closest = None  # cell nearest the goals reached by the last search
+        self.expanded = 0  # cells the last search expanded
+        self.searches = 0
+
+    def action(self):
+        """The action for the next step, or None to keep going"""
+        engine = self.engine
+        snake = engine.snake
+        if snake is not self.snake:  # a new game
+            self.snake = snake
+            self.path.clear()
+            self.walls = bytearray(self.board.size)
+            for obstacle in engine.obstacles:
+                self.walls[self.board.index(obstacle.x, obstacle.y)] = 1
+        head = snake.cells[0]
+        if head == OUTSIDE:
+            return None
+
+        if self.path and self.following(head):
+            return self.path.popleft()[1]
+        self.path.clear()
+        self.left = self.budget
+        self.plan(head)
+        if self.path:
+            return self.path.popleft()[1]
+        return None
+
+    def following(self, head):
+        """Whether the current plan still holds: target in place, next cell adjacent and clear"""
+        cell, item = self.target
+        if self.engine.items.get(cell) is not item:
+            return False
+        step = self.path[0][0]
+        if all(j != step for j, _ in self.neighbours[head]):
+            return False
+        return self.clear(step)
+
+    def clear(self, i):
+        """Whether the head can enter cell i on the next step"""
+        snake = self.engine.snake
+        if self.walls[i]:
+            return False
+        occupied = snake.grid[i]
+        if occupied and not snake.growth and snake.cells[-1] == i:
+            occupied -= 1  # the tail moves out of the way
+        return occupied == 0
+
+    def plan(self, head):
+        engine = self.engine
+        snake = engine.snake
+        index = self.board.index
+        body = list(snake.cells)
+        self.blocked = {i for other in engine.snakes if other is not snake for i in other.cells}
+        times = free_times(body, snake.growth)
+
+        goals = {}
+        chasing = self.chase > 0
+        if chasing:
+            self.chase -= 1
+        else:
+            goals[index(engine.apple.x, engine.apple.y)] = engine.apple
+            for power_up in engine.power_ups:
+                if power_up.power_type in self.wanted:
+                    goals[index(power_up.x, power_up.y)] = power_up
+
+        # Nearest target first; the search stops at the first one it reaches
+        while goals and self.left > 0:
+            goal = self.search(head, times, goals, self.left)
+            self.left -= self.expanded
+            if goal is not None:
+                item = goals.pop(goal)
+            elif self.closest != head and self.left <= 0:
+                # Out of budget: walk towards the goals and search again from there
+                goal, item = self.closest, None
+            else:
+                break
+            path = self.trace(head, goal)
+            if self.survives(body, snake.growth, path, item):
+                self.path.extend(path)
+                self.target = (goal, item) if item is not None else (goal, engine.items.get(goal))
+                return
+            if item is None:
+                break
+
+        # No safe target: chase the tail, which keeps moving out of the way
+        tail = body[-1]
+        found = tail != head and self.search(head, times, {tail: None}, self.left) is not None
+        self.left -= self.expanded
+        if found:
+            self.path.append(self.trace(head, tail)[0])
+            self.target = (tail, engine.items.get(tail))
+            if not chasing:
+                self.chase = RETRY
+            return
+
+        # Trapped: head for the largest space left
+        best, best_room = None, -1
+        for j, action in self.neighbours[head]:
+            if times.get(j, 0) <= 1 and j not in self.blocked and not self.walls[j]:
+                room = self.room(j, times, self.budget, start_time=1)
+                if room > best_room:
+                    best, best_room = (j, action), room
+        if best is not None:
+            self.path.append(best)
+            self.target = (best[0], engine.items.get(best[0]))
+
+    def search(self, start, times, goals, limit):
+        """A* search from start over cells free by the time the head reaches them
+
+        Returns the first cell of goals reached, or None if none is reachable
+        within limit expanded cells; either way closest is the cell reached that
+        is nearest the goals, which trace() can find the way to, and expanded
+        the number of cells expanded.
+        """
+        self.searches += 1
+        self.stamp += 1
+        stamp, seen, dist, parent = self.stamp, self.seen, self.dist, self.parent
+        neighbours, walls, blocked = self.neighbours, self.walls, self.blocked
+        cols = self.board.cols
+        targets = [(goal % cols, goal // cols) for goal in goals]
+
+        def estimate(i):
+            col, row = i % cols, i // cols
+            return min(abs(col - x) + abs(row - y) for x, y in targets)
+
+        seen[start] = stamp
+        dist[start] = 0
+        closest, nearest = start, estimate(start)
+        heap = [(nearest, 0, start)]
+        found = None
+        expanded = 0
+        while heap and expanded < limit:
+            i = heappop(heap)[2]
+            expanded += 1
+            d = dist[i] + 1
+            for j, _ in neighbours[i]:
+                if seen[j] == stamp or walls[j] or times.get(j, 0) > d or j in blocked:
+                    continue
+                seen[j] = stamp
+                dist[j] = d
+                parent[j] = i
+                if j in goals:
+                    found = closest = j
+                    heap = None
+                    break
+                h = estimate(j)
+                if h < nearest:
+                    closest, nearest = j, h
+                heappush(heap, (d + h, expanded, j))
+            if found is not None:
+                break
+        self.closest = closest
+        self.expanded = expanded
+        return found
+
+    def room(self, start, times, limit, start_time=0):
+        """Cells reachable from start by the time the head gets there, counted up to limit"""
+        self.searches += 1
+        self.stamp += 1
+        stamp, seen, dist = self.stamp, self.seen, self.dist
+        neighbours, walls, blocked = self.neighbours, self.walls, self.blocked
+        seen[start] = stamp
+        dist[start] = start_time
+        queue = deque([start])
+        reached = 1
+        while queue and reached < limit:
+            i = queue.popleft()
+            d = dist[i] + 1
+            for j, _ in neighbours[i]:
+                if seen[j] == stamp or walls[j] or times.get(j, 0) > d or j in blocked:
+                    continue
+                seen[j] = stamp
+                dist[j] = d
+                queue.append(j)
+                reached += 1
+        return min(reached, limit)
+
+    def trace(self, start, goal):
+        """(cell, action) steps from start to goal found by the last search"""
+        path = []
+        i = goal
+        while i != start:
+            previous = self.parent[i]
+            path.append((i, next(action for j, action in self.neighbours[previous] if j == i)))
+            i = previous
+        path.reverse()
+        return path
+
+    def survives(self, body, growth, path, item):
+        """Whether, after following path and eating item, the tail is reachable or the snake has room"""
+        steps = len(path)
+        length = len(body) + min(growth, steps)
+        after = ([cell for cell, _ in reversed(path)] + body)[:length]
+        growth = max(0, growth - steps) + (item is self.engine.apple)
+        if isinstance(item, PowerUp) and item.power_type == 'shrink':
+            after = after[:max(2, length - 1)]
+        times = free_times(after, growth)
+        tail = after[-1]
+        if tail == after[0]:
+            return True
+        # The tail is usually found within a few cells; a search that runs out of cells
+        # without finding it has at least that much room, which will do as well
+        return self.search(after[0], times, {tail: None}, self.budget) is not None or self.expanded >= self.budget
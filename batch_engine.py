@@ -0,0 +1,275 @@
+"""Many independent Snake games advanced together with NumPy
+
+BatchEngine keeps N games in arrays (a per-game board of body entry ticks,
+head positions, lengths, timers) and advances every running game with one
+vectorized step(actions) call. The rules mirror engine.Engine; only the RNG
+stream differs, so results match statistically rather than seed-for-seed.
+
+A snake body is stored as the tick at which the head entered each cell:
+segment i of a snake on tick t sits in the cell entered on tick t - i, so a
+cell is part of the body while t - entered < length. Moving, growing and
+shrinking are then O(1) per game and no body list is ever shifted. Only a
+cell's latest visit is kept, so after a turn straight back onto the neck
+(which the front end's input queue never sends) a bite on a cell the body
+covers twice can go unnoticed.
+"""
+import numpy as np
+
+import engine
+from engine import COLS, ROWS, SAFE_ZONE, DIFFICULTIES, POWER_TYPES, ACTIONS
+
+# Direction deltas in ACTIONS order: up, down, left, right
+DELTAS = np.array([(0, -1), (0, 1), (-1, 0), (1, 0)], dtype=np.int64)
+NO_ACTION = -1
+
+NEVER = -(2**30)
+
+# Board codes returned by BatchEngine.board, then one code per power-up type in POWER_TYPES order
+EMPTY, BODY, HEAD, APPLE, OBSTACLE = range(5)
+DOUBLE, SHRINK, SPEED = POWER_UPS = range(5, 5 + len(POWER_TYPES))
+
+def _step_times():
+    """Step length in ms for each difficulty, without and with the speed power-up"""
+    table = np.zeros((len(DIFFICULTIES), 2), dtype=np.int64)
+    for difficulty, settings in DIFFICULTIES.items():
+        table[difficulty, 0] = round(settings["speed"] * 1.0 * 1000)
+        table[difficulty, 1] = round(settings["speed"] * 0.5 * 1000)
+    return table
+
+STEP_TIMES = _step_times()
+HAS_OBSTACLES = np.array([DIFFICULTIES[d]["obstacles"] for d in sorted(DIFFICULTIES)])
+
+# Obstacles keep out of the top-left corner the snake starts in
+OBSTACLE_CELLS = np.ones((ROWS, COLS), dtype=bool)
+OBSTACLE_CELLS[:SAFE_ZONE, :] = False
+OBSTACLE_CELLS[:, :SAFE_ZONE] = False
+
+class BatchEngine:
+    """N games of Snake, advanced together with step(actions)
+
+    difficulty is a single difficulty index or one per game. Games that crash
+    stop advancing until reset() is called for them. rules overrides engine's
+    power-up balance constants by name (SPAWN_INTERVAL, SPAWN_CHANCE,
+    POWER_UP_LIFETIME, EFFECT_TIME) for these games.
+    """
+    def __init__(self, n, difficulty=1, seed=None, rules=None):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.read_rules(rules or {})
+        self.difficulty = np.broadcast_to(np.asarray(difficulty, dtype=np.int64), (n,)).copy()
+
+        self.body = np.full((n, ROWS, COLS), NEVER, dtype=np.int32)
+        self.obstacles = np.zeros((n, ROWS, COLS), dtype=bool)
+        self.head = np.zeros((n, 2), dtype=np.int64)  # (col, row)
+        self.direction = np.zeros(n, dtype=np.int64)
+        self.length = np.zeros(n, dtype=np.int64)
+        self.ticks = np.zeros(n, dtype=np.int64)
+        self.sim_time = np.zeros(n, dtype=np.int64)
+        self.apple = np.zeros((n, 2), dtype=np.int64)
+
+        # Power-ups spawn every 15 s and live 10 s, so a game never holds more than one at a time
+        # (a spawn replaces the last one under rules that let them overlap)
+        self.power_up = np.zeros((n, 2), dtype=np.int64)
+        self.power_up_type = np.full(n, -1, dtype=np.int64)
+        self.power_up_spawn_time = np.zeros(n, dtype=np.int64)
+        self.power_up_timer = np.zeros(n, dtype=np.int64)
+
+        self.speed_boost = np.zeros(n, dtype=bool)
+        self.speed_boost_timer = np.zeros(n, dtype=np.int64)
+        self.score_multiplier = np.ones(n, dtype=np.int64)
+        self.multiplier_timer = np.zeros(n, dtype=np.int64)
+        self.over = np.zeros(n, dtype=bool)
+
+        self.reset()
+
+    def read_rules(self, rules):
+        """Take each power-up balance constant from rules, or from engine when rules lacks it"""
+        # Read per instance, like Engine.read_rules, so that tournament.py's overrides apply
+        self.spawn_interval = rules.get("SPAWN_INTERVAL", engine.SPAWN_INTERVAL)
+        self.spawn_chance = rules.get("SPAWN_CHANCE", engine.SPAWN_CHANCE)
+        self.power_up_lifetime = rules.get("POWER_UP_LIFETIME", engine.POWER_UP_LIFETIME)
+        self.effect_time = rules.get("EFFECT_TIME", engine.EFFECT_TIME)
+
+    def reset(self, games=None):
+        """Start new games at the given indices (or boolean mask); all games when None"""
+        if games is None:
+            games = np.arange(self.n)
+        else:
+            games = np.asarray(games)
+            if games.dtype == bool:
+                games = np.flatnonzero(games)
+        if len(games) == 0:
+            return
+
+        self.body[games] = NEVER
+        self.head[games] = (1, 1)
+        self.body[games, 1, 1] = 0
+        self.direction[games] = ACTIONS.index('down')
+        self.length[games] = 2
+        self.ticks[games] = 0
+        self.sim_time[games] = 0
+        self.apple[games] = (3, 3)
+        self.power_up_type[games] = -1
+        self.power_up_timer[games] = 0
+        self.speed_boost[games] = False
+        self.speed_boost_timer[games] = 0
+        self.score_multiplier[games] = 1
+        self.multiplier_timer[games] = 0
+        self.over[games] = False
+
+        # Create obstacles for hard difficulty: 5 distinct cells away from the start corner
+        self.obstacles[games] = False
+        hard = games[HAS_OBSTACLES[self.difficulty[games]]]
+        if len(hard):
+            keys = np.where(OBSTACLE_CELLS.ravel(), self.rng.random((len(hard), ROWS*COLS)), -1.0)
+            cells = np.argpartition(keys, -5, axis=1)[:, -5:]
+            self.obstacles[np.repeat(hard, 5), cells.ravel() // COLS, cells.ravel() % COLS] = True
+
+    @property
+    def score(self):
+        return (self.length - 2) * self.score_multiplier
+
+    def step_time(self):
+        return STEP_TIMES[self.difficulty, self.speed_boost.astype(np.int64)]
+
+    def occupied(self, games, cols, rows):
+        """Whether each (col, row) cell is covered by the snake of the matching game"""
+        return self.ticks[games] - self.body[games, rows, cols] < self.length[games]
+
+    def free_cells(self, games):
+        """(k, ROWS, COLS) mask of the cells neither snake, apple, power-up nor obstacle covers"""
+        free = self.ticks[games, None, None] - self.body[games] >= self.length[games, None, None]
+        free &= ~self.obstacles[games]
+        free[np.arange(len(games)), self.apple[games, 1], self.apple[games, 0]] = False
+        active = np.flatnonzero(self.power_up_type[games] >= 0)
+        free[active, self.power_up[games[active], 1], self.power_up[games[active], 0]] = False
+        return free
+
+    def random_cells(self, free):
+        """One uniformly random free cell per mask; returns (found, cols, rows)"""
+        # Draw one rank per game among its free cells, then find the cell with that rank
+        free = free.reshape(len(free), -1)
+        counts = np.count_nonzero(free, axis=1)
+        ranks = self.rng.integers(0, np.maximum(counts, 1))
+        cells = (np.cumsum(free, axis=1, dtype=np.int32) > ranks[:, None]).argmax(axis=1)
+        return counts > 0, cells % COLS, cells // COLS
+
+    def step(self, actions=None):
+        """Advance every running game by one step
+
+        actions holds one index into ACTIONS per game, or NO_ACTION to keep
+        going straight. Returns boolean arrays (ate_apple, ate_power_up, crashed).
+        """
+        ate_apple = np.zeros(self.n, dtype=bool)
+        ate_power_up = np.zeros(self.n, dtype=bool)
+        crashed = np.zeros(self.n, dtype=bool)
+
+        g = np.flatnonzero(~self.over)
+        if len(g) == 0:
+            return ate_apple, ate_power_up, crashed
+
+        if actions is not None:
+            actions = np.asarray(actions)[g]
+            self.direction[g] = np.where(actions >= 0, actions, self.direction[g])
+
+        step = self.step_time()[g]
+        self.sim_time[g] += step
+        self.ticks[g] += 1
+        tick = self.ticks[g]
+
+        # Walk: the head enters a new cell, the tail leaves implicitly as the tick advances
+        self.head[g] += DELTAS[self.direction[g]]
+        hx, hy = self.head[g, 0], self.head[g, 1]
+        on_grid = (hx >= 0) & (hx < COLS) & (hy >= 0) & (hy < ROWS)
+        cx, cy = np.clip(hx, 0, COLS - 1), np.clip(hy, 0, ROWS - 1)
+        previous_visit = self.body[g, cy, cx].astype(np.int64)
+        self.body[g[on_grid], cy[on_grid], cx[on_grid]] = tick[on_grid]
+
+        self.spawn_power_ups(g)
+        self.update_power_ups(g, step)
+
+        # Snake colliding with apple
+        eat = (hx == self.apple[g, 0]) & (hy == self.apple[g, 1])
+        ate_apple[g] = eat
+        length = self.length[g]
+        eaten = g[eat]
+        if len(eaten):
+            # The head covers the old apple cell, so any free cell will do; on a full board the apple stays
+            found, xs, ys = self.random_cells(self.free_cells(eaten))
+            self.apple[eaten[found], 0] = xs[found]
+            self.apple[eaten[found], 1] = ys[found]
+        self.length[g] += eat
+
+        # Snake colliding with power-ups
+        hit = (self.power_up_type[g] >= 0) & (hx == self.power_up[g, 0]) & (hy == self.power_up[g, 1])
+        ate_power_up[g] = hit
+        kind = np.where(hit, self.power_up_type[g], -1)
+        double = g[kind == POWER_TYPES.index('double')]
+        self.score_multiplier[double] = 2
+        self.multiplier_timer[double] = self.effect_time
+        shrink = (kind == POWER_TYPES.index('shrink')) & (self.length[g] > 2)
+        self.length[g[shrink]] -= 1
+        speed = g[kind == POWER_TYPES.index('speed')]
+        self.speed_boost[speed] = True
+        self.speed_boost_timer[speed] = self.effect_time
+        self.power_up_type[g[hit]] = -1
+
+        # Snake colliding with itself: a segment 3 or more behind the head was in this cell.
+        # A segment grown this step has not been placed yet, while a shrink drops a real one.
+        body_length = length - (shrink & ~eat)
+        behind = tick - previous_visit
+        self_hit = on_grid & (behind >= 3) & (behind < body_length)
+
+        # Snake colliding with obstacles or wall
+        obstacle_hit = on_grid & self.obstacles[g, cy, cx]
+        wall_hit = ~on_grid
+
+        crash = self_hit | obstacle_hit | wall_hit
+        crashed[g] = crash
+        self.over[g] |= crash
+        return ate_apple, ate_power_up, crashed
+
+    def spawn_power_ups(self, g):
+        """Randomly spawn power-ups"""
+        due = g[self.sim_time[g] - self.power_up_timer[g] > self.spawn_interval]
+        if len(due) == 0:
+            return
+        self.power_up_timer[due] = self.sim_time[due]
+        due = due[self.rng.random(len(due)) < self.spawn_chance]
+        if len(due) == 0:
+            return
+
+        power_type = self.rng.integers(0, len(POWER_TYPES), size=len(due))
+        found, xs, ys = self.random_cells(self.free_cells(due))
+        placed = due[found]
+        self.power_up[placed, 0] = xs[found]
+        self.power_up[placed, 1] = ys[found]
+        self.power_up_type[placed] = power_type[found]
+        self.power_up_spawn_time[placed] = self.sim_time[placed]
+
+    def update_power_ups(self, g, step):
+        """Update power-up effects and remove expired ones"""
+        expired = self.sim_time[g] - self.power_up_spawn_time[g] > self.power_up_lifetime
+        self.power_up_type[g[expired]] = -1
+
+        boosted = self.speed_boost_timer[g] > 0
+        self.speed_boost_timer[g[boosted]] -= step[boosted]
+        self.speed_boost[g[boosted & (self.speed_boost_timer[g] <= 0)]] = False
+
+        doubled = self.multiplier_timer[g] > 0
+        self.multiplier_timer[g[doubled]] -= step[doubled]
+        self.score_multiplier[g[doubled & (self.multiplier_timer[g] <= 0)]] = 1
+
+    def board(self):
+        """Every game's board as an (n, ROWS, COLS) array of EMPTY/BODY/HEAD/APPLE/OBSTACLE/DOUBLE/SHRINK/SPEED codes"""
+        body = self.ticks[:, None, None] - self.body < self.length[:, None, None]
+        board = np.where(body, BODY, EMPTY).astype(np.int8)
+        board[self.obstacles] = OBSTACLE
+        games = np.arange(self.n)
+        board[games, self.apple[:, 1], self.apple[:, 0]] = APPLE
+        active = games[self.power_up_type >= 0]
+        board[active, self.power_up[active, 1], self.power_up[active, 0]] = DOUBLE + self.power_up_type[active]
+        inside = games[(self.head[:, 0] >= 0) & (self.head[:, 0] < COLS) &
+                       (self.head[:, 1] >= 0) & (self.head[:, 1] < ROWS)]
+        board[inside, self.head[inside, 1], self.head[inside, 0]] = HEAD
+        return board
@@ -0,0 +1,336 @@
+"""Benchmarks for the tick, render and spawn hot paths
+
+Runs headless under the SDL dummy video/audio drivers with fixed seeds and
+scripted inputs, and prints one JSON report. The snake follows a Hamiltonian
+cycle of the top rows of the board, so it never crashes and its length stays
+fixed; obstacles and power-ups fill rows the cycle doesn't use.
+
+Run it from the directory you run the game from (the one holding
+Snake_Apple_Game/resources):
+
+    python Snake_Apple_Game/bench.py                     print the report
+    python Snake_Apple_Game/bench.py --save base.json    store it as a baseline
+    python Snake_Apple_Game/bench.py --compare base.json flag regressions against a baseline
+
+Per benchmark it reports ticks_per_sec, p50_ms and p99_ms of single ticks or
+frames, then traces a shorter run with tracemalloc for alloc_bytes_per_tick
+(the memory a tick allocates on top of what was live when it started, at its
+peak) and retained_bytes_per_tick (the growth in live memory over that run).
+Snakes too long for the default board run on a LONG_BOARD-sized one, named
+in the benchmark's label.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # stdout holds the JSON report only
+
+import engine
+from engine import Engine, Board, Obstacle, PowerUp, COLS, ROWS, SIZE, POWER_TYPES
+
+SEED = 1234
+LENGTHS = [2, 50, 500, 5000]
+OBSTACLE_COUNTS = [0, 50, 200]
+POWER_UP_COUNTS = [0, 10, 50]
+DEFAULT_LENGTH = 50
+LONG_BOARD = (100, 100)  # cols (even, for the cycle) and rows for snakes the default board can't hold
+TICKS = 20000
+FRAMES = 1000
+TRACED = 0.05  # share of the timed runs repeated under tracemalloc
+WARMUP = 0.1  # share of extra untimed runs before measuring
+DEFAULT_THRESHOLD = 0.15  # relative slowdown that counts as a regression
+
+def cycle(cols, rows):
+    """Next direction for every cell of a Hamiltonian cycle over the top rows of a board cols wide
+
+    Down column 0, then up and down the remaining columns below row 0, then back
+    along row 0. cols is even, so the zigzag ends next to row 0 on the last column.
+    """
+    path = [(0, row) for row in range(rows)]
+    for col in range(1, cols):
+        span = range(rows - 1, 0, -1) if col % 2 else range(1, rows)
+        path += [(col, row) for row in span]
+    path += [(col, 0) for col in range(cols - 1, 0, -1)]
+    moves = {}
+    for (col, row), (next_col, next_row) in zip(path, path[1:] + path[:1]):
+        if next_col > col:
+            moves[col, row] = 'right'
+        elif next_col < col:
+            moves[col, row] = 'left'
+        elif next_row > row:
+            moves[col, row] = 'down'
+        else:
+            moves[col, row] = 'up'
+    return path, moves
+
+def cycle_rows(length, cols):
+    """Rows of a board cols wide that a cycle holding a snake of length (and the apple) needs"""
+    return max(2, -(-(length + 1) // cols) + 1)
+
+def board_size(length, spare=False):
+    """(cols, rows) of the board to run a snake of length on, with rows to spare below its cycle if spare"""
+    rows = cycle_rows(length, COLS) + spare
+    return (COLS, ROWS) if rows <= ROWS else LONG_BOARD
+
+class Scenario:
+    """An engine with a snake of fixed length circling the top rows, plus obstacles and power-ups below"""
+    def __init__(self, length, obstacles=0, power_ups=0, difficulty=1, board=None):
+        board = board or Board()
+        rows = cycle_rows(length, board.cols)
+        if board.cols % 2 or rows > board.rows or (obstacles or power_ups) and rows >= board.rows:
+            raise ValueError(f"a snake of length {length} does not fit on a {board.cols}x{board.rows} board")
+        self.engine = Engine(difficulty, seed=SEED, board=board)
+        self.path, self.moves = cycle(board.cols, rows)
+        game = self.engine
+
+        # Clear the board the engine dealt, then lay the snake backwards along the cycle
+        for item in [game.apple] + game.obstacles:
+            game.remove_item(item)
+        game.obstacles = []
+        snake = engine.Snake(length, board)
+        snake.grid[board.index(SIZE, SIZE)] = 0
+        snake.cells.clear()
+        for i in range(length):
+            col, row = self.path[-i]
+            snake.cells.append(row*board.cols + col)
+            snake.grid[row*board.cols + col] += 1
+        game.snake = snake
+        game.free = engine.FreeCells(board.size)
+        for i in snake.cells:
+            game.free.remove(i)
+        snake.direction = self.moves[self.path[0]]
+
+        # Obstacles and long-lived power-ups only go where the snake never comes
+        spare = list(range(rows*board.cols, board.size))
+        game.rng.shuffle(spare)
+        for _ in range(obstacles):
+            obstacle = Obstacle(*board.position(spare.pop()))
+            game.take(obstacle)
+            game.obstacles.append(obstacle)
+        for i in range(power_ups):
+            power_up = PowerUp(POWER_TYPES[i % len(POWER_TYPES)], 0)
+            power_up.lifetime = float("inf")
+            power_up.x, power_up.y = board.position(spare.pop())
+            game.take(power_up)
+            game.power_ups.append(power_up)
+        # The apple goes on the cycle ahead of the head, so eating stays part of the workload
+        ahead = [cell for cell in self.path if board.index(cell[0]*SIZE, cell[1]*SIZE) in game.free]
+        if ahead:
+            col, row = ahead[len(ahead) // 2]
+            game.apple.x, game.apple.y = col*SIZE, row*SIZE
+            game.take(game.apple)
+        self.length = length
+
+    def action(self):
+        x, y = self.engine.snake.head
+        return self.moves[x // SIZE, y // SIZE]
+
+    def hold_length(self):
+        """Undo growth so every tick works on the same length"""
+        snake = self.engine.snake
+        snake.growth = 0
+        while len(snake.cells) > self.length:
+            self.engine.release(snake._remove(snake.cells.pop()))
+
+def allocations(ticks, run_once):
+    """Bytes run_once allocates at its peak and bytes it leaves live, per call, traced by tracemalloc"""
+    tracemalloc.start()
+    allocated = 0
+    start = tracemalloc.get_traced_memory()[0]
+    for _ in range(ticks):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        run_once()
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    retained = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return allocated / ticks, retained / ticks
+
+def measure(name, ticks, run_once):
+    """Time run_once ticks times after a short warm-up, then trace its allocations; returns the result record"""
+    for _ in range(int(ticks * WARMUP)):
+        run_once()
+    samples = array('d', [0.0]) * ticks
+    start = time.perf_counter()
+    for i in range(ticks):
+        t = time.perf_counter()
+        run_once()
+        samples[i] = time.perf_counter() - t
+    total = time.perf_counter() - start
+    # Tracing slows every allocation down, so it gets a run of its own
+    allocated, retained = allocations(max(1, int(ticks * TRACED)), run_once)
+    samples = sorted(samples)
+    return name, {
+        "ticks": ticks,
+        "ticks_per_sec": round(ticks / total, 1),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 4),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 4),
+        "alloc_bytes_per_tick": round(allocated, 1),
+        "retained_bytes_per_tick": round(retained, 1),
+    }
+
+def scenarios():
+    """(label, length, obstacles, power_ups, board size) for every configuration to measure"""
+    configs = [(length, 0, 0) for length in LENGTHS]
+    configs += [(DEFAULT_LENGTH, count, 0) for count in OBSTACLE_COUNTS if count]
+    configs += [(DEFAULT_LENGTH, 0, count) for count in POWER_UP_COUNTS if count]
+    for length, obstacles, power_ups in configs:
+        size = board_size(length, spare=bool(obstacles or power_ups))
+        label = f"len{length}"
+        if obstacles:
+            label += f"_obstacles{obstacles}"
+        if power_ups:
+            label += f"_power_ups{power_ups}"
+        if size != (COLS, ROWS):
+            label += "_board{}x{}".format(*size)
+        yield label, length, obstacles, power_ups, size
+
+def bench_engine(results, skipped):
+    for label, length, obstacles, power_ups, size in scenarios():
+        try:
+            scenario = Scenario(length, obstacles, power_ups, board=Board(*size))
+        except ValueError as e:
+            skipped[f"tick/{label}"] = str(e)
+            continue
+
+        def tick():
+            scenario.engine.step(scenario.action())
+            scenario.hold_length()
+        name, record = measure(f"tick/{label}", TICKS, tick)
+        assert not scenario.engine.over, name
+        results[name] = record
+
+        if obstacles or power_ups:
+            continue
+        walker = Scenario(length, board=Board(*size))
+        snake = walker.engine.snake
+
+        def walk():
+            snake.direction = walker.action()
+            snake.walk()
+            snake.growth = 0
+        name, record = measure(f"snake_walk/{label}", TICKS, walk)
+        results[name] = record
+
+    scenario = Scenario(DEFAULT_LENGTH, 50, 0)
+    game = scenario.engine
+
+    def spawn():
+        game.power_up_timer = -float("inf")
+        game.spawn_power_up()
+        for power_up in game.power_ups:
+            game.remove_item(power_up)
+        game.power_ups = []
+    name, record = measure("spawn_power_up", TICKS, spawn)
+    results[name] = record
+
+def bench_front_end(results, skipped):
+    import pygame
+    import main
+    # The score store and save file go to a scratch directory, not the player's
+    scratch = tempfile.TemporaryDirectory()
+    main.SCORES_PATH = os.path.join(scratch.name, "scores.db")
+    main.SAVE_PATH = os.path.join(scratch.name, "savegame.bin")
+    game = main.Game()
+    game.loader.join()  # nothing loads in the background while measuring
+    game.recording = None
+    game.save_file.close()  # no autosaves between measured frames
+    game.save_file = None
+
+    for label, length, obstacles, power_ups, size in scenarios():
+        try:
+            scenario = Scenario(length, obstacles, power_ups, board=Board(*size))
+        except ValueError as e:
+            skipped[f"frame/{label}"] = str(e)
+            continue
+        game.show(scenario.engine)  # through the scrolling camera on a large board
+        game.inputs.clear(scenario.engine.snake.direction)
+        game.state = main.GameState.PLAYING
+
+        def frame():
+            game.inputs.push(scenario.action())
+            game.play(game.engine.step_time())
+            scenario.hold_length()
+        name, record = measure(f"frame/{label}", FRAMES, frame)
+        assert game.state == main.GameState.PLAYING, name
+        results[name] = record
+
+    name, record = measure("render_background", FRAMES, game.render_background)
+    results[name] = record
+    game.state = main.GameState.GAME_OVER
+    for screen in ["show_menu", "show_instructions", "show_difficulty_selection",
+                   "show_pause_menu", "show_game_over_screen"]:
+        name, record = measure(screen, FRAMES, getattr(game, screen))
+        results[name] = record
+    if game.scores is not None:
+        game.scores.close()
+    scratch.cleanup()
+    pygame.quit()
+
+def run(front_end=True):
+    results = {}
+    skipped = {}
+    bench_engine(results, skipped)
+    if front_end:
+        bench_front_end(results, skipped)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": SEED,
+            "board": [COLS, ROWS],
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+def compare(report, baseline, threshold):
+    """Benchmarks that got slower than baseline by more than threshold"""
+    regressions = {}
+    for name, record in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        slowdown = base["ticks_per_sec"] / record["ticks_per_sec"] - 1
+        p99_growth = record["p99_ms"] / base["p99_ms"] - 1 if base["p99_ms"] else 0
+        if slowdown > threshold or p99_growth > threshold:
+            regressions[name] = {
+                "baseline_ticks_per_sec": base["ticks_per_sec"],
+                "ticks_per_sec": record["ticks_per_sec"],
+                "baseline_p99_ms": base["p99_ms"],
+                "p99_ms": record["p99_ms"],
+            }
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Snake game's hot paths")
+    parser.add_argument("--save", metavar="FILE", help="write the report to FILE")
+    parser.add_argument("--compare", metavar="FILE", help="flag regressions against the baseline report in FILE")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown that counts as a regression (default %(default)s)")
+    parser.add_argument("--engine-only", action="store_true", help="skip the pygame front-end benchmarks")
+    args = parser.parse_args(argv)
+
+    report = run(front_end=not args.engine_only)
+    status = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report["regressions"] = compare(report, baseline, args.threshold)
+        status = 1 if report["regressions"] else 0
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
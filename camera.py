@@ -0,0 +1,105 @@
+"""Scrolling view of boards larger than the window
+
+Camera keeps the top-left pixel of the world that the window shows. It only
+moves when the snake's head leaves a dead zone around the middle of the
+view, so most frames keep the same view and the renderer can still update
+just the rectangles that changed.
+
+Chunks pre-renders the static part of the world (tiled background and
+obstacles) in squares of CHUNK x CHUNK cells, the first time each one comes
+into view, and keeps the most recently used ones. A frame only touches the
+handful of chunks under the window, whatever the size of the board.
+"""
+from collections import OrderedDict
+
+import pygame
+
+from engine import SIZE, Obstacle
+
+CHUNK = 16  # cells per chunk side
+MAX_CHUNKS = 64  # chunk surfaces kept (~0.6 MB each)
+DEAD_ZONE = 0.25  # share of the view on each side the head may enter before the camera follows
+
+class Camera:
+    def __init__(self, board, view):
+        self.board = board
+        self.width, self.height = view
+        self.x = 0
+        self.y = 0
+
+    def reset(self):
+        self.x = self.y = 0
+
+    def follow(self, x, y):
+        """Bring the cell at pixel (x, y) out of the margins; returns whether the view moved"""
+        old = (self.x, self.y)
+        self.x = self.track(self.x, x, self.width, self.board.width)
+        self.y = self.track(self.y, y, self.height, self.board.height)
+        return (self.x, self.y) != old
+
+    @staticmethod
+    def track(offset, position, view, world):
+        margin = int(view * DEAD_ZONE)
+        if position < offset + margin:
+            offset = position - margin
+        elif position + SIZE > offset + view - margin:
+            offset = position + SIZE - view + margin
+        # Snap to whole cells so sprites and chunks stay aligned
+        offset = offset // SIZE * SIZE
+        return max(0, min(offset, world - view)) if world > view else 0
+
+class Chunks:
+    """The background and obstacles of a board, rendered chunk by chunk on demand"""
+    def __init__(self, board, background, obstacle_image, max_chunks=MAX_CHUNKS):
+        self.board = board
+        self.background = background
+        self.obstacle_image = obstacle_image
+        self.max_chunks = max_chunks
+        self.cache = OrderedDict()  # (chunk col, chunk row) -> surface
+        self.items = {}
+
+    def clear(self, items):
+        """Forget every rendered chunk; items is the engine's cell -> item dict for the new game"""
+        self.cache.clear()
+        self.items = items
+
+    def chunk(self, key):
+        surface = self.cache.get(key)
+        if surface is not None:
+            self.cache.move_to_end(key)
+            return surface
+
+        board, span = self.board, CHUNK*SIZE
+        left, top = key[0]*span, key[1]*span
+        surface = pygame.Surface((span, span)).convert()
+        surface.fill((0, 0, 0))
+        # The window-sized background image repeats across the world
+        bg_width, bg_height = self.background.get_size()
+        for y in range(top // bg_height * bg_height, top + span, bg_height):
+            for x in range(left // bg_width * bg_width, left + span, bg_width):
+                surface.blit(self.background, (x - left, y - top))
+        # Nothing exists past the edge of the board
+        if left + span > board.width or top + span > board.height:
+            surface.fill((0, 0, 0), pygame.Rect(board.width - left, 0, span, span))
+            surface.fill((0, 0, 0), pygame.Rect(0, board.height - top, span, span))
+
+        first_col, first_row = key[0]*CHUNK, key[1]*CHUNK
+        for row in range(first_row, min(first_row + CHUNK, board.rows)):
+            base = row*board.cols
+            for col in range(first_col, min(first_col + CHUNK, board.cols)):
+                if isinstance(self.items.get(base + col), Obstacle):
+                    surface.blit(self.obstacle_image, ((col - first_col)*SIZE, (row - first_row)*SIZE))
+
+        self.cache[key] = surface
+        if len(self.cache) > self.max_chunks:
+            self.cache.popitem(last=False)
+        return surface
+
+    def compose(self, target, camera):
+        """Draw the static world under camera into target"""
+        target.fill((0, 0, 0))
+        span = CHUNK*SIZE
+        for key_y in range(camera.y // span, (camera.y + camera.height - 1) // span + 1):
+            for key_x in range(camera.x // span, (camera.x + camera.width - 1) // span + 1):
+                if key_x*span < self.board.width and key_y*span < self.board.height:
+                    target.blit(self.chunk((key_x, key_y)), (key_x*span - camera.x, key_y*span - camera.y))
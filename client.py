@@ -0,0 +1,120 @@
+"""Play or watch a room of server.py through the normal game window
+
+The server runs the game; this only sends the arrow keys and draws the
+net.Mirror it keeps up to date from the server's snapshots. Closing the
+window or ESC leaves the room.
+
+    python client.py --host 127.0.0.1 --room lobby
+    python client.py --watch
+"""
+import argparse
+import socket
+import sys
+
+import pygame
+from pygame.locals import QUIT, KEYDOWN, K_ESCAPE, K_F3
+
+import net
+from engine import ACTIONS
+from main import Game, GameState, KEY_ACTIONS
+from server import HOST, PORT, ROOM
+
+CONNECT_TIMEOUT = 5.0  # s
+RECV_SIZE = 1 << 16
+
+class Client:
+    """A connection to a room and the mirror of its arena"""
+    def __init__(self, host, port, room, mode):
+        self.socket = socket.create_connection((host, port), CONNECT_TIMEOUT)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.socket.sendall(net.hello(mode, room))
+        self.frames = net.FrameBuffer()
+        self.pending = []
+        player_id, board, self.tick_ms = net.read_welcome(self.next_payload())
+        self.mirror = net.Mirror(player_id, board)
+        self.mirror.apply(self.next_payload())
+        # From here on the game loop polls for snapshots between frames
+        self.socket.setblocking(False)
+
+    def next_payload(self):
+        """Block until a whole payload has arrived"""
+        while not self.pending:
+            data = self.socket.recv(RECV_SIZE)
+            if not data:
+                raise ConnectionError("server closed the connection")
+            self.pending += self.frames.feed(data)
+        return self.pending.pop(0)
+
+    def poll(self):
+        """Apply every snapshot received since the last call"""
+        while True:
+            try:
+                data = self.socket.recv(RECV_SIZE)
+            except BlockingIOError:
+                return
+            if not data:
+                raise ConnectionError("server closed the connection")
+            for payload in self.frames.feed(data):
+                self.mirror.apply(payload)
+
+    def turn(self, action):
+        try:
+            self.socket.send(net.turn(ACTIONS.index(action)))
+        except BlockingIOError:
+            pass  # the server is not reading; the turn would be stale by the time it did
+
+    def close(self):
+        self.socket.close()
+
+def run(game, client):
+    """Draw the mirror at up to 60 FPS until the window closes or the connection drops"""
+    game.show(client.mirror)
+    game.state = GameState.PLAYING
+    watching = client.mirror.player_id == net.NOBODY
+    elapsed = 0
+    while True:
+        for event in pygame.event.get():
+            if event.type == QUIT:
+                return
+            if event.type == KEYDOWN:
+                if event.key == K_ESCAPE:
+                    return
+                elif event.key == K_F3:
+                    game.overlay.toggle()
+                elif event.key in KEY_ACTIONS and not watching:
+                    client.turn(KEY_ACTIONS[event.key])
+        try:
+            client.poll()
+        except (ConnectionError, OSError, net.ProtocolError) as e:
+            print(f"Lost connection to the server ({e})")
+            return
+        game.draw_frame()
+        elapsed = game.clock.tick(60)
+        game.profiler.end_frame(elapsed / 1000)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play in a room of a snake server")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--room", default=ROOM)
+    parser.add_argument("--watch", action="store_true", help="spectate instead of playing")
+    args = parser.parse_args(argv)
+
+    try:
+        client = Client(args.host, args.port, args.room, net.WATCH if args.watch else net.PLAY)
+    except (OSError, net.ProtocolError) as e:
+        print(f"Could not connect to {args.host}:{args.port} ({e})")
+        return 1
+    game = Game()
+    try:
+        run(game, client)
+    finally:
+        client.close()
+        if game.scores is not None:
+            game.scores.close()
+        game.loader.join()
+        pygame.quit()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
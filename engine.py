@@ -0,0 +1,559 @@
+"""Snake game rules with no pygame dependency
+
+Engine runs the exact rules of the pygame game (apple growth, power-ups,
+self/obstacle/wall collisions, scoring) on plain Python objects with its own
+seeded RNG, so games can be simulated headless as fast as the CPU allows.
+The pygame front end in main.py only renders an Engine's state.
+
+The board defaults to the 800x600 window's cells; Engine takes a Board of
+any size up to MAX_CELLS a side. Board-sized state (the snake's occupancy
+grid, the free set) lives in flat arrays of the narrowest type that holds a
+cell index, and the apple, power-ups and obstacles in a dict keyed by cell,
+so a large and mostly empty board costs a few bytes per cell.
+
+Many games may be held in memory at once (paused sessions on a server,
+replay snapshots), so the entities are slotted and hold no pygame state.
+"""
+import random
+from array import array
+from collections import deque
+from itertools import islice
+
+SIZE = 24
+WIDTH = 800
+HEIGHT = 600
+
+# The default board, in cells
+COLS = -(-WIDTH // SIZE)
+ROWS = -(-HEIGHT // SIZE)
+MIN_CELLS = 4  # room for the snake's and the apple's starting cells
+MAX_CELLS = 2000
+# Obstacles keep out of the top-left corner the snake starts in
+SAFE_ZONE = 5
+OBSTACLES = 5  # obstacles on the default board; larger boards get as many per cell
+
+DIFFICULTIES = {
+    0: {"name": "Easy", "speed": 0.15, "obstacles": False},
+    1: {"name": "Medium", "speed": 0.1, "obstacles": False},
+    2: {"name": "Hard", "speed": 0.05, "obstacles": True}
+}
+
+POWER_TYPES = ['double', 'shrink', 'speed']
+# Power-up balance, in ms of simulation time
+SPAWN_INTERVAL = 15000
+SPAWN_CHANCE = 0.7
+POWER_UP_LIFETIME = 10000
+EFFECT_TIME = 5000
+ACTIONS = ['up', 'down', 'left', 'right']
+OPPOSITE = {'up': 'down', 'down': 'up', 'left': 'right', 'right': 'left'}
+STEPS = {'up': (0, -1), 'down': (0, 1), 'left': (-1, 0), 'right': (1, 0)}  # (cols, rows) moved per action
+
+# Events reported by Engine.step
+EAT_APPLE = "apple"
+EAT_POWER_UP = "power_up"
+CRASH = "crash"
+
+class Board:
+    """A grid of cols x rows cells of SIZE pixels, numbered row by row
+
+    Boards never change once made, so games and their copies share them.
+    """
+    __slots__ = ("cols", "rows", "size", "width", "height", "obstacles")
+
+    def __init__(self, cols=COLS, rows=ROWS):
+        if not (MIN_CELLS <= cols <= MAX_CELLS and MIN_CELLS <= rows <= MAX_CELLS):
+            raise ValueError(f"a board must be {MIN_CELLS} to {MAX_CELLS} cells a side, not {cols}x{rows}")
+        self.cols = cols
+        self.rows = rows
+        self.size = cols*rows
+        self.width = cols*SIZE
+        self.height = rows*SIZE
+        self.obstacles = max(1, round(OBSTACLES * self.size / (COLS*ROWS)))
+
+    def __eq__(self, other):
+        return isinstance(other, Board) and (self.cols, self.rows) == (other.cols, other.rows)
+
+    def __hash__(self):
+        return hash((self.cols, self.rows))
+
+    def __repr__(self):
+        return f"Board({self.cols}, {self.rows})"
+
+    def index(self, x, y):
+        """Index of the cell at pixel position (x, y), or None off the board"""
+        col, row = x // SIZE, y // SIZE
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return row*self.cols + col
+        return None
+
+    def position(self, i):
+        return (i % self.cols)*SIZE, (i // self.cols)*SIZE
+
+    def safe_zone(self):
+        """Cells of the top-left corner the snake starts in"""
+        cols, zone = self.cols, SAFE_ZONE
+        for row in range(min(zone, self.rows)):
+            yield from range(row*cols, (row + 1)*cols)
+        for row in range(zone, self.rows):
+            yield from range(row*cols, row*cols + min(zone, cols))
+
+DEFAULT_BOARD = Board()
+
+def cell_index(x, y):
+    """Index of the default board's cell at pixel position (x, y), or None off the board"""
+    return DEFAULT_BOARD.index(x, y)
+
+def cell_position(i):
+    return DEFAULT_BOARD.position(i)
+
+def index_typecode(size):
+    """The narrowest array typecode holding every cell index of a board of size cells, and -1"""
+    return 'h' if size <= 0x7fff else 'i'
+
+CHUNK_BITS = 4
+CHUNK = 1 << CHUNK_BITS  # places of a FreeCells list per moved flag
+
+class FreeCells:
+    """The board cells nothing occupies, with O(1) add, remove and uniform random choice
+
+    Cells are kept in a dense list and slot maps each cell to its place in it
+    (-1 when taken), so a removal swaps the last cell into the hole. A board
+    that starts with cells taken passes its prebuilt cells and slot arrays,
+    which are copied. moved flags each run of CHUNK places of the list written
+    since the game started (Engine.reset settles it), so snapshot.py stores
+    only those and not the whole board.
+    """
+    __slots__ = ("cells", "slot", "moved")
+
+    def __init__(self, size, cells=None, slot=None):
+        if cells is None:
+            typecode = index_typecode(size)
+            self.cells = array(typecode, range(size))
+            self.slot = array(typecode, range(size))
+        else:
+            self.cells = cells[:]
+            self.slot = slot[:]
+        self.moved = bytearray(-(-size // CHUNK))
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __contains__(self, i):
+        return self.slot[i] >= 0
+
+    def add(self, i):
+        if self.slot[i] < 0:
+            slot = self.slot[i] = len(self.cells)
+            self.cells.append(i)
+            self.moved[slot >> CHUNK_BITS] = 1
+
+    def remove(self, i):
+        slot = self.slot[i]
+        if slot < 0:
+            return
+        last = self.cells.pop()
+        if last != i:
+            self.cells[slot] = last
+            self.slot[last] = slot
+            self.moved[slot >> CHUNK_BITS] = 1
+        self.slot[i] = -1
+
+    def choice(self, rng):
+        return self.cells[rng.randrange(len(self.cells))]
+
+    def settle(self):
+        """Forget the places written so far: changes are counted from the list as it is now"""
+        self.moved = bytearray(len(self.moved))
+
+class Apple:
+    __slots__ = ("x", "y")
+
+    def __init__(self):
+        self.x = SIZE*3
+        self.y = SIZE*3
+
+class PowerUp:
+    __slots__ = ("power_type", "x", "y", "spawn_time", "lifetime")
+
+    def __init__(self, power_type, now):
+        self.power_type = power_type  # 'double', 'shrink', 'speed'
+        self.x = 0
+        self.y = 0
+        self.spawn_time = now
+        self.lifetime = POWER_UP_LIFETIME  # Power-up disappears after 10 seconds of simulation time
+
+    def is_expired(self, now):
+        return now - self.spawn_time > self.lifetime
+
+class Obstacle:
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+OUTSIDE = -1  # cell of a head that walked off the board
+
+class Snake:
+    """Snake body as a deque of board cell indices, head first, plus a grid of occupancy counts
+
+    Walking pushes a head and pops a tail, growing defers the next pop, and
+    the grid answers "is this cell part of the snake" without scanning the
+    body, so every operation is O(1) whatever the length. Snakes sharing a
+    board can share one grid, which then counts the segments of all of them.
+    A head that walks off the board is stored as OUTSIDE, with its position
+    in outside. head and body give (x, y) pixel positions for drawing.
+    """
+    __slots__ = ("board", "cells", "growth", "grid", "direction", "outside")
+
+    def __init__(self, length, board=DEFAULT_BOARD, grid=None, start=(SIZE, SIZE)):
+        self.board = board
+        i = board.index(*start)
+        self.cells = deque([i]*length)
+        self.outside = None  # (x, y) of a head off the board
+        self.growth = 0  # segments still to add at the tail on the next walks
+        self.grid = grid if grid is not None else array('H', [0]) * board.size
+        self.grid[i] += length
+        self.direction = 'down'
+
+    @property
+    def length(self):
+        return len(self.cells) + self.growth
+
+    @property
+    def head(self):
+        i = self.cells[0]
+        return self.board.position(i) if i != OUTSIDE else self.outside
+
+    @property
+    def body(self):
+        """(x, y) of every segment, head first, worked out on each call"""
+        position = self.board.position
+        return [self.head] + [position(i) for i in islice(self.cells, 1, None)]
+
+    def occupied(self, x, y):
+        """Whether any segment of the snake covers the cell at (x, y)"""
+        i = self.board.index(x, y)
+        return i is not None and self.grid[i] > 0
+
+    def increase_length(self):
+        self.growth += 1
+
+    def decrease_length(self):
+        """Drop the last segment; returns the cell it left, or None"""
+        if self.length > 2:
+            if self.growth:
+                self.growth -= 1
+            else:
+                return self._remove(self.cells.pop())
+        return None
+
+    def _remove(self, i):
+        if i == OUTSIDE:
+            return None
+        self.grid[i] -= 1
+        return i
+
+    def bites_itself(self):
+        """Whether the head shares its cell with a segment 3 or more places behind it"""
+        cells = self.cells
+        head = cells[0]
+        if head == OUTSIDE:
+            return False
+        others = self.grid[head] - 1
+        if len(cells) > 1 and cells[1] == head:
+            others -= 1
+        if len(cells) > 2 and cells[2] == head:
+            others -= 1
+        return others > 0
+
+    def move_left(self):
+        self.direction = 'left'
+
+    def move_right(self):
+        self.direction = 'right'
+
+    def move_up(self):
+        self.direction = 'up'
+
+    def move_down(self):
+        self.direction = 'down'
+
+    def walk(self):
+        """Move one cell forward; returns the cell the tail left, or None while growing"""
+        board, cells, direction = self.board, self.cells, self.direction
+        i = cells[0]
+        cols = board.cols
+        if direction == 'left':
+            j = i - 1 if i % cols else OUTSIDE
+        elif direction == 'right':
+            j = i + 1 if i % cols != cols - 1 else OUTSIDE
+        elif direction == 'up':
+            j = i - cols
+        else:
+            j = i + cols if i + cols < board.size else OUTSIDE
+        if i == OUTSIDE or j < 0:
+            j = self.leave()
+        cells.appendleft(j)
+        if j != OUTSIDE:
+            self.grid[j] += 1
+        if self.growth:
+            self.growth -= 1
+            return None
+        return self._remove(cells.pop())
+
+    def leave(self):
+        """The cell one step on from the head in its direction, OUTSIDE (noted in outside) when off the board"""
+        x, y = self.head
+        dx, dy = STEPS[self.direction]
+        x, y = x + dx*SIZE, y + dy*SIZE
+        j = self.board.index(x, y)
+        if j is None:
+            self.outside = (x, y)
+            return OUTSIDE
+        return j
+
+class Engine:
+    """One game of Snake on board, advanced with step(action)
+
+    A levels.Level replaces the board, and whichever of the obstacles, speed
+    and power-up rules it sets; the difficulty supplies the rest.
+    """
+    def __init__(self, difficulty=1, seed=None, board=None, level=None):
+        self.difficulties = DIFFICULTIES
+        self.level = level
+        self.board = level.board if level is not None else board or DEFAULT_BOARD
+        self.reset(difficulty, seed)
+
+    def reset(self, difficulty=None, seed=None):
+        """Start a new game; a fresh random seed is drawn when none is given"""
+        if difficulty is not None:
+            self.difficulty = difficulty
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+
+        board, level = self.board, self.level
+        self.snake = Snake(2, board)
+        self.apple = Apple()
+        self.power_ups = []
+        # Collision world: the apple, power-up or obstacle by board cell (the snake has
+        # its own grid), and every cell neither they nor the snake cover. A level's
+        # layout comes prebuilt and is only copied.
+        if level is not None and level.layout_count:
+            obstacles, items, cells, slot = level.obstacle_world()
+            self.obstacles = list(obstacles)
+            self.items = dict(items)
+            self.free = FreeCells(board.size, cells, slot)
+        else:
+            self.obstacles = []
+            self.items = {}
+            self.free = FreeCells(board.size)
+        self.free.remove(self.snake.cells[0])
+        self.take(self.apple)
+        self.sim_time = 0  # ms of simulated play, advanced one fixed step at a time
+        self.ticks = 0
+        self.power_up_timer = 0
+        self.speed_boost = 1.0
+        self.speed_boost_timer = 0
+        self.score_multiplier = 1
+        self.multiplier_timer = 0
+        self.over = False
+
+        self.read_rules()
+        self.speed = self.level_speed()
+
+        # Create random obstacles for hard difficulty (or as many as the level asks for),
+        # away from the corner the snake starts in
+        count = board.obstacles if self.difficulties[self.difficulty]["obstacles"] else 0
+        if level is not None and level.random_obstacles is not None:
+            count = level.random_obstacles
+        if count:
+            safe = [i for i in board.safe_zone() if i in self.free]
+            for i in safe:
+                self.free.remove(i)
+            for _ in range(count):
+                obstacle = Obstacle(0, 0)
+                if self.place(obstacle):
+                    self.obstacles.append(obstacle)
+            for i in safe:
+                self.free.add(i)
+        # Snapshots store the free list as changes from here, which restore() rebuilds from the seed
+        self.free.settle()
+
+    def read_rules(self):
+        """Take this game's power-up rules from the level, and the rest from the module's constants"""
+        # Read per game so that tournament.py's overrides of the constants apply
+        rules = self.level.power_ups if self.level is not None else {}
+        self.spawn_interval = rules.get("spawn_interval", SPAWN_INTERVAL)
+        self.spawn_chance = rules.get("spawn_chance", SPAWN_CHANCE)
+        self.power_up_lifetime = rules.get("lifetime", POWER_UP_LIFETIME)
+        self.effect_time = rules.get("effect_time", EFFECT_TIME)
+        self.power_weights = rules.get("weights")  # None: every type is as likely
+
+    def take(self, item):
+        """Register item on its cell"""
+        i = self.board.index(item.x, item.y)
+        self.items[i] = item
+        self.free.remove(i)
+
+    def place(self, item):
+        """Move item to a uniformly random free cell; False if the board is full"""
+        if not self.free:
+            return False
+        item.x, item.y = self.board.position(self.free.choice(self.rng))
+        self.take(item)
+        return True
+
+    def release(self, i):
+        """Give cell i back to the free set if nothing covers it any more"""
+        if i not in self.items and not self.snake.grid[i]:
+            self.free.add(i)
+
+    def remove_item(self, item):
+        i = self.board.index(item.x, item.y)
+        del self.items[i]
+        self.release(i)
+
+    def at(self, x, y):
+        """The apple, power-up or obstacle on the cell at (x, y), if any"""
+        return self.items.get(self.board.index(x, y))
+
+    @property
+    def snakes(self):
+        return [self.snake]
+
+    @property
+    def apples(self):
+        return [self.apple]
+
+    @property
+    def score(self):
+        return (self.snake.length - 2) * self.score_multiplier
+
+    def level_speed(self):
+        """Seconds per step at the snake's length, from the level's speed curve or the difficulty"""
+        speed = self.difficulties[self.difficulty]["speed"]
+        if self.level is None:
+            return speed
+        return self.level.speed_at(self.snake.length - 2, speed)
+
+    def step_time(self):
+        """Length of one simulation step in ms for the current speed and speed boost"""
+        return round(self.speed * self.speed_boost * 1000)
+
+    def step(self, action=None):
+        """Turn the snake towards action (one of ACTIONS, or None to keep going) and advance one step
+
+        Returns the list of events (EAT_APPLE, EAT_POWER_UP, CRASH) that happened during the step.
+        """
+        if self.over:
+            return []
+        if action is not None:
+            getattr(self.snake, "move_" + action)()
+
+        step = self.step_time()
+        self.sim_time += step
+        self.ticks += 1
+        self.walk()
+        self.spawn_power_up()
+        self.update_power_ups(step)
+        events = self.handle_collisions()
+        if CRASH in events:
+            self.over = True
+        elif events and self.level is not None:
+            self.speed = self.level_speed()
+        return events
+
+    def walk(self):
+        tail = self.snake.walk()
+        head = self.snake.cells[0]
+        if head != OUTSIDE:
+            self.free.remove(head)
+        if tail is not None:
+            self.release(tail)
+
+    def spawn_power_up(self):
+        """Randomly spawn power-ups"""
+        if self.sim_time - self.power_up_timer > self.spawn_interval:  # Spawn every 15 seconds
+            if self.rng.random() < self.spawn_chance:  # 70% chance to spawn
+                if self.power_weights is None:
+                    power_type = self.rng.choice(POWER_TYPES)
+                else:
+                    power_type = self.rng.choices(POWER_TYPES, self.power_weights)[0]
+                power_up = PowerUp(power_type, self.sim_time)
+                power_up.lifetime = self.power_up_lifetime
+                # Free cells never hold the snake, the apple or obstacles
+                if self.place(power_up):
+                    self.power_ups.append(power_up)
+
+            self.power_up_timer = self.sim_time
+
+    def update_power_ups(self, step):
+        """Update power-up effects and remove expired ones"""
+        # Remove expired power-ups
+        for power_up in [pu for pu in self.power_ups if pu.is_expired(self.sim_time)]:
+            self.power_ups.remove(power_up)
+            self.remove_item(power_up)
+
+        # Update speed boost timer
+        if self.speed_boost_timer > 0:
+            self.speed_boost_timer -= step
+            if self.speed_boost_timer <= 0:
+                self.speed_boost = 1.0
+
+        # Update score multiplier timer
+        if self.multiplier_timer > 0:
+            self.multiplier_timer -= step
+            if self.multiplier_timer <= 0:
+                self.score_multiplier = 1
+
+    def handle_collisions(self):
+        events = []
+        head = self.snake.cells[0]
+
+        # Snake colliding with wall
+        if head == OUTSIDE:
+            events.append(CRASH)
+            return events
+
+        # A single lookup at the head finds whatever else is on that cell
+        item = self.items.get(head)
+
+        # Snake colliding with apple
+        if item is self.apple:
+            events.append(EAT_APPLE)
+            self.snake.increase_length()
+            # The head covers the old cell, so the apple just moves to a free one
+            del self.items[head]
+            if not self.place(self.apple):
+                self.take(self.apple)  # Board is full: the apple stays under the snake
+
+        # Snake colliding with power-ups
+        elif isinstance(item, PowerUp):
+            events.append(EAT_POWER_UP)
+
+            if item.power_type == 'double':
+                self.score_multiplier = 2
+                self.multiplier_timer = self.effect_time  # 5 seconds of simulation time
+            elif item.power_type == 'shrink':
+                tail = self.snake.decrease_length()
+                if tail is not None:
+                    self.release(tail)
+            elif item.power_type == 'speed':
+                self.speed_boost = 0.5  # Half the step time, so twice as fast
+                self.speed_boost_timer = self.effect_time  # 5 seconds
+
+            self.power_ups.remove(item)
+            self.remove_item(item)
+
+        # Snake colliding with itself
+        if self.snake.bites_itself():
+            events.append(CRASH)
+            return events
+
+        # Snake colliding with obstacles
+        if isinstance(item, Obstacle):
+            events.append(CRASH)
+            return events
+
+        return events
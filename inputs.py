@@ -0,0 +1,65 @@
+"""Direction changes queued between simulation steps
+
+Key presses, scripted inputs (bench.py) and turns received from the network
+(server.py) all go through InputQueue.push, stamped with the time they
+arrived. Each simulation step pops at most one, so two presses within one
+slow tick turn the snake on two consecutive steps instead of the second one
+overwriting the first.
+
+A press that would reverse the snake onto its own neck, or that repeats the
+direction it will already be heading in, is dropped when it is queued. The
+check is made against the direction the snake will have once everything
+queued before it has been applied, and made again when it is popped, in case
+the snake was turned some other way in between (a new game, the autopilot).
+The queue holds BUFFER presses; a player mashing keys faster than the ticks
+go loses the extra presses rather than piling up turns that would play out
+long after they were meant.
+"""
+import time
+from collections import deque
+
+from engine import OPPOSITE
+
+BUFFER = 3  # direction changes waiting at most
+
+class InputQueue:
+    def __init__(self, capacity=BUFFER, clock=time.perf_counter):
+        self.capacity = capacity
+        self.clock = clock
+        self.events = deque()  # (timestamp, action), oldest first
+        self.direction = None  # where the snake heads once the queue is applied, when known
+        self.latency = 0.0  # s between the last applied change arriving and the step that applied it
+        self.filtered = 0  # changes dropped as reversals or repeats
+        self.dropped = 0  # changes dropped because the queue was full
+
+    def __len__(self):
+        return len(self.events)
+
+    def clear(self, direction=None):
+        """Forget every queued change; direction is where the snake heads now, if known"""
+        self.events.clear()
+        self.direction = direction
+
+    def push(self, action, timestamp=None):
+        """Queue one of engine.ACTIONS from any source; returns whether it was kept"""
+        ahead = self.events[-1][1] if self.events else self.direction
+        if ahead is not None and (action == ahead or action == OPPOSITE[ahead]):
+            self.filtered += 1
+            return False
+        if len(self.events) >= self.capacity:
+            self.dropped += 1
+            return False
+        self.events.append((self.clock() if timestamp is None else timestamp, action))
+        return True
+
+    def pop(self, direction):
+        """The change to apply on a step whose snake heads in direction, or None to keep going"""
+        self.direction = direction
+        while self.events:
+            timestamp, action = self.events.popleft()
+            if action != direction and action != OPPOSITE[direction]:
+                self.direction = action
+                self.latency = self.clock() - timestamp
+                return action
+            self.filtered += 1
+        return None
@@ -0,0 +1,367 @@
+"""Level files: board size, obstacle layout, speed curve and power-up balance
+
+A level is a JSON file, or TOML on Python 3.11 and later. Every key is
+optional; what a level leaves out comes from the difficulty it is played at.
+
+    {
+      "name": "Crossroads",
+      "board": [33, 25],
+      "layout": [".................................",
+                 "..........#########.............",
+                 ...],
+      "random_obstacles": 3,
+      "speed": [[0, 0.1], [10, 0.08], [25, 0.06]],
+      "power_ups": {"weights": {"double": 2, "shrink": 1, "speed": 1},
+                    "lifetime": 8000, "spawn_interval": 12000,
+                    "spawn_chance": 0.8, "effect_time": 5000}
+    }
+
+layout has one string per row of the board, '#' for an obstacle and '.' or
+' ' for an empty cell; obstacles keep out of the top-left corner the snake
+starts in.
+The board defaults to the layout's size. random_obstacles are placed on
+random free cells every game, on top of the layout (with a layout it
+defaults to 0, without one the difficulty decides). speed is the seconds per
+step, either one number or [apples eaten, seconds] points from 0 apples on.
+Power-up times are in ms of simulation time.
+
+load() validates a file once and compiles it into a binary form: a header,
+the validated rules as canonical JSON and the obstacle layout as a bitmap of
+one bit per cell. The compiled level is stored in CACHE_DIR under the hash
+of the file's contents, so later loads of an unchanged file only map the
+compiled file and never parse or validate it again. Replays name their level
+by that hash too. Each level builds its obstacles, cell dict and free-cell
+arrays once per process; a new game copies them rather than placing every
+obstacle.
+
+    python levels.py check resources/levels/*      validate
+    python levels.py compile resources/levels/*    fill the cache ahead of time
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import compress
+
+from engine import Board, Obstacle, POWER_TYPES, SAFE_ZONE, index_typecode
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+CACHE_DIR = "level_cache"
+MAGIC = b"SNKL"
+VERSION = 1
+HEADER = struct.Struct("<4sBHHI")  # magic, version, cols, rows, length of the rules JSON
+KEY_BYTES = 16  # bytes of the content hash that name a compiled level
+EXTENSION = ".lvl"
+
+KEYS = {"name", "board", "layout", "random_obstacles", "speed", "power_ups"}
+POWER_UP_KEYS = {"weights", "lifetime", "spawn_interval", "spawn_chance", "effect_time"}
+OBSTACLE, EMPTY = "#", ". "
+MIN_STEP, MAX_STEP = 0.01, 5.0  # s per step a speed curve may ask for
+BLOCKED = bytes.maketrans(b"01", b"\x00\x01")  # a bitmap's bits as text -> one selector byte per cell
+
+class LevelError(ValueError):
+    pass
+
+class Level:
+    """A validated level: its board, obstacle bitmap and rules, named by the hash of its file"""
+    def __init__(self, key, name, board, bitmap, random_obstacles=None, speed=None, power_ups=None):
+        self.key = key  # hex digest
+        self.name = name
+        self.board = board
+        self.bitmap = bitmap  # bit i % 8 of byte i // 8 is set when cell i holds an obstacle
+        self.layout_count = bin(int.from_bytes(bitmap, "little")).count("1")  # obstacles in the layout
+        self.random_obstacles = random_obstacles  # None: as many as the difficulty places
+        self.speed = speed  # [(apples, seconds per step)] from 0 apples on, or None
+        self.power_ups = power_ups or {}  # engine rule -> value; weights as a list in POWER_TYPES order
+        self.world = None
+
+    def speed_at(self, apples, default):
+        """Seconds per step once apples have been eaten"""
+        if self.speed is None:
+            return default
+        seconds = default
+        for threshold, step in self.speed:
+            if apples < threshold:
+                break
+            seconds = step
+        return seconds
+
+    def cells(self):
+        """Obstacle cells in index order"""
+        size = self.board.size
+        bits = format(int.from_bytes(self.bitmap, "little"), f"0{len(self.bitmap) * 8}b")[::-1]
+        return list(compress(range(size), bits[:size].encode().translate(BLOCKED)))
+
+    def obstacle_world(self):
+        """(obstacles, cell -> Obstacle, free cells, free slots) for the layout, built on first use
+
+        Engine.reset copies these instead of building them; the Obstacle objects
+        are shared, as obstacles never move.
+        """
+        if self.world is None:
+            board = self.board
+            obstacles, items = [], {}
+            blocked = self.cells()
+            for i in blocked:
+                obstacle = Obstacle(*board.position(i))
+                obstacles.append(obstacle)
+                items[i] = obstacle
+            typecode = index_typecode(board.size)
+            free = array(typecode, (i for i in range(board.size) if i not in items))
+            slot = array(typecode, [-1]) * board.size
+            for position, i in enumerate(free):
+                slot[i] = position
+            self.world = (obstacles, items, free, slot)
+        return self.world
+
+    def rules(self):
+        """Everything but the board and the layout, as it goes into the compiled form"""
+        power_ups = dict(self.power_ups)
+        if "weights" in power_ups:
+            power_ups["weights"] = dict(zip(POWER_TYPES, power_ups["weights"]))
+        return {"name": self.name, "random_obstacles": self.random_obstacles,
+                "speed": self.speed, "power_ups": power_ups}
+
+    def to_bytes(self):
+        rules = json.dumps(self.rules(), sort_keys=True, separators=(",", ":")).encode()
+        return HEADER.pack(MAGIC, VERSION, self.board.cols, self.board.rows, len(rules)) + rules + bytes(self.bitmap)
+
+    @classmethod
+    def from_bytes(cls, data, key):
+        """Read a compiled level; data may be a memory map, which the bitmap then stays a view of"""
+        if len(data) < HEADER.size or bytes(data[:4]) != MAGIC:
+            raise LevelError("Not a compiled level")
+        magic, version, cols, rows, length = HEADER.unpack_from(data)
+        if version != VERSION:
+            raise LevelError(f"Unsupported compiled level version {version}")
+        try:
+            board = Board(cols, rows)
+        except ValueError as e:
+            raise LevelError(str(e))
+        end = HEADER.size + length
+        bitmap = memoryview(data)[end:end + bitmap_size(board)]
+        if len(bitmap) != bitmap_size(board):
+            raise LevelError("Truncated compiled level")
+        # The rules were validated before they were compiled; this only restores their types
+        try:
+            rules = json.loads(bytes(data[HEADER.size:end]))
+            power_ups = rules["power_ups"]
+            if "weights" in power_ups:
+                power_ups["weights"] = [power_ups["weights"][power_type] for power_type in POWER_TYPES]
+            speed = [tuple(point) for point in rules["speed"]] if rules["speed"] is not None else None
+            return cls(key, rules["name"], board, bitmap, rules["random_obstacles"], speed, power_ups)
+        except (ValueError, KeyError, TypeError) as e:
+            raise LevelError(f"Corrupt compiled level: {e}")
+
+def bitmap_size(board):
+    return (board.size + 7) // 8
+
+def content_key(data):
+    """Hex name of a level file's contents, which changes with the compiler's VERSION too"""
+    return hashlib.sha256(bytes([VERSION]) + data).hexdigest()[:2 * KEY_BYTES]
+
+def parse(data, path):
+    """The level file's contents as a dict"""
+    try:
+        if path.lower().endswith(".toml"):
+            if tomllib is None:
+                raise LevelError("TOML levels need Python 3.11 or later")
+            source = tomllib.loads(data.decode())
+        else:
+            source = json.loads(data)
+    except (ValueError, UnicodeDecodeError) as e:  # TOMLDecodeError and JSONDecodeError are ValueErrors
+        raise LevelError(f"Could not parse {path}: {e}")
+    if not isinstance(source, dict):
+        raise LevelError(f"{path}: a level is a table of settings")
+    return source
+
+def is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate(source, key, default_name):
+    """A Level from a parsed file, or LevelError saying what is wrong with it"""
+    unknown = set(source) - KEYS
+    if unknown:
+        raise LevelError(f"Unknown setting {sorted(unknown)[0]!r}")
+    name = source.get("name", default_name)
+    if not isinstance(name, str):
+        raise LevelError("name must be a string")
+
+    layout = source.get("layout")
+    if layout is not None:
+        if not isinstance(layout, list) or not layout or not all(isinstance(row, str) for row in layout):
+            raise LevelError("layout must be a list of strings, one per row")
+    if "board" in source:
+        size = source["board"]
+        if not isinstance(size, list) or len(size) != 2 or not all(is_int(n) for n in size):
+            raise LevelError("board must be [cols, rows]")
+        cols, rows = size
+    elif layout is not None:
+        cols, rows = max(len(row) for row in layout), len(layout)
+    else:
+        cols, rows = Board().cols, Board().rows
+    try:
+        board = Board(cols, rows)
+    except ValueError as e:
+        raise LevelError(str(e))
+
+    bitmap = bytearray(bitmap_size(board))
+    count = 0
+    if layout is not None:
+        if len(layout) != rows:
+            raise LevelError(f"layout has {len(layout)} rows, the board {rows}")
+        for row, line in enumerate(layout):
+            if len(line) != cols:
+                raise LevelError(f"layout row {row} is {len(line)} cells wide, the board {cols}")
+            for col, char in enumerate(line):
+                if char == OBSTACLE:
+                    if row < SAFE_ZONE and col < SAFE_ZONE:
+                        raise LevelError(f"obstacle at column {col}, row {row} is in the {SAFE_ZONE}x{SAFE_ZONE} "
+                                         "corner the snake starts in")
+                    i = row*cols + col
+                    bitmap[i // 8] |= 1 << (i % 8)
+                    count += 1
+                elif char not in EMPTY:
+                    raise LevelError(f"layout row {row} has {char!r}; use '#' for obstacles and '.' for empty cells")
+
+    random_obstacles = source.get("random_obstacles", 0 if layout is not None else None)
+    if random_obstacles is not None:
+        if not is_int(random_obstacles) or random_obstacles < 0:
+            raise LevelError("random_obstacles must be a whole number, 0 or more")
+        if count + random_obstacles > board.size // 2:
+            raise LevelError(f"{count + random_obstacles} obstacles fill more than half of the board")
+
+    speed = source.get("speed")
+    if speed is not None:
+        if is_number(speed):
+            speed = [[0, speed]]
+        if not isinstance(speed, list) or not speed:
+            raise LevelError("speed must be seconds per step, or a list of [apples, seconds] points")
+        points = []
+        for point in speed:
+            if not (isinstance(point, list) and len(point) == 2 and is_int(point[0]) and is_number(point[1])):
+                raise LevelError("speed points must be [apples, seconds]")
+            apples, seconds = point
+            if not MIN_STEP <= seconds <= MAX_STEP:
+                raise LevelError(f"speed of {seconds} s per step is outside {MIN_STEP} to {MAX_STEP}")
+            if points and apples <= points[-1][0] or not points and apples != 0:
+                raise LevelError("speed points must start at 0 apples and go up")
+            points.append((apples, float(seconds)))
+        speed = points
+
+    power_ups = source.get("power_ups", {})
+    if not isinstance(power_ups, dict):
+        raise LevelError("power_ups must be a table")
+    unknown = set(power_ups) - POWER_UP_KEYS
+    if unknown:
+        raise LevelError(f"Unknown power_ups setting {sorted(unknown)[0]!r}")
+    rules = {}
+    if "weights" in power_ups:
+        weights = power_ups["weights"]
+        if not isinstance(weights, dict) or set(weights) - set(POWER_TYPES):
+            raise LevelError(f"power_ups.weights must map some of {POWER_TYPES} to numbers")
+        weights = [weights.get(power_type, 0) for power_type in POWER_TYPES]
+        if not all(is_number(w) and w >= 0 for w in weights) or not any(weights):
+            raise LevelError("power_ups.weights must be 0 or more, and not all 0")
+        rules["weights"] = weights
+    for setting in ("lifetime", "spawn_interval", "effect_time"):
+        if setting in power_ups:
+            value = power_ups[setting]
+            if not is_int(value) or value <= 0:
+                raise LevelError(f"power_ups.{setting} must be a whole number of ms above 0")
+            rules[setting] = value
+    if "spawn_chance" in power_ups:
+        chance = power_ups["spawn_chance"]
+        if not is_number(chance) or not 0 <= chance <= 1:
+            raise LevelError("power_ups.spawn_chance must be between 0 and 1")
+        rules["spawn_chance"] = float(chance)
+    return Level(key, name, board, bytes(bitmap), random_obstacles, speed, rules)
+
+_loaded = {}  # key -> Level, so every game of a level in this process shares its obstacle world
+
+def cache_path(key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, key + EXTENSION)
+
+def read_compiled(path, key):
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            raise LevelError("Not a compiled level")
+    return Level.from_bytes(data, key)
+
+def load(path, cache_dir=CACHE_DIR):
+    """The level in the file at path, from the compiled cache when the file hasn't changed"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        raise LevelError(f"Could not read {path}: {e}")
+    key = content_key(data)
+    level = _loaded.get(key)
+    if level is not None:
+        return level
+    compiled = cache_path(key, cache_dir)
+    try:
+        level = read_compiled(compiled, key)
+    except (OSError, LevelError):
+        default_name = os.path.splitext(os.path.basename(path))[0]
+        level = validate(parse(data, path), key, default_name)
+        save(level, compiled)
+    _loaded[key] = level
+    return level
+
+def by_key(key, cache_dir=CACHE_DIR):
+    """A level that was loaded before, by its key (what a replay stores)"""
+    level = _loaded.get(key)
+    if level is None:
+        try:
+            level = read_compiled(cache_path(key, cache_dir), key)
+        except OSError:
+            raise LevelError(f"Level {key} is not in {cache_dir}/; load its file once to compile it")
+        _loaded[key] = level
+    return level
+
+def save(level, path):
+    """Write the compiled level; a read-only cache only costs the next load a compile"""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(temporary, "wb") as f:
+            f.write(level.to_bytes())
+        os.replace(temporary, path)  # readers never see half a file
+    except OSError as e:
+        print(f"Could not cache level {level.name} in {path} ({e})")
+
+def main(argv):
+    if len(argv) >= 2 and argv[0] in ("check", "compile"):
+        ok = True
+        for path in argv[1:]:
+            try:
+                if argv[0] == "compile":
+                    level = load(path)
+                    print(f"{path}: {level.name}, {level.board.cols}x{level.board.rows} -> {cache_path(level.key)}")
+                else:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    level = validate(parse(data, path), content_key(data), path)
+                    print(f"{path}: OK ({level.board.cols}x{level.board.rows}, {len(level.cells())} obstacles)")
+            except (OSError, LevelError) as e:
+                print(f"{path}: {e}")
+                ok = False
+        return 0 if ok else 1
+    print(__doc__)
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
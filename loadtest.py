@@ -0,0 +1,184 @@
+"""Load test for server.py: many players and spectators from one process
+
+Opens --players connections that play, turning at random, and --spectators
+that only watch, all on one asyncio loop. Every connection reads and splits
+its frames like a real client. The first --mirrors connections also decode
+every snapshot into a net.Mirror. A few --slow spectators read at a tenth
+of the tick rate, to exercise the server's send queues and resyncs (they
+fall behind by SEND_QUEUE frames plus the socket buffers in about 30 s).
+
+With no --port the server runs in this process. At the end its rooms stop
+ticking, the clients catch up, and every mirror is compared with the
+authoritative arena.
+
+    python loadtest.py --players 100 --spectators 1000 --seconds 30
+    python loadtest.py --port 7777 --players 50         against a running server
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import sys
+import time
+
+import net
+from arena import board_size
+from engine import Board
+from server import Server, HOST, ROOM
+
+PLAYERS = 50
+SPECTATORS = 200
+MIRRORS = 20
+SECONDS = 10.0
+SLOW = 10  # ticks a slow client waits between two reads
+TURN_CHANCE = 0.2  # chance a player turns on each tick it hears about
+CATCH_UP = 10.0  # s the clients get to read what the server sent before the check
+
+class Client:
+    """One connection of the load test"""
+    def __init__(self, mode, mirror, slow, rng):
+        self.mode = mode
+        self.keep_mirror = mirror
+        self.slow = slow
+        self.rng = rng
+        self.mirror = None
+        self.ticks = 0
+        self.frames = 0
+        self.bytes = 0
+        self.fulls = 0
+        self.max_gap = 0.0  # s between two frames
+        self.error = None
+        self.connected = False
+
+    async def run(self, host, port, room, stop):
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            if self.slow:
+                # A small window makes the server's queue, not the kernel, absorb the backlog
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            sock.setblocking(False)
+            await asyncio.get_running_loop().sock_connect(sock, (host, port))
+            reader, writer = await asyncio.open_connection(sock=sock, limit=1024 if self.slow else 2**16)
+        except OSError as e:
+            sock.close()
+            self.error = f"connect: {e}"
+            return
+        self.connected = True
+        try:
+            writer.write(net.hello(self.mode, room))
+            player_id, board, tick_ms = net.read_welcome(await net.read_frame(reader))
+            if self.keep_mirror:
+                self.mirror = net.Mirror(player_id, board)
+            last = time.perf_counter()
+            while not stop.is_set():
+                try:
+                    payload = await asyncio.wait_for(net.read_frame(reader), 1.0)
+                except asyncio.TimeoutError:
+                    continue
+                now = time.perf_counter()
+                if self.frames:
+                    self.max_gap = max(self.max_gap, now - last)
+                last = now
+                self.frames += 1
+                self.bytes += net.FRAME.size + len(payload)
+                self.ticks = net.TICK.unpack_from(payload)[1]
+                if payload[0] == net.FULL:
+                    self.fulls += 1
+                if self.mirror is not None:
+                    self.mirror.apply(payload)
+                if self.mode == net.PLAY and self.rng.random() < TURN_CHANCE:
+                    writer.write(net.turn(self.rng.randrange(4)))
+                if self.slow:
+                    await asyncio.sleep(SLOW * tick_ms / 1000)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, net.ProtocolError) as e:
+            self.error = type(e).__name__
+        finally:
+            self.connected = False
+            writer.close()
+
+def differences(mirror, arena):
+    """Snakes and items of mirror that don't match arena"""
+    board = arena.board
+    snakes = {player.id: [(x, y) if board.index(x, y) is not None else mirror.position(net.OFF_BOARD)
+                          for x, y in player.snake.body] for player in arena.players if player.alive}
+    theirs = {player_id: list(snake.body) for player_id, snake in mirror.snakes_by_id.items()}
+    items = {cell: net.kind_of(item) for cell, item in arena.items.items()}
+    mine = {cell: net.kind_of(item) for cell, item in mirror.items.items()}
+    return (sum(snakes.get(i) != theirs.get(i) for i in set(snakes) | set(theirs)) +
+            sum(items.get(i) != mine.get(i) for i in set(items) | set(mine)))
+
+async def run(args):
+    server = None
+    host, port = args.host, args.port
+    if port is None:
+        server = Server(args.bots, args.board, args.difficulty, seed=0)
+        listener = await server.start(host, 0)
+        port = listener.sockets[0].getsockname()[1]
+
+    rng = random.Random(0)
+    clients = [Client(net.PLAY, k < args.mirrors, False, random.Random(rng.random())) for k in range(args.players)]
+    clients += [Client(net.WATCH, len(clients) + k < args.mirrors, False, None) for k in range(args.spectators)]
+    clients += [Client(net.WATCH, True, True, None) for _ in range(args.slow)]
+    stop = asyncio.Event()
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(client.run(host, port, args.room, stop)) for client in clients]
+    await asyncio.sleep(args.seconds)
+
+    report = {}
+    if server is not None:
+        # Freeze the arena and let every client read up to its last tick
+        room = server.rooms[args.room]
+        room.task.cancel()
+        final = room.arena.ticks
+        deadline = time.perf_counter() + CATCH_UP
+        while time.perf_counter() < deadline:
+            if all(client.ticks >= final or not client.connected for client in clients if not client.slow):
+                break
+            await asyncio.sleep(0.05)
+        checked = [client for client in clients if client.mirror is not None and client.connected and client.ticks == final]
+        report["server"] = room.stats()
+        report["mirrors_checked"] = len(checked)
+        report["mirror_mismatches"] = sum(differences(client.mirror, room.arena) > 0 for client in checked)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*tasks)
+    if server is not None:
+        listener.close()
+        await server.stop()
+
+    players = [client for client in clients if client.mode == net.PLAY]
+    gaps = sorted(client.max_gap for client in clients if not client.slow)
+    report.update({
+        "players": len(players),
+        "spectators": len(clients) - len(players),
+        "seconds": round(elapsed, 1),
+        "frames_per_client": round(sum(client.frames for client in clients) / len(clients), 1),
+        "kbytes_per_client_per_sec": round(sum(client.bytes for client in clients) / len(clients) / elapsed / 1024, 2),
+        "fulls_after_the_first": sum(max(0, client.fulls - 1) for client in clients),
+        "slow_fulls_after_the_first": sum(max(0, client.fulls - 1) for client in clients if client.slow),
+        "max_gap_p50_ms": round(gaps[len(gaps) // 2] * 1000, 1) if gaps else None,
+        "max_gap_p99_ms": round(gaps[int(len(gaps) * 0.99)] * 1000, 1) if gaps else None,
+        "errors": sum(client.error is not None for client in clients),
+    })
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the snake server with many local clients")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=None, help="server to test (default: start one in this process)")
+    parser.add_argument("--room", default=ROOM)
+    parser.add_argument("--players", type=int, default=PLAYERS)
+    parser.add_argument("--spectators", type=int, default=SPECTATORS)
+    parser.add_argument("--slow", type=int, default=2, help="spectators reading at a tenth of the tick rate")
+    parser.add_argument("--mirrors", type=int, default=MIRRORS, help="clients that decode every snapshot")
+    parser.add_argument("--seconds", type=float, default=SECONDS)
+    parser.add_argument("--bots", type=int, default=20, help="bots in the in-process server's room")
+    parser.add_argument("--board", type=board_size, default=Board(100, 100), metavar="COLSxROWS")
+    parser.add_argument("--difficulty", type=int, default=1)
+    args = parser.parse_args(argv)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,120 +1,48 @@
-import pygame
-from pygame.locals import *
 import time
-import random
+STARTED = time.perf_counter()  # startup phases are timed from here, before pygame is imported
+import pygame
+from pygame.locals import (QUIT, KEYDOWN, K_UP, K_DOWN, K_LEFT, K_RIGHT, K_RETURN, K_KP_ENTER, K_ESCAPE,
+                           K_BACKSPACE, K_TAB, K_F3, K_p, K_1, K_2, K_3, K_4)
 import os
+import sys
 import json
+import sqlite3
+import struct
+import threading
+from collections import OrderedDict
+from assets import Assets
+from text import Text
+from renderer import Renderer
+from profiler import Profiler, Overlay
+from engine import Engine, Board, DIFFICULTIES, EAT_APPLE, EAT_POWER_UP, CRASH, COLS, ROWS, SIZE
+from camera import Camera, Chunks
+from arena import Arena
+from replay import Replay, ReplayError
+import snapshot
+from levels import load as load_level, LevelError
+from autopilot import Autopilot
+from inputs import InputQueue
+from audio import Audio, FREQUENCY, BUFFER
+from scores import ScoreStore
 
-SIZE = 24
-
-class Apple:
-    def __init__(self, parent_screen):
-        self.image = pygame.image.load("Snake_Apple_Game/resources/apple.jpg").convert()
-        new_size = (25, 25)
-        self.scaled_image = pygame.transform.scale(self.image, new_size)
-        self.parent_screen = parent_screen
-        self.x = SIZE*3
-        self.y = SIZE*3
-
-    def draw(self):
-        self.parent_screen.blit(self.scaled_image,(self.x,self.y))
-    
-    def move(self):
-        self.x = random.randint(0,25)*SIZE
-        self.y = random.randint(0,18)*SIZE
-
-class PowerUp:
-    def __init__(self, parent_screen, power_type):
-        self.parent_screen = parent_screen
-        self.power_type = power_type  # 'double', 'shrink', 'speed'
-        self.x = random.randint(0,37)*SIZE
-        self.y = random.randint(0,30)*SIZE
-        self.spawn_time = time.time()
-        self.lifetime = 10  # Power-up disappears after 10 seconds
-        
-        # Create different colored squares for different power-ups
-        self.image = pygame.Surface((25, 25))
-        if power_type == 'double':
-            self.image.fill((255, 215, 0))  # Gold
-        elif power_type == 'shrink':
-            self.image.fill((0, 255, 255))  # Cyan
-        elif power_type == 'speed':
-            self.image.fill((255, 0, 255))  # Magenta
-    
-    def draw(self):
-        self.parent_screen.blit(self.image, (self.x, self.y))
-    
-    def is_expired(self):
-        return time.time() - self.spawn_time > self.lifetime
-
-class Obstacle:
-    def __init__(self, parent_screen, x, y):
-        self.parent_screen = parent_screen
-        self.x = x
-        self.y = y
-        self.image = pygame.Surface((25, 25))
-        self.image.fill((139, 69, 19))  # Brown color
-    
-    def draw(self):
-        self.parent_screen.blit(self.image, (self.x, self.y))
-
-class Snake:
-    def __init__(self, parent_screen, length):
-        self.length = length
-        self.parent_screen = parent_screen
-        block = pygame.image.load("Snake_Apple_Game/resources/red-square-png-14.png").convert()
-        new_size = (25, 25)  # for example
-        self.scaled_image = pygame.transform.scale(block, new_size)
-        self.x = [SIZE]*length
-        self.y = [SIZE]*length
-        self.direction = 'down'
-
-    def increase_length(self):
-        self.length+=1
-        self.x.append(-1)
-        self.y.append(-1)
-
-    def decrease_length(self):
-        if self.length > 2:
-            self.length -= 1
-            self.x.pop()
-            self.y.pop()
-
-    def draw(self):
-        for i in range(self.length):
-            self.parent_screen.blit(self.scaled_image,(self.x[i],self.y[i]))
-        pygame.display.flip()
-
-
-        
-    def move_left(self):
-        self.direction = 'left'
-    
-    def move_right(self):
-        self.direction = 'right'
-    
-    def move_up(self):
-        self.direction = 'up'
-
-    def move_down(self):
-        self.direction = 'down'
-    
-    def walk(self):
-
-        for i in range(self.length-1,0,-1):
-            self.x[i] = self.x[i-1]
-            self.y[i] = self.y[i-1]
-
-        if self.direction == 'left':
-            self.x[0] -= SIZE
-        if self.direction == 'right':
-            self.x[0] += SIZE
-        if self.direction == 'up':
-            self.y[0] -= SIZE
-        if self.direction == 'down':
-            self.y[0] += SIZE
-
-        self.draw()
+MAX_FRAME_TIME = 250  # ms of wall time fed to the simulation per frame, so a stall can't snowball
+REPLAY_DIR = "replays"
+SCORES_PATH = "scores.db"
+SAVE_PATH = "savegame.bin"  # the game in progress, offered again on the next start
+AUTOSAVE_INTERVAL = 5.0  # s of play between saves, so a power cut loses little
+# A save is this header (snapshot length, power-ups collected), the snapshot, then the replay so far
+SAVE_HEADER = struct.Struct("<II")
+PLAYER_ENV = "SNAKE_PLAYER"  # name the games are recorded under
+BOARD_ENV = "SNAKE_BOARD"  # COLSxROWS, e.g. 500x500; boards larger than the window scroll
+ARENA_ENV = "SNAKE_ARENA"  # number of computer snakes sharing the board with the player
+LEVEL_ENV = "SNAKE_LEVEL"  # path of a level file (levels.py) to play instead of the plain board
+MAX_LEVEL_LAYERS = 16  # levels whose baked obstacle layer is kept
+KEY_ACTIONS = {K_UP: 'up', K_DOWN: 'down', K_LEFT: 'left', K_RIGHT: 'right'}
+PROFILE_ENV = "SNAKE_PROFILE"  # set to a .csv or .json path to dump frame timings every second, and print startup timings
+# Audio settings: SNAKE_AUDIO=off runs without sound, the others tune the mixer
+AUDIO_ENV = "SNAKE_AUDIO"
+AUDIO_RATE = int(os.environ.get("SNAKE_AUDIO_RATE", FREQUENCY))
+AUDIO_BUFFER = int(os.environ.get("SNAKE_AUDIO_BUFFER", BUFFER))
 
 class GameState:
     MENU = "menu"
@@ -126,11 +54,54 @@ class GameState:
 
 class Game:
     def __init__(self):
-        pygame.init()
+        # Only the display is opened before the first frame. The mixer, the music and the
+        # gameplay images load on a thread meanwhile (load_in_background), fonts on first use.
+        self.startup = {}  # phase -> seconds
+        start = self.phase("imports", STARTED)
+        pygame.display.init()
         pygame.display.set_caption("Snake Game")
         
         self.surface = pygame.display.set_mode((800, 600))
         self.clock = pygame.time.Clock()
+        start = self.phase("display", start)
+        
+        # Each image is decoded, converted and scaled once; the menu needs only the background
+        self.assets = Assets()
+        try:
+            self.background = self.assets.image("bg_image.jpg", (800, 600))
+        except (pygame.error, OSError):
+            self.background = pygame.Surface((800, 600)).convert()
+            self.background.fill((36, 138, 43))
+        start = self.phase("background", start)
+        
+        # Phase timings per frame; F3 shows them over the playfield
+        self.profiler = Profiler(dump_path=os.environ.get(PROFILE_ENV))
+        
+        # Gameplay frames only push the rectangles that changed
+        self.renderer = Renderer(self.surface, self.background, self.profiler)
+        
+        # One converted sprite per kind of entity, shared by all of them (the decoded
+        # ones, snake_image and apple_image, come from the loader)
+        self.bot_image = self.assets.solid((65, 105, 225), (25, 25))  # Royal blue
+        self.obstacle_image = self.assets.solid((139, 69, 19), (25, 25))  # Brown color
+        self.power_up_images = {}
+        for power_type, color in [('double', (255, 215, 0)),  # Gold
+                                  ('shrink', (0, 255, 255)),  # Cyan
+                                  ('speed', (255, 0, 255))]:  # Magenta
+            self.power_up_images[power_type] = self.assets.solid(color, (25, 25))
+        # Obstacles never move during a game, so on a board that fits the window they are
+        # baked into a copy of the background instead of being drawn as sprites
+        self.obstacle_layer = None
+        self.layer_obstacles = None  # the obstacle list the layer was baked from
+        self.layer_count = 0
+        self.level_layers = OrderedDict()  # level key -> background with the level's layout on it
+        
+        # Fonts, rendered labels and static screens
+        self.text = Text()
+        self.overlay = Overlay(self.profiler, self.text)
+        self.pause_overlay = pygame.Surface((800, 600))
+        self.pause_overlay.set_alpha(128)
+        self.pause_overlay.fill((0, 0, 0))
         
         # Game state management
         self.state = GameState.MENU
@@ -140,39 +111,102 @@ class Game:
         self.game_over_selection = 0
         
         # Difficulty settings
-        self.difficulties = {
-            0: {"name": "Easy", "speed": 0.15, "obstacles": False},
-            1: {"name": "Medium", "speed": 0.1, "obstacles": False},
-            2: {"name": "Hard", "speed": 0.05, "obstacles": True}
-        }
-        
-        # Game objects
-        self.snake = None
-        self.apple = None
-        self.obstacles = []
-        self.power_ups = []
-        self.power_up_timer = 0
-        self.speed_boost = 1.0
-        self.speed_boost_timer = 0
-        
-        # Score and high score
-        self.score_multiplier = 1
-        self.multiplier_timer = 0
-        self.high_score = self.load_high_score()
-        
-        # Initialize audio
+        self.difficulties = DIFFICULTIES
+        
+        # Game rules run headless in the engine; this class only renders its state
+        self.board = Board()
+        if os.environ.get(BOARD_ENV):
+            try:
+                cols, _, rows = os.environ[BOARD_ENV].lower().partition("x")
+                self.board = Board(int(cols), int(rows))
+            except ValueError as e:
+                print(f"Ignoring {BOARD_ENV}: {e}")
+        self.bots = 0
+        if os.environ.get(ARENA_ENV):
+            try:
+                self.bots = max(0, int(os.environ[ARENA_ENV]))
+            except ValueError as e:
+                print(f"Ignoring {ARENA_ENV}: {e}")
+        self.level = None
+        if os.environ.get(LEVEL_ENV):
+            path = os.environ[LEVEL_ENV]
+            if self.bots:
+                print(f"Ignoring {LEVEL_ENV}: levels are for one snake")
+            else:
+                try:
+                    self.level = load_level(path)
+                    self.board = self.level.board
+                except LevelError as e:
+                    print(f"Could not load level {path} ({e})")
+        self.autopilot = None
+        self.set_board(self.board, self.bots, self.level)
+        self.accumulator = 0
+        self.inputs = InputQueue()  # directions pressed, applied one per simulation step
+        
+        # Every game is recorded; a replay being watched supplies the inputs instead of the keyboard
+        self.recording = None
+        self.watching = None
+        
+        # A game left unfinished is saved when paused or left, and every AUTOSAVE_INTERVAL while playing
+        self.save_file = snapshot.SaveFile(SAVE_PATH)
+        self.saved_at = 0
+        
+        # Finished games are stored in the background; the high score carries over from highscore.txt
         try:
-            pygame.mixer.init()
-            self.play_background_music()
-        except:
-            print("Audio initialization failed - continuing without sound")
+            self.scores = ScoreStore(SCORES_PATH)
+            best = self.scores.best()
+        except sqlite3.Error as e:
+            print(f"Could not open {SCORES_PATH} ({e}) - scores won't be saved")
+            self.scores = None
+            best = 0
+        self.player = os.environ.get(PLAYER_ENV, "player")
+        self.power_ups_collected = 0
+        self.high_score = max(self.load_high_score(), best)
+        
+        # Effects are decoded by the loader and played on reserved channels
+        self.audio = Audio(self.assets, os.environ.get(AUDIO_ENV) != "off", AUDIO_RATE, AUDIO_BUFFER)
+        self.phase("setup", start)
+        # Not a daemon: exiting waits for it rather than closing pygame under it
+        self.loader = threading.Thread(target=self.load_in_background, name="loader")
+        self.loader.start()
+    
+    def phase(self, name, start):
+        """Record the startup phase name as having run from start until now; returns now"""
+        now = time.perf_counter()
+        self.startup[name] = now - start
+        return now
+    
+    def report_startup(self, names):
+        if os.environ.get(PROFILE_ENV):
+            print("Startup: " + ", ".join(f"{name} {self.startup[name] * 1000:.1f} ms" for name in names))
+    
+    def load_in_background(self):
+        """Open the mixer and start the music, then decode the gameplay images, while the menu is up"""
+        start = time.perf_counter()
+        self.audio.open()
+        self.audio.play_music()
+        start = self.phase("audio", start)
+        # Only decoded here: convert() belongs to the main thread, which does it on first draw
+        self.assets.decode(["red-square-png-14.png", "apple.jpg"])
+        self.phase("sprites", start)
+        self.phase("loaded", STARTED)
+        self.report_startup(["audio", "sprites", "loaded"])
+    
+    @property
+    def snake_image(self):
+        # Decoded by the loader, or here if a game starts before it gets to it; converted here either way
+        return self.assets.image("red-square-png-14.png", (25, 25))
+    
+    @property
+    def apple_image(self):
+        return self.assets.image("apple.jpg", (25, 25))
     
     def load_high_score(self):
         try:
             if os.path.exists("highscore.txt"):
                 with open("highscore.txt", "r") as f:
                     return int(f.read().strip())
-        except:
+        except (OSError, ValueError):
             pass
         return 0
     
@@ -180,252 +214,359 @@ class Game:
         if score > self.high_score:
             self.high_score = score
     
-    def play_background_music(self):
-        pygame.mixer.music.load("Snake_Apple_Game/resources/bg.mp3")  # Path to your background music
-        pygame.mixer.music.play(-1)  # Play indefinitely
-
-    
-    def play_sound(self, sound_file):
+    def save_replay(self, replay):
         try:
-            sound = pygame.mixer.Sound(sound_file)
-            pygame.mixer.Sound.play(sound)
-        except:
-            pass
+            os.makedirs(REPLAY_DIR, exist_ok=True)
+            name = time.strftime("game-%Y%m%d-%H%M%S") + f"-{replay.seed}.replay"
+            replay.save(os.path.join(REPLAY_DIR, name))
+        except OSError:
+            print("Could not save replay")
+    
+    def save_game(self):
+        """Save the single-player game in progress, in the background"""
+        engine = self.engine
+        if (self.save_file is None or self.engine_bots or self.watching is not None
+                or not isinstance(engine, Engine) or engine.over or not engine.ticks):
+            return
+        state = snapshot.take(engine)
+        recording = self.recording.to_bytes() if self.recording is not None else b""
+        self.save_file.save(SAVE_HEADER.pack(len(state), self.power_ups_collected) + state + recording)
+        self.saved_at = time.perf_counter()
     
-    def render_background(self):
+    def resume_game(self):
+        """Load the saved game, if there is one, and show it paused; returns whether there was one"""
+        if self.save_file is None or self.bots:
+            return False
+        data = self.save_file.load()
+        if data is None:
+            return False
         try:
-            bg = pygame.image.load("Snake_Apple_Game/resources/bg_image.jpg").convert()
-            new_size = (800, 600)
-            self.surface.blit(pygame.transform.scale(bg, new_size), (0, 0))
-        except:
-            self.surface.fill((36, 138, 43))
-    
-    def is_collision(self, x1, y1, x2, y2):
-        if x1 >= x2 and x1 < x2+SIZE:
-            if y1 >= y2 and y1 < y2+SIZE:
-                return True
-        return False
+            length, power_ups = SAVE_HEADER.unpack_from(data)
+            state = data[SAVE_HEADER.size:SAVE_HEADER.size + length]
+            recording = data[SAVE_HEADER.size + length:]
+            recording = Replay.from_bytes(recording) if recording else None
+            snapshot.restore(state, self.engine)
+        except (struct.error, snapshot.SnapshotError, ReplayError) as e:
+            print(f"Could not load saved game {SAVE_PATH} ({e})")
+            self.save_file.discard()
+            return False
+        self.show(self.engine)
+        self.accumulator = 0
+        self.inputs.clear(self.engine.snake.direction)
+        self.power_ups_collected = power_ups
+        self.saved_at = time.perf_counter()
+        self.recording = recording
+        self.watching = None
+        # The pause menu paints over whatever is on screen, so put the board there first
+        self.draw_frame()
+        self.state = GameState.PAUSED
+        self.pause_selection = 0
+        self.audio.pause_music()
+        return True
+    
+    def set_board(self, board, bots=0, level=None):
+        """Play on board (or level) from now on, against bots computer snakes"""
+        if bots:
+            engine = Arena(bots + 1, self.difficulty_selection, board=board)
+        else:
+            engine = Engine(self.difficulty_selection, board=board, level=level)
+        self.engine_bots = bots
+        self.profiler.instrument(engine, ["walk", "spawn_power_up", "update_power_ups", "handle_collisions"], "sim")
+        self.show(engine)
+    
+    def show(self, engine):
+        """Draw engine's state from now on (an Engine, an Arena or a client's net.Mirror), through a
+        scrolling camera if its board is larger than the window"""
+        self.engine = engine
+        self.autopilot = None  # TAB hands the controls to the autopilot and back
+        board = engine.board
+        if board.cols <= COLS and board.rows <= ROWS:
+            self.camera = None
+            self.renderer.background = self.background
+            self.layer_obstacles = None
+        else:
+            self.camera = Camera(board, self.surface.get_size())
+            self.chunks = Chunks(board, self.background, self.obstacle_image)
+            # The static world under the camera, which the renderer repaints dirty rectangles from
+            self.renderer.background = pygame.Surface(self.surface.get_size()).convert()
+        self.reset_view()
+    
+    def reset_view(self):
+        """Point the camera at the start of a new game"""
+        if self.camera is not None:
+            self.camera.reset()
+            self.chunks.clear(self.engine.items)
+            self.chunks.compose(self.renderer.background, self.camera)
+        self.renderer.invalidate()
+    
+    def render_background(self, target=None):
+        if target is None:
+            target = self.surface
+        target.blit(self.background, (0, 0))
     
     def init_game(self):
         """Initialize a new game"""
-        self.snake = Snake(self.surface, 2)
-        self.apple = Apple(self.surface)
-        self.obstacles = []
-        self.power_ups = []
-        self.power_up_timer = time.time()
-        self.speed_boost = 1.0
-        self.speed_boost_timer = 0
-        self.score_multiplier = 1
-        self.multiplier_timer = 0
-        pygame.display.flip()
-        
-        # Create obstacles for hard difficulty
-        if self.difficulties[self.difficulty_selection]["obstacles"]:
-            for _ in range(5):
-                x = random.randint(5, 35) * SIZE
-                y = random.randint(5, 25) * SIZE
-                # Make sure obstacle doesn't spawn on snake or apple
-                while (x == self.snake.x[0] and y == self.snake.y[0]) or (x == self.apple.x and y == self.apple.y):
-                    x = random.randint(5, 35) * SIZE
-                    y = random.randint(5, 25) * SIZE
-                self.obstacles.append(Obstacle(self.surface, x, y))
-    
-    def spawn_power_up(self):
-        """Randomly spawn power-ups"""
-        if time.time() - self.power_up_timer > 15:  # Spawn every 15 seconds
-            if random.random() < 0.7:  # 70% chance to spawn
-                power_type = random.choice(['double', 'shrink', 'speed'])
-                power_up = PowerUp(self.surface, power_type)
-                # Make sure power-up doesn't spawn on snake, apple, or obstacles
-                valid_position = False
-                attempts = 0
-                while not valid_position and attempts < 50:
-                    power_up.x = random.randint(0, 37) * SIZE
-                    power_up.y = random.randint(0, 30) * SIZE
-                    valid_position = True
-                    
-                    # Check collision with snake
-                    for i in range(self.snake.length):
-                        if self.is_collision(power_up.x, power_up.y, self.snake.x[i], self.snake.y[i]):
-                            valid_position = False
-                            break
-                    
-                    # Check collision with apple
-                    if self.is_collision(power_up.x, power_up.y, self.apple.x, self.apple.y):
-                        valid_position = False
-                    
-                    # Check collision with obstacles
-                    for obstacle in self.obstacles:
-                        if self.is_collision(power_up.x, power_up.y, obstacle.x, obstacle.y):
-                            valid_position = False
-                            break
-                    
-                    attempts += 1
-                
-                if valid_position:
-                    self.power_ups.append(power_up)
-            
-            self.power_up_timer = time.time()
-    
-    def update_power_ups(self):
-        """Update power-up effects and remove expired ones"""
-        # Remove expired power-ups
-        self.power_ups = [pu for pu in self.power_ups if not pu.is_expired()]
-        
-        # Update speed boost timer
-        if self.speed_boost_timer > 0:
-            self.speed_boost_timer -= 1
-            if self.speed_boost_timer <= 0:
-                self.speed_boost = 1.0
-        
-        # Update score multiplier timer
-        if self.multiplier_timer > 0:
-            self.multiplier_timer -= 1
-            if self.multiplier_timer <= 0:
-                self.score_multiplier = 1
-    
-    def play(self):
-        """Main game loop"""
-        self.render_background()
-        self.snake.walk()
-        self.apple.draw()
-        pygame.display.flip()
-        
-        # Draw obstacles
-        for obstacle in self.obstacles:
-            obstacle.draw()
-        
-        # Spawn and draw power-ups
-        self.spawn_power_up()
-        for power_up in self.power_ups:
-            power_up.draw()
-        
-        self.update_power_ups()
-        self.display_score()
-        self.display_power_up_status()
+        if (self.engine.board != self.board or self.engine_bots != self.bots
+                or not self.bots and self.engine.level is not self.level):
+            self.set_board(self.board, self.bots, self.level)
+        self.engine.reset(self.difficulty_selection)
+        self.reset_view()
+        self.accumulator = 0
+        self.inputs.clear(self.engine.snake.direction)
+        self.power_ups_collected = 0
+        if self.save_file is not None:
+            self.save_file.discard()
+        self.saved_at = time.perf_counter()
+        # Replays hold single-snake games only
+        self.recording = Replay.start(self.engine) if not self.bots else None
+        self.watching = None
         pygame.display.flip()
-
-        # Snake colliding with apple
-        if self.is_collision(self.snake.x[0], self.snake.y[0], self.apple.x, self.apple.y):
-            self.play_sound("Snake_Apple_Game/resources/ding-sound-effect_2.mp3")
-            self.snake.increase_length()
-            self.apple.move()
-        
-        # Snake colliding with power-ups
-        for power_up in self.power_ups[:]:  # Use slice to avoid modification during iteration
-            if self.is_collision(self.snake.x[0], self.snake.y[0], power_up.x, power_up.y):
-                self.play_sound("Snake_Apple_Game/resources/ding-sound-effect_2.mp3")
-                
-                if power_up.power_type == 'double':
-                    self.score_multiplier = 2
-                    self.multiplier_timer = 300  # 5 seconds at 60 FPS
-                elif power_up.power_type == 'shrink':
-                    self.snake.decrease_length()
-                elif power_up.power_type == 'speed':
-                    self.speed_boost = 0.5  # Half speed (slower)
-                    self.speed_boost_timer = 300  # 5 seconds
-                
-                self.power_ups.remove(power_up)
-        
-        # Snake colliding with itself
-        for i in range(3, self.snake.length):
-            if self.is_collision(self.snake.x[0], self.snake.y[0], self.snake.x[i], self.snake.y[i]):
-                self.play_sound("Snake_Apple_Game/resources/Crash.mp3")
-                self.game_over()
-                return
-        
-        # Snake colliding with obstacles
-        for obstacle in self.obstacles:
-            if self.is_collision(self.snake.x[0], self.snake.y[0], obstacle.x, obstacle.y):
-                self.play_sound("Snake_Apple_Game/resources/Crash.mp3")
-                self.game_over()
-                return
-        
-        # Snake colliding with wall
-        if (self.snake.x[0] < 0 or self.snake.x[0] >= 800 or 
-            self.snake.y[0] < 0 or self.snake.y[0] >= 600):
-            self.play_sound("Snake_Apple_Game/resources/Crash.mp3")
+    
+    def watch(self, replay):
+        """Play back a recorded game through the normal gameplay screen"""
+        if self.engine.board != replay.board or self.engine_bots or self.engine.level is not replay.level:
+            self.set_board(replay.board, level=replay.level)
+        self.engine.reset(replay.difficulty, replay.seed)
+        self.reset_view()
+        self.accumulator = 0
+        self.recording = None
+        self.watching = replay.actions()
+        self.state = GameState.PLAYING
+    
+    def play(self, elapsed):
+        """Advance the simulation by elapsed ms of wall time in fixed steps, then draw once"""
+        start = time.perf_counter()
+        self.accumulator += min(elapsed, MAX_FRAME_TIME)
+        step = self.engine.step_time()
+        while self.accumulator >= step and self.state == GameState.PLAYING:
+            self.accumulator -= step
+            self.update()
+            step = self.engine.step_time()
+        if start - self.saved_at >= AUTOSAVE_INTERVAL:
+            self.save_game()
+        self.audio.flush()
+        self.profiler.add("sim", time.perf_counter() - start)
+        self.draw_frame()
+    
+    def update(self):
+        """Advance the game by exactly one simulation step"""
+        tick = self.engine.ticks + 1
+        if self.watching is not None:
+            action = self.watching.get(tick)
+        else:
+            direction = self.engine.snake.direction
+            if self.autopilot is not None:
+                action = self.autopilot.action()
+            else:
+                action = self.inputs.pop(direction)
+            if action == direction:
+                action = None
+            if action is not None and self.recording is not None:
+                self.recording.record(tick, action)
+        
+        events = self.engine.step(action)
+        if EAT_APPLE in events:
+            self.audio.play("eat")
+        if EAT_POWER_UP in events:
+            self.power_ups_collected += 1
+            self.audio.play("power_up")
+        if CRASH in events:
+            self.audio.play("crash")
             self.game_over()
+    
+    def bake_obstacles(self, obstacles):
+        """Make the renderer's background the plain background with obstacles drawn on it"""
+        # A level's layout comes first in the list and is baked once per level
+        level = getattr(self.engine, "level", None)
+        layout = level.layout_count if level is not None else 0
+        base = self.level_layer(level) if layout else self.background
+        if len(obstacles) > layout:
+            if self.obstacle_layer is None:
+                self.obstacle_layer = base.copy()
+            else:
+                self.obstacle_layer.blit(base, (0, 0))
+            self.obstacle_layer.blits([(self.obstacle_image, (obstacle.x, obstacle.y))
+                                       for obstacle in obstacles[layout:]], False)
+            self.renderer.background = self.obstacle_layer
+        else:
+            self.renderer.background = base
+        # Held on to, so a new game's list can't be mistaken for this one
+        self.layer_obstacles = obstacles
+        self.layer_count = len(obstacles)
+        self.renderer.invalidate()
+    
+    def level_layer(self, level):
+        """The background with level's layout drawn on it, kept by the level's key"""
+        layer = self.level_layers.get(level.key)
+        if layer is not None:
+            self.level_layers.move_to_end(level.key)
+            return layer
+        layer = self.background.copy()
+        layer.blits([(self.obstacle_image, (obstacle.x, obstacle.y)) for obstacle in level.obstacle_world()[0]], False)
+        self.level_layers[level.key] = layer
+        if len(self.level_layers) > MAX_LEVEL_LAYERS:
+            self.level_layers.popitem(last=False)
+        return layer
+    
+    def draw_frame(self):
+        """Composite the playfield and HUD, presenting only what changed since the last frame"""
+        if self.camera is not None:
+            self.draw_world()
             return
+        engine = self.engine
+        profiler = self.profiler
+        obstacles = engine.obstacles
+        if obstacles is not self.layer_obstacles or len(obstacles) != self.layer_count:
+            self.bake_obstacles(obstacles)
+        t0 = time.perf_counter()
+        sprites = []
+        for k, snake in enumerate(engine.snakes):
+            image = self.bot_image if k else self.snake_image
+            sprites += [(image, pos) for pos in snake.body]
+        t1 = time.perf_counter()
+        for apple in engine.apples:
+            sprites.append((self.apple_image, (apple.x, apple.y)))
+        t2 = time.perf_counter()
+        for power_up in engine.power_ups:
+            sprites.append((self.power_up_images[power_up.power_type], (power_up.x, power_up.y)))
+        t3 = time.perf_counter()
+        sprites += self.display_score()
+        sprites += self.display_power_up_status()
+        t4 = time.perf_counter()
+        profiler.add("draw.snake", t1 - t0)
+        profiler.add("draw.apples", t2 - t1)
+        profiler.add("draw.power_ups", t3 - t2)
+        profiler.add("draw.hud", t4 - t3)
+        if self.overlay.visible:
+            sprites.append((self.overlay.render(), (0, 0)))
+            profiler.add("draw.overlay", time.perf_counter() - t4)
+        self.renderer.present(sprites)
+    
+    def draw_world(self):
+        """Frame of a board larger than the window: the cells in view, seen through the camera"""
+        engine, camera, profiler = self.engine, self.camera, self.profiler
+        start = time.perf_counter()
+        snake = engine.snake
+        if snake is not None and camera.follow(*snake.head):
+            self.chunks.compose(self.renderer.background, camera)
+            self.renderer.invalidate()
+        composed = time.perf_counter()
+        
+        # Entities off screen are skipped; the same order as the fixed-board frame keeps overlaps identical
+        left, top = camera.x - SIZE, camera.y - SIZE
+        right, bottom = camera.x + camera.width, camera.y + camera.height
+        sprites = []
+        for k, snake in enumerate(engine.snakes):
+            image = self.bot_image if k else self.snake_image
+            sprites += [(image, (x - camera.x, y - camera.y)) for x, y in snake.body
+                        if left < x < right and top < y < bottom]
+        items = [(apple, self.apple_image) for apple in engine.apples]
+        items += [(power_up, self.power_up_images[power_up.power_type]) for power_up in engine.power_ups]
+        for item, image in items:
+            if left < item.x < right and top < item.y < bottom:
+                sprites.append((image, (item.x - camera.x, item.y - camera.y)))
+        gathered = time.perf_counter()
+        sprites += self.display_score()
+        sprites += self.display_power_up_status()
+        hud = time.perf_counter()
+        profiler.add("draw.chunks", composed - start)
+        profiler.add("draw.entities", gathered - composed)
+        profiler.add("draw.hud", hud - gathered)
+        if self.overlay.visible:
+            sprites.append((self.overlay.render(), (0, 0)))
+            profiler.add("draw.overlay", time.perf_counter() - hud)
+        self.renderer.present(sprites)
     
     def game_over(self):
         """Handle game over"""
-        current_score = (self.snake.length - 2) * self.score_multiplier
-        if current_score > self.high_score:
+        current_score = self.engine.score
+        if current_score > self.high_score and self.watching is None:
             self.high_score = current_score
             self.save_high_score(self.high_score)
             pygame.display.flip()
         
+        # The leaderboards compare games of the built-in difficulties only
+        if self.scores is not None and self.watching is None and not self.engine_bots and self.engine.level is None:
+            engine = self.engine
+            self.scores.record(self.player, engine.difficulty, current_score, engine.snake.length,
+                               engine.ticks, engine.sim_time, self.power_ups_collected, engine.seed)
+        
+        if self.recording is not None:
+            self.recording.finish(self.engine)
+            self.save_replay(self.recording)
+            self.recording = None
+        if self.save_file is not None and self.watching is None:
+            self.save_file.discard()
+        
         self.state = GameState.GAME_OVER
         self.game_over_selection = 0
-        pygame.mixer.music.pause()
+        self.audio.pause_music()
     
     def display_score(self):
-        font = pygame.font.SysFont('arial', 30)
-        current_score = (self.snake.length - 2) * self.score_multiplier
-        score_text = font.render(f"Score: {current_score}", True, (255, 255, 255))
-        self.surface.blit(score_text, (600, 10))
-        
-        high_score_text = font.render(f"High: {self.high_score}", True, (255, 255, 255))
-        self.surface.blit(high_score_text, (600, 45))
+        """Score and high score labels as sprites"""
+        current_score = self.engine.score
+        sprites = [
+            (self.text.render(f"Score: {current_score}", (255, 255, 255), 30), (600, 10)),
+            (self.text.render(f"High: {self.high_score}", (255, 255, 255), 30), (600, 45)),
+        ]
+        if self.autopilot is not None:
+            sprites.append((self.text.render("Autopilot", (0, 255, 255), 20), (600, 80)))
+        return sprites
     
     def display_power_up_status(self):
-        """Display active power-up status"""
-        font = pygame.font.SysFont('arial', 20)
+        """Active power-up status labels as sprites"""
+        sprites = []
         y_offset = 80
         
-        if self.score_multiplier > 1:
-            text = font.render(f"Double Points! ({self.multiplier_timer//60 + 1}s)", True, (255, 215, 0))
-            self.surface.blit(text, (10, y_offset))
+        if self.engine.score_multiplier > 1:
+            text = self.text.render(f"Double Points! ({self.engine.multiplier_timer//1000 + 1}s)", (255, 215, 0), 20)
+            sprites.append((text, (10, y_offset)))
             y_offset += 25
         
-        if self.speed_boost < 1.0:
-            text = font.render(f"Speed Boost! ({self.speed_boost_timer//60 + 1}s)", True, (255, 0, 255))
-            self.surface.blit(text, (10, y_offset))
+        if self.engine.speed_boost < 1.0:
+            text = self.text.render(f"Speed Boost! ({self.engine.speed_boost_timer//1000 + 1}s)", (255, 0, 255), 20)
+            sprites.append((text, (10, y_offset)))
+        
+        return sprites
     
     def show_menu(self):
         """Display main menu"""
-        self.render_background()
+        key = ("menu", self.menu_selection, self.high_score)
+        self.surface.blit(self.text.screen(key, (800, 600), self.draw_menu), (0, 0))
+        pygame.display.flip()
+    
+    def draw_menu(self, surface):
+        self.render_background(surface)
         
         # Title
-        font_title = pygame.font.SysFont('arial', 48)
-        title = font_title.render("SNAKE GAME", True, (255, 255, 255))
-        title_rect = title.get_rect(center=(400, 100))
-        self.surface.blit(title, title_rect)
+        self.text.draw(surface, "SNAKE GAME", (255, 255, 255), 48, center=(400, 100))
         
         # High Score
-        font_score = pygame.font.SysFont('arial', 24)
-        high_score_text = font_score.render(f"High Score: {self.high_score}", True, (255, 215, 0))
-        high_score_rect = high_score_text.get_rect(center=(400, 150))
-        self.surface.blit(high_score_text, high_score_rect)
+        self.text.draw(surface, f"High Score: {self.high_score}", (255, 215, 0), 24, center=(400, 150))
         
         # Menu options
-        font_menu = pygame.font.SysFont('arial', 32)
         menu_options = ["Start Game", "Instructions", "Select Difficulty", "Exit Game"]
         
         for i, option in enumerate(menu_options):
             color = (255, 255, 0) if i == self.menu_selection else (255, 255, 255)
-            text = font_menu.render(f"{i+1}. {option}", True, color)
-            text_rect = text.get_rect(center=(400, 220 + i * 50))
-            self.surface.blit(text, text_rect)
-        
-        pygame.display.flip()
+            self.text.draw(surface, f"{i+1}. {option}", color, 32, center=(400, 220 + i * 50))
     
     def show_instructions(self):
         """Display instructions screen"""
-        self.render_background()
+        self.surface.blit(self.text.screen(("instructions",), (800, 600), self.draw_instructions), (0, 0))
+        pygame.display.flip()
+    
+    def draw_instructions(self, surface):
+        self.render_background(surface)
         
-        font_title = pygame.font.SysFont('arial', 36)
-        title = font_title.render("HOW TO PLAY", True, (255, 255, 255))
-        title_rect = title.get_rect(center=(400, 80))
-        self.surface.blit(title, title_rect)
+        self.text.draw(surface, "HOW TO PLAY", (255, 255, 255), 36, center=(400, 80))
         
-        font_text = pygame.font.SysFont('arial', 24)
         instructions = [
             "Use ARROW KEYS to move the snake",
             "Eat apples to grow and increase your score",
             "Avoid hitting walls, obstacles, or yourself",
             "Press P to pause during gameplay",
+            "Press TAB to let the autopilot play",
             "Press ESC to quit",
             "",
             "POWER-UPS:",
@@ -448,99 +589,67 @@ class Game:
             else:
                 color = (255, 255, 255)
             
-            text = font_text.render(line, True, color)
-            text_rect = text.get_rect(center=(400, 140 + i * 30))
-            self.surface.blit(text, text_rect)
-        
-        pygame.display.flip()
+            self.text.draw(surface, line, color, 24, center=(400, 140 + i * 30))
     
     def show_difficulty_selection(self):
         """Display difficulty selection screen"""
-        self.render_background()
+        key = ("difficulty", self.difficulty_selection)
+        self.surface.blit(self.text.screen(key, (800, 600), self.draw_difficulty_selection), (0, 0))
+        pygame.display.flip()
+    
+    def draw_difficulty_selection(self, surface):
+        self.render_background(surface)
         
-        font_title = pygame.font.SysFont('arial', 36)
-        title = font_title.render("SELECT DIFFICULTY", True, (255, 255, 255))
-        title_rect = title.get_rect(center=(400, 150))
-        self.surface.blit(title, title_rect)
+        self.text.draw(surface, "SELECT DIFFICULTY", (255, 255, 255), 36, center=(400, 150))
         
-        font_menu = pygame.font.SysFont('arial', 28)
         difficulties = ["Easy - Slow speed", "Medium - Normal speed", "Hard - Fast speed + Obstacles"]
         
         for i, diff in enumerate(difficulties):
             color = (255, 255, 0) if i == self.difficulty_selection else (255, 255, 255)
-            text = font_menu.render(f"{i+1}. {diff}", True, color)
-            text_rect = text.get_rect(center=(400, 220 + i * 50))
-            self.surface.blit(text, text_rect)
-        
-        font_text = pygame.font.SysFont('arial', 20)
-        instruction = font_text.render("Use UP/DOWN arrows and press ENTER to select", True, (255, 255, 255))
-        instruction_rect = instruction.get_rect(center=(400, 400))
-        self.surface.blit(instruction, instruction_rect)
-        
-        back_text = font_text.render("Press BACKSPACE to return to main menu", True, (255, 255, 255))
-        back_rect = back_text.get_rect(center=(400, 430))
-        self.surface.blit(back_text, back_rect)
+            self.text.draw(surface, f"{i+1}. {diff}", color, 28, center=(400, 220 + i * 50))
         
-        pygame.display.flip()
+        self.text.draw(surface, "Use UP/DOWN arrows and press ENTER to select", (255, 255, 255), 20, center=(400, 400))
+        self.text.draw(surface, "Press BACKSPACE to return to main menu", (255, 255, 255), 20, center=(400, 430))
     
     def show_pause_menu(self):
         """Display pause menu"""
         # Semi-transparent overlay
-        overlay = pygame.Surface((800, 600))
-        overlay.set_alpha(128)
-        overlay.fill((0, 0, 0))
-        self.surface.blit(overlay, (0, 0))
+        self.surface.blit(self.pause_overlay, (0, 0))
         
-        font_title = pygame.font.SysFont('arial', 48)
-        title = font_title.render("PAUSED", True, (255, 255, 255))
-        title_rect = title.get_rect(center=(400, 200))
-        self.surface.blit(title, title_rect)
+        self.text.draw(self.surface, "PAUSED", (255, 255, 255), 48, center=(400, 200))
         
-        font_menu = pygame.font.SysFont('arial', 32)
         pause_options = ["Resume Game", "Quit to Main Menu"]
         
         for i, option in enumerate(pause_options):
             color = (255, 255, 0) if i == self.pause_selection else (255, 255, 255)
-            text = font_menu.render(f"{i+1}. {option}", True, color)
-            text_rect = text.get_rect(center=(400, 280 + i * 50))
-            self.surface.blit(text, text_rect)
+            self.text.draw(self.surface, f"{i+1}. {option}", color, 32, center=(400, 280 + i * 50))
         
         pygame.display.flip()
     
     def show_game_over_screen(self):
         """Display game over screen"""
-        self.render_background()
-        
-        font_title = pygame.font.SysFont('arial', 48)
-        title = font_title.render("GAME OVER", True, (255, 0, 0))
-        title_rect = title.get_rect(center=(400, 150))
-        self.surface.blit(title, title_rect)
+        current_score = self.engine.score
+        key = ("game_over", current_score, self.high_score, self.game_over_selection)
+        self.surface.blit(self.text.screen(key, (800, 600), self.draw_game_over_screen), (0, 0))
+        pygame.display.flip()
+    
+    def draw_game_over_screen(self, surface):
+        self.render_background(surface)
         
-        font_score = pygame.font.SysFont('arial', 32)
-        current_score = (self.snake.length - 2) * self.score_multiplier
-        score_text = font_score.render(f"Your Score: {current_score}", True, (255, 255, 255))
-        score_rect = score_text.get_rect(center=(400, 220))
-        self.surface.blit(score_text, score_rect)
+        self.text.draw(surface, "GAME OVER", (255, 0, 0), 48, center=(400, 150))
         
-        high_score_text = font_score.render(f"High Score: {self.high_score}", True, (255, 215, 0))
-        high_score_rect = high_score_text.get_rect(center=(400, 260))
-        self.surface.blit(high_score_text, high_score_rect)
+        current_score = self.engine.score
+        self.text.draw(surface, f"Your Score: {current_score}", (255, 255, 255), 32, center=(400, 220))
+        self.text.draw(surface, f"High Score: {self.high_score}", (255, 215, 0), 32, center=(400, 260))
         
         if current_score == self.high_score and current_score > 0:
-            new_record = font_score.render("NEW HIGH SCORE!", True, (255, 215, 0))
-            new_record_rect = new_record.get_rect(center=(400, 300))
-            self.surface.blit(new_record, new_record_rect)
+            self.text.draw(surface, "NEW HIGH SCORE!", (255, 215, 0), 32, center=(400, 300))
         
-        font_menu = pygame.font.SysFont('arial', 28)
         game_over_options = ["Play Again", "Return to Main Menu"]
         
         for i, option in enumerate(game_over_options):
             color = (255, 255, 0) if i == self.game_over_selection else (255, 255, 255)
-            text = font_menu.render(f"{i+1}. {option}", True, color)
-            text_rect = text.get_rect(center=(400, 380 + i * 40))
-            self.surface.blit(text, text_rect)
-        
-        pygame.display.flip()
+            self.text.draw(surface, f"{i+1}. {option}", color, 28, center=(400, 380 + i * 40))
     
     def handle_menu_input(self, event):
         """Handle input for main menu"""
@@ -553,7 +662,7 @@ class Game:
                 if self.menu_selection == 0:  # Start Game
                     self.init_game()
                     self.state = GameState.PLAYING
-                    pygame.mixer.music.unpause()
+                    self.audio.unpause_music()
                 elif self.menu_selection == 1:  # Instructions
                     self.state = GameState.INSTRUCTIONS
                 elif self.menu_selection == 2:  # Difficulty
@@ -569,12 +678,17 @@ class Game:
     def run(self):
         """Main game loop"""
         running = True
+        elapsed = 0
         
         while running:
+            start = time.perf_counter()
             for event in pygame.event.get():
                 if event.type == QUIT:
                     running = False
                 
+                elif event.type == KEYDOWN and event.key == K_F3:
+                    self.overlay.toggle()
+                
                 elif self.state == GameState.MENU:
                     running = self.handle_menu_input(event)
                 
@@ -600,19 +714,19 @@ class Game:
                     if event.type == KEYDOWN:
                         if event.key == K_ESCAPE:
                             self.state = GameState.MENU
-                            pygame.mixer.music.pause()
+                            self.audio.pause_music()
+                            self.save_game()
                         elif event.key == K_p:
                             self.state = GameState.PAUSED
                             self.pause_selection = 0
-                            pygame.mixer.music.pause()
-                        elif event.key == K_UP:
-                            self.snake.move_up()
-                        elif event.key == K_DOWN:
-                            self.snake.move_down()
-                        elif event.key == K_LEFT:
-                            self.snake.move_left()
-                        elif event.key == K_RIGHT:
-                            self.snake.move_right()
+                            self.audio.pause_music()
+                            self.save_game()
+                        elif event.key == K_TAB:
+                            self.autopilot = None if self.autopilot else Autopilot(self.engine)
+                            # Presses made while the autopilot drove are stale by now
+                            self.inputs.clear(self.engine.snake.direction)
+                        elif event.key in KEY_ACTIONS:
+                            self.inputs.push(KEY_ACTIONS[event.key])
                 
                 elif self.state == GameState.PAUSED:
                     if event.type == KEYDOWN:
@@ -623,12 +737,12 @@ class Game:
                         elif event.key in [K_RETURN, K_KP_ENTER]:
                             if self.pause_selection == 0:  # Resume
                                 self.state = GameState.PLAYING
-                                pygame.mixer.music.unpause()
+                                self.audio.unpause_music()
                             else:  # Quit to menu
                                 self.state = GameState.MENU
                         elif event.key == K_p:  # Quick resume with P
                             self.state = GameState.PLAYING
-                            pygame.mixer.music.unpause()
+                            self.audio.unpause_music()
                 
                 elif self.state == GameState.GAME_OVER:
                     if event.type == KEYDOWN:
@@ -640,15 +754,22 @@ class Game:
                             if self.game_over_selection == 0:  # Play Again
                                 self.init_game()
                                 self.state = GameState.PLAYING
-                                pygame.mixer.music.unpause()
+                                self.audio.unpause_music()
                             else:  # Return to menu
                                 self.state = GameState.MENU
-                                pygame.mixer.music.unpause()
+                                self.audio.unpause_music()
                         elif event.key in [K_1, K_2]:
                             key_to_selection = {K_1: 0, K_2: 1}
                             self.game_over_selection = key_to_selection[event.key]
+            self.profiler.add("events", time.perf_counter() - start)
+            
+            # Menus paint over the playfield, so gameplay resumes with a full redraw
+            if self.state != GameState.PLAYING:
+                self.renderer.invalidate()
             
             # Render based on current state
+            start = time.perf_counter()
+            playing = self.state == GameState.PLAYING
             if self.state == GameState.MENU:
                 self.show_menu()
             elif self.state == GameState.INSTRUCTIONS:
@@ -656,19 +777,36 @@ class Game:
             elif self.state == GameState.DIFFICULTY:
                 self.show_difficulty_selection()
             elif self.state == GameState.PLAYING:
-                self.play()
-                # Control game speed based on difficulty
-                sleep_time = self.difficulties[self.difficulty_selection]["speed"] * self.speed_boost
-                self.clock.tick(int(1 / (self.difficulties[self.difficulty_selection]["speed"] * self.speed_boost)))
+                # The snake moves at a fixed rate per difficulty, independent of the frame rate
+                self.play(elapsed)
             elif self.state == GameState.PAUSED:
                 self.show_pause_menu()
             elif self.state == GameState.GAME_OVER:
                 self.show_game_over_screen()
+            if not playing:
+                self.profiler.add("menus", time.perf_counter() - start)
             
-            self.clock.tick(60)  # 60 FPS for smooth menus
-        
+            if "first_frame" not in self.startup:
+                self.phase("first_frame", STARTED)
+                self.report_startup(["imports", "display", "background", "setup", "first_frame"])
+            
+            elapsed = self.clock.tick(60)  # Render at up to 60 FPS
+            self.profiler.end_frame(elapsed / 1000)
+        
+        # Closing the window mid-game keeps the game for the next start
+        if self.state in (GameState.PLAYING, GameState.PAUSED):
+            self.save_game()
+        if self.save_file is not None:
+            self.save_file.close()
+        if self.scores is not None:
+            self.scores.close()
+        self.loader.join()
         pygame.quit()
 
 if __name__ == '__main__':
     game = Game()
+    if len(sys.argv) > 1:
+        game.watch(Replay.load(sys.argv[1]))  # python main.py replays/some.replay
+    else:
+        game.resume_game()
     game.run()
\ No newline at end of file
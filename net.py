@@ -0,0 +1,335 @@
+"""Binary messages between server.py and its clients
+
+Every message is a frame: a little-endian u32 payload length, then the
+payload, whose first byte is the message type. Cells are board indices
+(row * cols + col) as u32, OFF_BOARD for a head that left the board.
+
+Server to client:
+  WELCOME  player id u16 (NOBODY when watching), cols u16, rows u16, ms per tick u16
+  FULL     tick u32, item count u32, items (kind u8, cell u32), snake count u16, snakes
+           (id u16, score u32, length u16, cells u32 head first)
+  DELTA    tick u32, then operations up to the end of the payload:
+             HEAD id u16, cell u32       the snake moved onto cell
+             TAIL id u16                 its last segment moved off its cell
+             SPAWN id u16, snake         a snake (re)appeared, encoded as in FULL
+             DESPAWN id u16              the snake crashed or left
+             ADD kind u8, cell u32       an apple or power-up appeared
+             REMOVE cell u32             an apple or power-up went
+             SCORE id u16, score u32
+
+Client to server:
+  HELLO    mode u8 (PLAY or WATCH), room name (utf-8, the rest of the payload)
+  TURN     action u8, an index into engine.ACTIONS
+
+A DELTA only describes what changed since the previous tick, which is a few
+bytes per moving snake. A client that falls behind gets a FULL again instead
+of the deltas it missed.
+"""
+import struct
+from collections import deque
+
+from engine import Board, Apple, Obstacle, PowerUp, POWER_TYPES, OUTSIDE
+
+FRAME = struct.Struct("<I")
+MAX_FRAME = 1 << 24  # bytes; anything larger is a broken or hostile peer
+
+# Message types
+WELCOME, FULL, DELTA = 1, 2, 3
+HELLO, TURN = 10, 11
+PLAY, WATCH = 0, 1
+
+# DELTA operations
+HEAD, TAIL, SPAWN, DESPAWN, ADD, REMOVE, SCORE = range(1, 8)
+
+# Item kinds
+APPLE, OBSTACLE = 0, 1
+POWER_UP_KINDS = {power_type: 2 + k for k, power_type in enumerate(POWER_TYPES)}
+
+NOBODY = 0xFFFF
+OFF_BOARD = 0xFFFFFFFF
+
+U8 = struct.Struct("<B")
+U16 = struct.Struct("<H")
+U32 = struct.Struct("<I")
+ID_CELL = struct.Struct("<BHI")  # op, id, cell
+ID_ONLY = struct.Struct("<BH")
+ID_SCORE = struct.Struct("<BHI")
+KIND_CELL = struct.Struct("<BBI")  # op, kind, cell
+BYTE_CELL = struct.Struct("<BI")  # op or kind, cell
+SNAKE = struct.Struct("<HIH")  # id, score, length
+WELCOME_MSG = struct.Struct("<BHHHH")
+TICK = struct.Struct("<BI")
+
+class ProtocolError(Exception):
+    pass
+
+def frame(payload):
+    return FRAME.pack(len(payload)) + payload
+
+def kind_of(item):
+    if isinstance(item, Obstacle):
+        return OBSTACLE
+    if isinstance(item, PowerUp):
+        return POWER_UP_KINDS[item.power_type]
+    return APPLE
+
+def pack_snake(board, player):
+    cells = [OFF_BOARD if i == OUTSIDE else i for i in player.snake.cells]
+    return SNAKE.pack(player.id, player.score, len(cells)) + struct.pack(f"<{len(cells)}I", *cells)
+
+def welcome(player_id, board, tick_ms):
+    return frame(WELCOME_MSG.pack(WELCOME, player_id, board.cols, board.rows, tick_ms))
+
+def full(arena):
+    """A FULL frame of the arena as it is now"""
+    board = arena.board
+    parts = [TICK.pack(FULL, arena.ticks), U32.pack(len(arena.items))]
+    parts += [BYTE_CELL.pack(kind_of(item), cell) for cell, item in arena.items.items()]
+    players = [player for player in arena.players if player.alive]
+    parts.append(U16.pack(len(players)))
+    parts += [pack_snake(board, player) for player in players]
+    return frame(b"".join(parts))
+
+class Deltas:
+    """What the clients last heard about an arena, to encode each tick as a DELTA"""
+    def __init__(self, arena):
+        self.arena = arena
+        self.snakes = {}  # player id -> (snake, length, head cell, score) as last sent
+        self.items = {}  # cell -> kind of the apples and power-ups as last sent
+        self.sync()
+
+    def sync(self):
+        """Take the arena as it is now as what the clients know"""
+        self.snakes = {p.id: (p.snake, len(p.snake.cells), p.snake.cells[0], p.score)
+                       for p in self.arena.players if p.alive}
+        self.items = self.loose_items()
+
+    def loose_items(self):
+        """The apples and power-ups by cell; obstacles never move, so only FULL carries them"""
+        board = self.arena.board
+        items = {board.index(apple.x, apple.y): APPLE for apple in self.arena.apples}
+        for power_up in self.arena.power_ups:
+            items[board.index(power_up.x, power_up.y)] = POWER_UP_KINDS[power_up.power_type]
+        return items
+
+    def delta(self):
+        """A DELTA frame from the last one to the arena as it is now"""
+        arena, board = self.arena, self.arena.board
+        ops = [TICK.pack(DELTA, arena.ticks)]
+        known = self.snakes
+        current = {}
+        for player in arena.players:
+            if not player.alive:
+                continue
+            snake, cells = player.snake, player.snake.cells
+            head = cells[0]
+            last = known.pop(player.id, None)
+            current[player.id] = (snake, len(cells), head, player.score)
+            if last is None or last[0] is not snake:
+                ops.append(U8.pack(SPAWN) + pack_snake(board, player))
+                continue
+            walked = head != last[2]
+            if walked:
+                ops.append(ID_CELL.pack(HEAD, player.id, OFF_BOARD if head == OUTSIDE else head))
+            ops += [ID_ONLY.pack(TAIL, player.id)] * (last[1] + walked - len(cells))
+            if player.score != last[3]:
+                ops.append(ID_SCORE.pack(SCORE, player.id, player.score))
+        ops += [ID_ONLY.pack(DESPAWN, player_id) for player_id in known]
+        self.snakes = current
+
+        items = self.loose_items()
+        ops += [BYTE_CELL.pack(REMOVE, cell) for cell, kind in self.items.items() if items.get(cell) != kind]
+        ops += [KIND_CELL.pack(ADD, kind, cell) for cell, kind in items.items() if self.items.get(cell) != kind]
+        self.items = items
+        return frame(b"".join(ops))
+
+class RemoteSnake:
+    """A snake as the client knows it"""
+    def __init__(self, body, score):
+        self.body = body
+        self.score = score
+
+    @property
+    def head(self):
+        return self.body[0]
+
+class Mirror:
+    """The client's copy of a server arena, kept up to date from FULL and DELTA payloads
+
+    It has the attributes main.Game draws from an engine, with snake being the
+    player's own snake (the first one while watching).
+    """
+    def __init__(self, player_id, board):
+        self.player_id = player_id
+        self.board = board
+        self.ticks = 0
+        self.snakes_by_id = {}
+        self.items = {}  # cell -> Apple, Obstacle or PowerUp
+        self.apples = []
+        self.obstacles = []
+        self.power_ups = []
+        # What Game's HUD reads; the server keeps effects to itself
+        self.score_multiplier = 1
+        self.multiplier_timer = 0
+        self.speed_boost = 1.0
+        self.speed_boost_timer = 0
+
+    def position(self, cell):
+        if cell == OFF_BOARD:
+            return -self.board.width, -self.board.height
+        return self.board.position(cell)
+
+    @property
+    def snakes(self):
+        snakes = list(self.snakes_by_id.values())
+        own = self.snakes_by_id.get(self.player_id)
+        if own is not None:
+            snakes.remove(own)
+            snakes.insert(0, own)
+        return snakes
+
+    @property
+    def snake(self):
+        own = self.snakes_by_id.get(self.player_id)
+        if own is None and self.snakes_by_id:
+            own = next(iter(self.snakes_by_id.values()))
+        return own
+
+    @property
+    def score(self):
+        own = self.snakes_by_id.get(self.player_id)
+        return own.score if own is not None else 0
+
+    def add_item(self, kind, cell):
+        x, y = self.position(cell)
+        if kind == APPLE:
+            item = Apple()
+            item.x, item.y = x, y
+            self.apples.append(item)
+        elif kind == OBSTACLE:
+            item = Obstacle(x, y)
+            self.obstacles.append(item)
+        else:
+            item = PowerUp(POWER_TYPES[kind - 2], 0)
+            item.x, item.y = x, y
+            self.power_ups.append(item)
+        self.remove_item(cell)
+        self.items[cell] = item
+
+    def remove_item(self, cell):
+        item = self.items.pop(cell, None)
+        if isinstance(item, Apple):
+            self.apples.remove(item)
+        elif isinstance(item, Obstacle):
+            self.obstacles.remove(item)
+        elif item is not None:
+            self.power_ups.remove(item)
+
+    def read_snake(self, data, pos):
+        player_id, score, length = SNAKE.unpack_from(data, pos)
+        pos += SNAKE.size
+        cells = struct.unpack_from(f"<{length}I", data, pos)
+        self.snakes_by_id[player_id] = RemoteSnake(deque(self.position(cell) for cell in cells), score)
+        return pos + 4*length
+
+    def apply(self, data):
+        """Update from one FULL or DELTA payload"""
+        try:
+            kind, self.ticks = TICK.unpack_from(data)
+            pos = TICK.size
+            if kind == FULL:
+                self.snakes_by_id.clear()
+                for cell in list(self.items):
+                    self.remove_item(cell)
+                count, = U32.unpack_from(data, pos)
+                pos += 4
+                for _ in range(count):
+                    kind, cell = BYTE_CELL.unpack_from(data, pos)
+                    self.add_item(kind, cell)
+                    pos += BYTE_CELL.size
+                count, = U16.unpack_from(data, pos)
+                pos += 2
+                for _ in range(count):
+                    pos = self.read_snake(data, pos)
+            elif kind == DELTA:
+                self.apply_delta(data, pos)
+            else:
+                raise ProtocolError(f"unexpected message type {kind}")
+        except (struct.error, IndexError, KeyError) as e:
+            raise ProtocolError(f"malformed snapshot: {e}")
+
+    def apply_delta(self, data, pos):
+        snakes = self.snakes_by_id
+        end = len(data)
+        while pos < end:
+            op = data[pos]
+            if op == HEAD:
+                _, player_id, cell = ID_CELL.unpack_from(data, pos)
+                snakes[player_id].body.appendleft(self.position(cell))
+                pos += ID_CELL.size
+            elif op == TAIL:
+                _, player_id = ID_ONLY.unpack_from(data, pos)
+                snakes[player_id].body.pop()
+                pos += ID_ONLY.size
+            elif op == SPAWN:
+                pos = self.read_snake(data, pos + 1)
+            elif op == DESPAWN:
+                _, player_id = ID_ONLY.unpack_from(data, pos)
+                snakes.pop(player_id, None)
+                pos += ID_ONLY.size
+            elif op == ADD:
+                _, kind, cell = KIND_CELL.unpack_from(data, pos)
+                self.add_item(kind, cell)
+                pos += KIND_CELL.size
+            elif op == REMOVE:
+                _, cell = BYTE_CELL.unpack_from(data, pos)
+                self.remove_item(cell)
+                pos += BYTE_CELL.size
+            elif op == SCORE:
+                _, player_id, score = ID_SCORE.unpack_from(data, pos)
+                snakes[player_id].score = score
+                pos += ID_SCORE.size
+            else:
+                raise ProtocolError(f"unknown delta operation {op}")
+
+def read_welcome(data):
+    kind, player_id, cols, rows, tick_ms = WELCOME_MSG.unpack_from(data)
+    if kind != WELCOME:
+        raise ProtocolError(f"expected WELCOME, got message type {kind}")
+    try:
+        board = Board(cols, rows)
+    except ValueError as e:
+        raise ProtocolError(str(e))
+    return player_id, board, tick_ms
+
+def hello(mode, room):
+    return frame(bytes([HELLO, mode]) + room.encode())
+
+def turn(action):
+    return frame(bytes([TURN, action]))
+
+async def read_frame(reader):
+    """The next payload from an asyncio stream (IncompleteReadError at the end of the stream)"""
+    size, = FRAME.unpack(await reader.readexactly(FRAME.size))
+    if size == 0 or size > MAX_FRAME:
+        raise ProtocolError(f"bad frame length {size}")
+    return await reader.readexactly(size)
+
+class FrameBuffer:
+    """Splits bytes received on a socket into payloads"""
+    def __init__(self):
+        self.data = bytearray()
+
+    def feed(self, data):
+        """Add received bytes; returns the payloads completed by them"""
+        self.data += data
+        payloads = []
+        while len(self.data) >= FRAME.size:
+            size, = FRAME.unpack_from(self.data)
+            if size == 0 or size > MAX_FRAME:
+                raise ProtocolError(f"bad frame length {size}")
+            if len(self.data) < FRAME.size + size:
+                break
+            payloads.append(bytes(self.data[FRAME.size:FRAME.size + size]))
+            del self.data[:FRAME.size + size]
+        return payloads
@@ -0,0 +1,140 @@
+"""Per-frame phase timings, an in-game overlay and periodic metrics dumps
+
+The game records how long each phase of a frame took (event pumping,
+simulation steps, sprite gathering per entity class, HUD text, blits and the
+display update) with Profiler.add, and closes the frame with end_frame. Each
+phase keeps its history in a fixed-size ring buffer of doubles that only the
+game loop writes to, so no locks are needed and nothing is allocated per frame.
+"""
+import csv
+import json
+import time
+from array import array
+
+import pygame
+
+HISTORY = 240  # frames kept per phase
+DUMP_INTERVAL = 1.0  # seconds between dumps
+
+class Profiler:
+    """Collects phase timings per frame into ring buffers"""
+    def __init__(self, size=HISTORY, dump_path=None):
+        self.size = size
+        self.frames = 0  # frames recorded so far; frames % size is the next slot
+        self.frame_times = array('d', [0.0]) * size
+        self.phases = {}  # phase -> ring buffer of seconds per frame
+        self.current = {}
+        self.dump_path = dump_path
+        self.dumped = 0
+        self.last_dump = time.perf_counter()
+
+    def add(self, phase, seconds):
+        """Add seconds spent in phase during the current frame"""
+        self.current[phase] = self.current.get(phase, 0.0) + seconds
+
+    def instrument(self, obj, methods, prefix):
+        """Time every call of obj's methods under prefix.method"""
+        for name in methods:
+            method = getattr(obj, name)
+            setattr(obj, name, self.timed(prefix + "." + name, method))
+
+    def timed(self, phase, function):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter() - start)
+        return wrapper
+
+    def end_frame(self, frame_time):
+        """Close the frame that took frame_time seconds of wall time"""
+        slot = self.frames % self.size
+        self.frame_times[slot] = frame_time
+        for phase in self.current:
+            if phase not in self.phases:
+                self.phases[phase] = array('d', [0.0]) * self.size
+        for phase, buffer in self.phases.items():
+            buffer[slot] = self.current.get(phase, 0.0)
+        self.current.clear()
+        self.frames += 1
+        if self.dump_path and time.perf_counter() - self.last_dump >= DUMP_INTERVAL:
+            self.dump()
+
+    def history(self, buffer=None, count=None):
+        """The last count values of a ring buffer (frame times by default), oldest first"""
+        buffer = self.frame_times if buffer is None else buffer
+        count = min(count or self.size, self.frames, self.size)
+        end = self.frames % self.size
+        return [buffer[(end - count + i) % self.size] for i in range(count)]
+
+    def averages(self, count=60):
+        """Mean seconds per frame of every phase over the last count frames"""
+        return {phase: sum(self.history(buffer, count)) / max(1, min(count, self.frames))
+                for phase, buffer in self.phases.items()}
+
+    def dump(self):
+        """Append the frames recorded since the last dump to dump_path (.csv, otherwise JSON lines)"""
+        self.last_dump = time.perf_counter()
+        count = min(self.frames - self.dumped, self.size)
+        if count <= 0:
+            return
+        first = self.frames - count
+        phases = sorted(self.phases)
+        rows = []
+        for i, frame_time in enumerate(self.history(count=count)):
+            row = {"frame": first + i, "frame_ms": round(frame_time * 1000, 3)}
+            for phase in phases:
+                row[phase + "_ms"] = round(self.history(self.phases[phase], count)[i] * 1000, 3)
+            rows.append(row)
+        self.dumped = self.frames
+        try:
+            with open(self.dump_path, "a", newline="") as f:
+                if self.dump_path.endswith(".csv"):
+                    writer = csv.DictWriter(f, fieldnames=list(rows[-1]), extrasaction="ignore", restval=0)
+                    if f.tell() == 0:
+                        writer.writeheader()
+                    writer.writerows(rows)
+                else:
+                    for row in rows:
+                        f.write(json.dumps(row) + "\n")
+        except OSError:
+            print(f"Could not write profile to {self.dump_path}")
+            self.dump_path = None
+
+class Overlay:
+    """Rolling frame-time graph and per-phase breakdown, drawn as one sprite"""
+    def __init__(self, profiler, text, width=300, graph_height=80):
+        self.profiler = profiler
+        self.text = text
+        self.width = width
+        self.graph_height = graph_height
+        self.visible = False
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def render(self):
+        averages = sorted(self.profiler.averages().items(), key=lambda item: -item[1])
+        height = self.graph_height + 24 + 16 * len(averages)
+        surface = pygame.Surface((self.width, height))
+        surface.set_alpha(200)
+        surface.fill((0, 0, 0))
+
+        # Frame times, with a line at 16.7 ms (60 FPS)
+        times = self.profiler.history()
+        scale = self.graph_height / 50.0  # px per ms, 50 ms at the top
+        budget = self.graph_height - int(1000 / 60 * scale)
+        pygame.draw.line(surface, (80, 80, 80), (0, budget), (self.width, budget))
+        if len(times) > 1:
+            step = self.width / (self.profiler.size - 1)
+            points = [(i * step, max(0, self.graph_height - t * 1000 * scale)) for i, t in enumerate(times)]
+            pygame.draw.lines(surface, (0, 255, 0), False, points)
+
+        latest = times[-1] * 1000 if times else 0.0
+        label = self.text.render(f"frame {latest:5.1f} ms", (255, 255, 255), 16)
+        surface.blit(label, (4, self.graph_height + 4))
+        for i, (phase, seconds) in enumerate(averages):
+            label = self.text.render(f"{phase:<28}{seconds * 1000:7.2f} ms", (200, 200, 200), 14)
+            surface.blit(label, (4, self.graph_height + 24 + 16 * i))
+        return surface
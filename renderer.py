@@ -0,0 +1,72 @@
+import time
+
+import pygame
+
+class Renderer:
+    """Composites each frame into the display back buffer and presents only what changed
+
+    Callers hand in the frame as a list of (image, (x, y)) sprites in draw order.
+    Sprites that are identical to last frame's are left alone; the rectangles of
+    sprites that appeared or disappeared are merged until none overlap, repainted
+    from the background, and everything overlapping them is redrawn clipped to
+    them, one Surface.blits batch per rectangle. Clipping matters for sprites
+    with alpha (text): redrawn whole, their pixels outside the rectangle would
+    be blended twice. The lot is pushed with a single pygame.display.update(rects).
+    """
+    def __init__(self, surface, background, profiler=None):
+        self.surface = surface
+        self.background = background
+        self.profiler = profiler  # gets the blit and display update times when set
+        self.previous = {}
+        self.full_redraw = True
+
+    def invalidate(self):
+        """Repaint and present the whole screen on the next frame"""
+        self.full_redraw = True
+
+    def present(self, sprites):
+        start = blitted = time.perf_counter()
+        current = {}
+        for image, pos in sprites:
+            current[(image, pos)] = image.get_rect(topleft=pos)
+
+        if self.full_redraw:
+            self.surface.blit(self.background, (0, 0))
+            self.surface.blits([(image, rect) for (image, pos), rect in current.items()], False)
+            blitted = time.perf_counter()
+            pygame.display.flip()
+            self.full_redraw = False
+        else:
+            dirty = [rect for key, rect in self.previous.items() if key not in current]
+            dirty += [rect for key, rect in current.items() if key not in self.previous]
+            if dirty:
+                dirty = disjoint(dirty)
+                surface = self.surface
+                rects = list(current.values())
+                batch = [(image, rect) for (image, pos), rect in current.items()]
+                for area in dirty:
+                    surface.blit(self.background, area, area)
+                for area in dirty:
+                    surface.set_clip(area)
+                    surface.blits([batch[k] for k in area.collidelistall(rects)], False)
+                surface.set_clip(None)
+                blitted = time.perf_counter()
+                pygame.display.update(dirty)
+
+        self.previous = current
+        if self.profiler is not None:
+            end = time.perf_counter()
+            self.profiler.add("present.blit", blitted - start)
+            self.profiler.add("present.display", end - blitted)
+
+def disjoint(rects):
+    """rects, with overlapping ones replaced by their union until no two overlap"""
+    merged = []
+    for rect in rects:
+        rect = rect.copy()
+        k = rect.collidelist(merged)
+        while k != -1:
+            rect.union_ip(merged.pop(k))
+            k = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
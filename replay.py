@@ -0,0 +1,194 @@
+"""Deterministic game recording and replay
+
+A replay stores only what the engine can't recompute: the RNG seed, the
+difficulty, the board size, the level's key (levels.py) if one was played,
+and the ticks on which the player changed direction. Inputs are
+delta-encoded as varints of (ticks since the previous change << 2 | direction),
+so a typical game fits in a few hundred bytes. Re-simulating the inputs with
+engine.Engine reproduces the game exactly, either headless or through the
+pygame front end (python main.py some.replay).
+
+Usage:
+    python replay.py verify FILE...   re-simulate and check the recorded score
+    python replay.py seek FILE TICK   print the state of the game at TICK
+"""
+import struct
+import sys
+
+import levels
+import snapshot
+from engine import Engine, Board, DIFFICULTIES, ACTIONS
+
+MAGIC = b"SNKR"
+VERSION = 3
+HEADERS = {
+    # magic, version, difficulty, seed, board cols, rows, the level's key (zeros without one)
+    3: struct.Struct(f"<4sBBIHH{levels.KEY_BYTES}s"),
+}
+HEADER = HEADERS[VERSION]
+SNAPSHOT_INTERVAL = 500  # ticks between the engine snapshots ReplayPlayer keeps for seeking
+
+class ReplayError(Exception):
+    pass
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        if pos >= len(data):
+            raise ReplayError("Truncated replay")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+class Replay:
+    """A recorded game: its seed, difficulty, board, level and the ticks on which the direction changed"""
+    def __init__(self, seed, difficulty, inputs=None, ticks=0, score=0, board=None, level=None):
+        self.seed = seed
+        self.difficulty = difficulty
+        self.level = level
+        self.board = level.board if level is not None else board or Board()
+        self.inputs = inputs or []  # (tick, action) in tick order
+        self.ticks = ticks  # length of the finished game
+        self.score = score  # final score, checked by verify()
+
+    @classmethod
+    def start(cls, engine):
+        """A new, empty recording for the game engine was just reset to"""
+        return cls(engine.seed, engine.difficulty, board=engine.board, level=engine.level)
+
+    def record(self, tick, action):
+        """Note that action was applied on the step that produced tick"""
+        self.inputs.append((tick, action))
+
+    def finish(self, engine):
+        self.ticks = engine.ticks
+        self.score = engine.score
+
+    def to_bytes(self):
+        key = bytes.fromhex(self.level.key) if self.level is not None else bytes(levels.KEY_BYTES)
+        out = bytearray(HEADER.pack(MAGIC, VERSION, self.difficulty, self.seed, self.board.cols, self.board.rows, key))
+        write_varint(out, self.ticks)
+        write_varint(out, self.score)
+        write_varint(out, len(self.inputs))
+        previous = 0
+        for tick, action in self.inputs:
+            write_varint(out, (tick - previous) << 2 | ACTIONS.index(action))
+            previous = tick
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < 5:
+            raise ReplayError("Truncated replay")
+        if data[:4] != MAGIC:
+            raise ReplayError("Not a replay file")
+        header = HEADERS.get(data[4])
+        if header is None:
+            raise ReplayError(f"Unsupported replay version {data[4]}")
+        if len(data) < header.size:
+            raise ReplayError("Truncated replay")
+        magic, version, difficulty, seed, cols, rows, key = header.unpack_from(data)
+        if difficulty not in DIFFICULTIES:
+            raise ReplayError(f"Unknown difficulty {difficulty}")
+        try:
+            board = Board(cols, rows)
+        except ValueError as e:
+            raise ReplayError(str(e))
+        level = None
+        if any(key):
+            try:
+                level = levels.by_key(key.hex())
+            except levels.LevelError as e:
+                raise ReplayError(str(e))
+        pos = header.size
+        ticks, pos = read_varint(data, pos)
+        score, pos = read_varint(data, pos)
+        count, pos = read_varint(data, pos)
+        inputs = []
+        tick = 0
+        for _ in range(count):
+            value, pos = read_varint(data, pos)
+            tick += value >> 2
+            inputs.append((tick, ACTIONS[value & 3]))
+        return cls(seed, difficulty, inputs, ticks, score, board, level)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    def actions(self):
+        """Recorded inputs as a tick -> action mapping"""
+        return dict(self.inputs)
+
+    def simulate(self, until=None):
+        """Re-run the game headless up to tick until (the end when None) and return the engine"""
+        player = ReplayPlayer(self, interval=None)
+        player.seek(self.ticks if until is None else until)
+        return player.engine
+
+    def verify(self):
+        """Whether re-simulating the inputs reproduces the recorded game"""
+        engine = self.simulate()
+        return engine.over and engine.ticks == self.ticks and engine.score == self.score
+
+class ReplayPlayer:
+    """Steps an engine through a replay, with seek-by-tick from periodic snapshots"""
+    def __init__(self, replay, interval=SNAPSHOT_INTERVAL):
+        self.replay = replay
+        self.interval = interval
+        self.inputs = replay.actions()
+        self.engine = Engine(replay.difficulty, replay.seed, replay.board, replay.level)
+        self.snapshots = {0: snapshot.take(self.engine)}  # tick -> snapshot.take bytes
+
+    @property
+    def tick(self):
+        return self.engine.ticks
+
+    def step(self):
+        """Advance one tick with the recorded input; returns the engine's events"""
+        events = self.engine.step(self.inputs.get(self.engine.ticks + 1))
+        if self.interval and self.engine.ticks % self.interval == 0 and self.engine.ticks not in self.snapshots:
+            self.snapshots[self.engine.ticks] = snapshot.take(self.engine)
+        return events
+
+    def seek(self, tick):
+        """Move to tick, restoring the nearest earlier snapshot and simulating from there"""
+        if tick < self.engine.ticks:
+            start = max(t for t in self.snapshots if t <= tick)
+            snapshot.restore(self.snapshots[start], self.engine)
+        while self.engine.ticks < tick and not self.engine.over:
+            self.step()
+
+def main(argv):
+    if len(argv) >= 2 and argv[0] == "verify":
+        ok = True
+        for path in argv[1:]:
+            replay = Replay.load(path)
+            valid = replay.verify()
+            ok = ok and valid
+            print(f"{path}: {'OK' if valid else 'MISMATCH'} (score {replay.score}, {replay.ticks} ticks)")
+        return 0 if ok else 1
+    if len(argv) == 3 and argv[0] == "seek":
+        engine = Replay.load(argv[1]).simulate(int(argv[2]))
+        print(f"tick {engine.ticks}: score {engine.score}, length {engine.snake.length}, "
+              f"head {engine.snake.head}, direction {engine.snake.direction}, over {engine.over}")
+        return 0
+    print(__doc__)
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,161 @@
+"""Durable high scores and per-game statistics in SQLite
+
+Every finished game is one row (player, difficulty, score, length, ticks,
+duration, power-ups collected, seed), and the leaderboard is an indexed query
+over them. record() only puts the row on a queue: a writer thread drains the
+queue and commits whatever has piled up in one transaction, so a game-over
+frame never waits on the disk.
+
+Several cabinets may share the database over a network filesystem. Each batch
+is written inside BEGIN IMMEDIATE, which takes SQLite's write lock before
+touching anything; other writers wait on it (busy timeout, then retries). The
+journal stays in the default rollback mode, since WAL needs shared memory that
+only works between processes on the same host. The filesystem has to honour
+POSIX file locks, as NFSv4 and SMB do.
+
+    python scores.py                    top 10 of every difficulty
+    python scores.py --difficulty 2 --top 50
+"""
+import argparse
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+
+from engine import DIFFICULTIES
+
+PATH = "scores.db"
+TOP = 10
+BATCH = 64  # rows committed per transaction at most
+TIMEOUT = 5.0  # seconds to wait for another writer's lock
+RETRIES = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    difficulty INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    ticks INTEGER NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    power_ups INTEGER NOT NULL,
+    seed INTEGER,
+    played_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_leaderboard ON games (difficulty, score DESC);
+CREATE INDEX IF NOT EXISTS games_player ON games (player, played_at);
+"""
+COLUMNS = ("player", "difficulty", "score", "length", "ticks", "duration_ms", "power_ups", "seed", "played_at")
+INSERT = f"INSERT INTO games ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+def connect(path):
+    connection = sqlite3.connect(path, timeout=TIMEOUT, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+class ScoreStore:
+    def __init__(self, path=PATH):
+        self.path = path
+        with closing(connect(path)) as connection:
+            connection.executescript(SCHEMA)
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, name="score-writer", daemon=True)
+        self.writer.start()
+
+    def record(self, player, difficulty, score, length, ticks, duration_ms, power_ups, seed=None):
+        """Queue a finished game for writing; returns at once"""
+        self.queue.put((player, difficulty, score, length, ticks, duration_ms, power_ups, seed, time.time()))
+
+    def write_loop(self):
+        connection = connect(self.path)
+        try:
+            while True:
+                row = self.queue.get()
+                if row is None:
+                    return
+                rows = [row]
+                stop = False
+                while len(rows) < BATCH:
+                    try:
+                        row = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if row is None:
+                        stop = True
+                        break
+                    rows.append(row)
+                self.write(connection, rows)
+                if stop:
+                    return
+        finally:
+            connection.close()
+
+    def write(self, connection, rows):
+        """Insert rows in one transaction, retrying while other writers hold the lock"""
+        for attempt in range(RETRIES):
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    connection.executemany(INSERT, rows)
+                    connection.execute("COMMIT")
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+                return
+            except sqlite3.Error as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    print(f"Could not save scores to {self.path}: {e}")
+                    return
+                time.sleep(0.1 * 2 ** attempt)
+        print(f"Could not save scores to {self.path}: database stayed locked")
+
+    def close(self):
+        """Write everything still queued and stop the writer"""
+        self.queue.put(None)
+        self.writer.join()
+
+    def leaderboard(self, difficulty, top=TOP):
+        """The top scores of a difficulty, best first"""
+        with closing(connect(self.path)) as connection:
+            return [dict(row) for row in connection.execute(
+                "SELECT player, score, length, ticks, duration_ms, power_ups, played_at FROM games "
+                "WHERE difficulty = ? ORDER BY score DESC, id LIMIT ?", (difficulty, top))]
+
+    def best(self, difficulty=None):
+        """The best score of a difficulty, or of any difficulty when None"""
+        with closing(connect(self.path)) as connection:
+            if difficulty is None:
+                row = connection.execute("SELECT MAX(score) FROM games").fetchone()
+            else:
+                row = connection.execute("SELECT MAX(score) FROM games WHERE difficulty = ?", (difficulty,)).fetchone()
+        return row[0] or 0
+
+    def player_stats(self, player):
+        """Games, best and average score, and power-ups collected by a player per difficulty"""
+        with closing(connect(self.path)) as connection:
+            return [dict(row) for row in connection.execute(
+                "SELECT difficulty, COUNT(*) AS games, MAX(score) AS best, AVG(score) AS average, "
+                "SUM(power_ups) AS power_ups, SUM(duration_ms) AS duration_ms "
+                "FROM games WHERE player = ? GROUP BY difficulty ORDER BY difficulty", (player,))]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the Snake leaderboards")
+    parser.add_argument("--db", default=PATH)
+    parser.add_argument("--difficulty", type=int, choices=sorted(DIFFICULTIES))
+    parser.add_argument("--top", type=int, default=TOP)
+    args = parser.parse_args(argv)
+
+    store = ScoreStore(args.db)
+    for difficulty in [args.difficulty] if args.difficulty is not None else sorted(DIFFICULTIES):
+        print(DIFFICULTIES[difficulty]["name"])
+        for rank, row in enumerate(store.leaderboard(difficulty, args.top), 1):
+            print(f"{rank:4}. {row['player']:<16}{row['score']:6}  length {row['length']}, "
+                  f"{row['duration_ms'] / 1000:.1f}s, {row['power_ups']} power-ups")
+    store.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
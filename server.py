@@ -0,0 +1,294 @@
+"""Authoritative multiplayer server: arena rooms over TCP
+
+Each room is an arena.Arena stepped at its difficulty's fixed tick rate by
+one asyncio task. A client connects and says which room it wants to play
+in or watch (net.HELLO); after that it only sends turns. A room is made
+when its first client asks for it and stopped when its last client leaves,
+and a server runs at most MAX_ROOMS at once. Turns are queued
+per player in an inputs.InputQueue, and each tick applies at most one per
+player. A burst of key presses therefore plays out over the next ticks
+rather than being lost, and a turn back onto the snake's neck is dropped.
+
+After each tick the room encodes one DELTA frame and hands the same bytes
+to every client. Each client has its own send queue, drained by a writer
+task that waits on the socket, so a slow client never holds up the tick or
+the other clients. When a client's queue reaches SEND_QUEUE frames it is
+behind: the queue is dropped and the client gets one FULL frame instead.
+That FULL is encoded once per tick for every client that needs it. A client
+that has to be resynchronised more than MAX_RESYNCS times in RESYNC_WINDOW
+seconds is disconnected.
+
+    python server.py --bots 20 --board 60x40
+    python client.py                        play (python client.py --watch to spectate)
+    python loadtest.py --port 7777          load test against it
+"""
+import argparse
+import asyncio
+import socket
+import sys
+import time
+from collections import deque
+
+import net
+from arena import Arena, board_size
+from engine import Board, DIFFICULTIES, ACTIONS
+from inputs import InputQueue
+
+HOST = "127.0.0.1"
+PORT = 7777
+ROOM = "lobby"
+BOTS = 10
+SEND_QUEUE = 64  # frames a client may fall behind before it gets a FULL instead
+# Kernel send buffer per client; left to autotuning it grows to megabytes and hides a slow client from the queue
+SOCKET_BUFFER = 32 * 1024
+MAX_RESYNCS = 5
+RESYNC_WINDOW = 60.0  # s
+TURN_QUEUE = 3  # turns a player may queue ahead of the ticks
+HELLO_TIMEOUT = 5.0  # s a new connection has to say what it wants
+MAX_LAG = 0.25  # s the tick loop may fall behind before it skips ticks instead of catching up
+MAX_ROOM_NAME = 64
+MAX_ROOMS = 100  # rooms running at once; a HELLO for another new room is refused
+BACKLOG = 1024
+STATS_INTERVAL = 10.0  # s
+
+class Connection:
+    """One client's socket, its queued turns and the frames waiting to be written to it"""
+    def __init__(self, writer, player):
+        self.writer = writer
+        self.player = player  # arena.Player, or None when watching
+        self.frames = deque()
+        self.inputs = InputQueue(TURN_QUEUE)
+        self.ready = asyncio.Event()
+        self.resyncs = deque()  # times the queue overflowed, within RESYNC_WINDOW
+        self.closed = False
+
+    def send(self, data):
+        self.frames.append(data)
+        self.ready.set()
+
+    def turn(self, action):
+        self.inputs.push(action)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+            self.ready.set()
+
+    async def write_loop(self):
+        writer = self.writer
+        try:
+            while not self.closed:
+                await self.ready.wait()
+                self.ready.clear()
+                if self.frames:
+                    frames = list(self.frames)
+                    self.frames.clear()
+                    writer.writelines(frames)
+                    # Waits only while the socket's buffer is full; frames queue up meanwhile
+                    await writer.drain()
+        except (ConnectionError, OSError):
+            self.close()
+
+class Room:
+    """An arena, its clients and the task stepping it"""
+    def __init__(self, name, arena, rooms):
+        self.name = name
+        self.arena = arena
+        self.rooms = rooms  # the server's rooms by name, which the room leaves when it empties
+        self.deltas = net.Deltas(arena)
+        self.connections = set()
+        self.tick_times = deque(maxlen=1000)  # s spent in each of the last ticks
+        self.sent = 0  # bytes queued for clients
+        self.resyncs = 0
+        self.dropped = 0  # clients disconnected for being too slow
+        self.task = None
+
+    def connect(self, writer, mode):
+        """A Connection for a new client, sent the room as it is now"""
+        player = self.arena.join() if mode == net.PLAY else None
+        connection = Connection(writer, player)
+        connection.send(net.welcome(player.id if player else net.NOBODY, self.arena.board, self.arena.step_time()))
+        connection.send(net.full(self.arena))
+        self.connections.add(connection)
+        return connection
+
+    def disconnect(self, connection):
+        if connection not in self.connections:
+            return
+        self.connections.remove(connection)
+        connection.close()
+        if connection.player is not None:
+            self.arena.leave(connection.player)
+        if not self.connections:
+            self.close()
+
+    def close(self):
+        """Stop stepping the arena and forget the room"""
+        if self.rooms.get(self.name) is self:
+            del self.rooms[self.name]
+        if self.task is not None:
+            self.task.cancel()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            # Steps shorten while a snake has the speed power-up
+            next_tick += self.arena.step_time() / 1000
+            delay = next_tick - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif -delay > MAX_LAG:
+                next_tick = loop.time()  # too far behind: drop the missed ticks
+            self.tick()
+
+    def tick(self):
+        start = time.perf_counter()
+        for connection in self.connections:
+            player = connection.player
+            if player is None:
+                continue
+            if not player.alive:
+                connection.inputs.clear()
+                continue
+            action = connection.inputs.pop(player.snake.direction)
+            if action is not None:
+                getattr(player.snake, "move_" + action)()
+        self.arena.step()
+        self.broadcast(self.deltas.delta())
+        self.tick_times.append(time.perf_counter() - start)
+
+    def broadcast(self, delta):
+        """Queue delta for every client, or a FULL for those too far behind"""
+        keyframe = None
+        now = time.monotonic()
+        for connection in list(self.connections):
+            if len(connection.frames) < SEND_QUEUE:
+                connection.send(delta)
+                self.sent += len(delta)
+                continue
+            resyncs = connection.resyncs
+            while resyncs and now - resyncs[0] > RESYNC_WINDOW:
+                resyncs.popleft()
+            resyncs.append(now)
+            if len(resyncs) > MAX_RESYNCS:
+                self.dropped += 1
+                self.disconnect(connection)
+                continue
+            if keyframe is None:
+                keyframe = net.full(self.arena)
+            connection.frames.clear()
+            connection.send(keyframe)
+            self.sent += len(keyframe)
+            self.resyncs += 1
+
+    def stats(self):
+        times = sorted(self.tick_times)
+        players = sum(connection.player is not None for connection in self.connections)
+        return {
+            "ticks": self.arena.ticks,
+            "players": players,
+            "watching": len(self.connections) - players,
+            "snakes": sum(player.alive for player in self.arena.players),
+            "tick_p50_ms": round(times[len(times) // 2] * 1000, 3) if times else None,
+            "tick_p99_ms": round(times[int(len(times) * 0.99)] * 1000, 3) if times else None,
+            "sent_bytes": self.sent,
+            "resyncs": self.resyncs,
+            "dropped": self.dropped,
+        }
+
+class Server:
+    """Rooms created on first use, each with bots bot snakes on board"""
+    def __init__(self, bots=BOTS, board=None, difficulty=1, seed=None, max_rooms=MAX_ROOMS):
+        self.bots = bots
+        self.max_rooms = max_rooms
+        self.board = board or Board()
+        self.difficulty = difficulty
+        self.seed = seed
+        self.rooms = {}
+        self.handlers = set()  # tasks serving a connection
+
+    def room(self, name):
+        room = self.rooms.get(name)
+        if room is None:
+            if len(self.rooms) >= self.max_rooms:
+                raise net.ProtocolError("too many rooms")
+            arena = Arena(self.bots, self.difficulty, self.seed, self.board, human=False)
+            room = self.rooms[name] = Room(name, arena, self.rooms)
+            room.task = asyncio.get_running_loop().create_task(room.run())
+        return room
+
+    async def handle(self, reader, writer):
+        room = connection = writer_task = None
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        try:
+            payload = await asyncio.wait_for(net.read_frame(reader), HELLO_TIMEOUT)
+            if len(payload) < 2 or payload[0] != net.HELLO or payload[1] not in (net.PLAY, net.WATCH):
+                raise net.ProtocolError("expected HELLO")
+            name = payload[2:2 + MAX_ROOM_NAME].decode() or ROOM
+            sock = writer.get_extra_info("socket")
+            if sock is not None:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+            room = self.room(name)
+            connection = room.connect(writer, payload[1])
+            writer_task = asyncio.get_running_loop().create_task(connection.write_loop())
+            while not connection.closed:
+                payload = await net.read_frame(reader)
+                if payload[0] == net.TURN and len(payload) == 2 and payload[1] < len(ACTIONS):
+                    if connection.player is not None:
+                        connection.turn(ACTIONS[payload[1]])
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, OSError,
+                net.ProtocolError, UnicodeDecodeError):
+            pass
+        finally:
+            if connection is not None:
+                room.disconnect(connection)
+                writer_task.cancel()
+            else:
+                writer.close()
+            self.handlers.discard(task)
+
+    async def start(self, host=HOST, port=PORT):
+        return await asyncio.start_server(self.handle, host, port, backlog=BACKLOG)
+
+    async def stop(self):
+        """Stop every room, close every connection and wait for their handlers to finish"""
+        for room in list(self.rooms.values()):
+            room.close()
+            for connection in list(room.connections):
+                room.disconnect(connection)
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+async def serve(server, host, port, stats_interval):
+    listener = await server.start(host, port)
+    print(f"Serving on {host}:{port}")
+    async with listener:
+        while True:
+            await asyncio.sleep(stats_interval)
+            for name, room in server.rooms.items():
+                print(name, room.stats())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run arena rooms for networked clients")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--bots", type=int, default=BOTS, help="bot snakes in every room")
+    parser.add_argument("--board", type=board_size, default=Board(), metavar="COLSxROWS")
+    parser.add_argument("--difficulty", type=int, choices=sorted(DIFFICULTIES), default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--max-rooms", type=int, default=MAX_ROOMS, help="rooms running at once")
+    parser.add_argument("--stats", type=float, default=STATS_INTERVAL, metavar="SECONDS",
+                        help="print room statistics this often")
+    args = parser.parse_args(argv)
+
+    server = Server(args.bots, args.board, args.difficulty, args.seed, args.max_rooms)
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.stats))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import random
+import unittest
+
+try:
+    import numpy as np
+    from batch_engine import BatchEngine
+except ImportError:
+    np = None
+
+from autopilot import Autopilot
+from engine import Engine, ACTIONS, OPPOSITE, POWER_TYPES, SIZE, EAT_APPLE, EAT_POWER_UP, CRASH
+
+SEEDS = range(12)
+
+def place_like(games, g, engine):
+    """Move game g's apple and power-up in games to where engine has them
+
+    The two engines draw from different RNG streams, so after every step the
+    batch is handed the cells the engine picked. A power-up lives shorter than
+    the spawn interval, so the engine never holds more than one, the only kind
+    the batch keeps.
+    """
+    games.apple[g] = (engine.apple.x // SIZE, engine.apple.y // SIZE)
+    games.power_up_timer[g] = engine.power_up_timer
+    games.power_up_type[g] = -1
+    for power_up in engine.power_ups:
+        games.power_up[g] = (power_up.x // SIZE, power_up.y // SIZE)
+        games.power_up_type[g] = POWER_TYPES.index(power_up.power_type)
+        games.power_up_spawn_time[g] = power_up.spawn_time
+
+@unittest.skipUnless(np, "needs numpy")
+class BatchEngineTest(unittest.TestCase):
+    def play_side_by_side(self, difficulty, ticks):
+        """Step one Engine per seed and a BatchEngine of as many games with the same turns,
+        checking every step's events, lengths and scores; returns the crash count"""
+        engines = [Engine(difficulty, seed=seed) for seed in SEEDS]
+        pilots = [Autopilot(engine) for engine in engines]
+        rngs = [random.Random(seed) for seed in SEEDS]
+        games = BatchEngine(len(engines), difficulty, seed=0)
+        games.obstacles[:] = False
+        for g, engine in enumerate(engines):
+            for obstacle in engine.obstacles:
+                games.obstacles[g, obstacle.y // SIZE, obstacle.x // SIZE] = True
+            place_like(games, g, engine)
+
+        crashes = 0
+        for _ in range(ticks):
+            directions = np.zeros(len(engines), dtype=np.int64)
+            events = []
+            for g, engine in enumerate(engines):
+                action = rngs[g].choice(ACTIONS) if rngs[g].random() < 0.05 else pilots[g].action()
+                if action == OPPOSITE[engine.snake.direction]:
+                    action = None  # the front end drops these, and the batch can miss the bite they cause
+                events.append(engine.step(action))
+                directions[g] = ACTIONS.index(engine.snake.direction)
+            ate_apple, ate_power_up, crashed = games.step(directions)
+            for g, engine in enumerate(engines):
+                self.assertEqual((ate_apple[g], ate_power_up[g], crashed[g]),
+                                 (EAT_APPLE in events[g], EAT_POWER_UP in events[g], CRASH in events[g]))
+                self.assertEqual((games.length[g], games.score[g], games.over[g]),
+                                 (engine.snake.length, engine.score, engine.over))
+                if not engine.over:
+                    place_like(games, g, engine)
+            crashes += int(crashed.sum())
+            if games.over.all():
+                break
+        return crashes
+
+    def test_matches_engine_step_for_step(self):
+        crashes = 0
+        for difficulty in (0, 1, 2):
+            crashes += self.play_side_by_side(difficulty, 1500)
+        self.assertGreater(crashes, 0)
+
+if __name__ == '__main__':
+    unittest.main()
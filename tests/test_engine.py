@@ -0,0 +1,48 @@
+import random
+import unittest
+
+from autopilot import Autopilot
+from engine import Engine, Board, ACTIONS
+
+def play(engine, actions_seed, ticks):
+    """Step engine, driven by the autopilot with seeded random turns mixed in, and record what every step did"""
+    rng = random.Random(actions_seed)
+    pilot = Autopilot(engine)
+    trace = []
+    for _ in range(ticks):
+        action = rng.choice(ACTIONS) if rng.random() < 0.05 else pilot.action()
+        events = engine.step(action)
+        trace.append((events, engine.score, engine.snake.head, engine.snake.length,
+                      (engine.apple.x, engine.apple.y),
+                      [(p.power_type, p.x, p.y) for p in engine.power_ups]))
+        if engine.over:
+            break
+    return trace
+
+class EngineTest(unittest.TestCase):
+    def test_same_seed_and_inputs_give_the_same_game(self):
+        for difficulty in (0, 1, 2):
+            for board in (None, Board(60, 40)):
+                first = play(Engine(difficulty, seed=7, board=board), 1, 2000)
+                second = play(Engine(difficulty, seed=7, board=board), 1, 2000)
+                self.assertEqual(first, second)
+
+    def test_reset_replays_the_seed(self):
+        engine = Engine(2, seed=11)
+        first = play(engine, 3, 500)
+        engine.reset(seed=11)
+        self.assertEqual(play(engine, 3, 500), first)
+
+    def test_other_seed_gives_another_game(self):
+        self.assertNotEqual(play(Engine(1, seed=1), 0, 300), play(Engine(1, seed=2), 0, 300))
+
+    def test_crash_ends_the_game(self):
+        engine = Engine(1, seed=5)
+        while not engine.over:
+            engine.step('up')  # the snake starts in the top left corner
+        ticks = engine.ticks
+        self.assertEqual(engine.step('down'), [])
+        self.assertEqual(engine.ticks, ticks)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from inputs import InputQueue
+
+class InputQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.queue = InputQueue(clock=lambda: self.now)
+        self.queue.clear('right')
+
+    def test_two_presses_turn_on_two_steps(self):
+        self.assertTrue(self.queue.push('up'))
+        self.assertTrue(self.queue.push('left'))
+        self.assertEqual(self.queue.pop('right'), 'up')
+        self.assertEqual(self.queue.pop('up'), 'left')
+        self.assertIsNone(self.queue.pop('left'))
+
+    def test_reversal_is_dropped(self):
+        self.assertFalse(self.queue.push('left'))
+        self.assertEqual(self.queue.filtered, 1)
+        self.assertIsNone(self.queue.pop('right'))
+
+    def test_reversal_of_a_queued_turn_is_dropped(self):
+        self.queue.push('up')
+        self.assertFalse(self.queue.push('down'))
+        self.assertEqual(len(self.queue), 1)
+
+    def test_repeat_is_dropped(self):
+        self.assertFalse(self.queue.push('right'))
+        self.queue.push('up')
+        self.assertFalse(self.queue.push('up'))
+        self.assertEqual(self.queue.filtered, 2)
+        self.assertEqual(len(self.queue), 1)
+
+    def test_turn_made_stale_by_another_is_dropped_on_pop(self):
+        self.queue.push('up')
+        # Something else (the autopilot, a new game) turned the snake down meanwhile
+        self.assertIsNone(self.queue.pop('down'))
+        self.assertEqual(self.queue.filtered, 1)
+
+    def test_full_queue_drops_the_newest(self):
+        for action in ('up', 'left', 'down', 'right'):
+            self.queue.push(action)
+        self.assertEqual(self.queue.dropped, 1)
+        self.assertEqual([self.queue.pop(d) for d in ('right', 'up', 'left')], ['up', 'left', 'down'])
+
+    def test_latency_is_measured_from_the_push(self):
+        self.queue.push('up')
+        self.now = 0.25
+        self.queue.pop('right')
+        self.assertEqual(self.queue.latency, 0.25)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import random
+import unittest
+import zlib
+
+import snapshot
+from autopilot import Autopilot
+from engine import Engine, Board, ACTIONS
+from replay import Replay, ReplayPlayer, ReplayError
+
+def turns(seed, count):
+    """A seeded stream of actions, mostly None so the snake survives a while"""
+    rng = random.Random(seed)
+    return [rng.choice(ACTIONS) if rng.random() < 0.1 else None for _ in range(count)]
+
+def drive(engine, ticks):
+    """Let the autopilot play engine for ticks steps, so the game gets somewhere"""
+    pilot = Autopilot(engine)
+    for _ in range(ticks):
+        if engine.over:
+            break
+        engine.step(pilot.action())
+
+def reseal(data, **fields):
+    """data with some of its header fields replaced and a valid checksum again"""
+    names = ["magic", "version", "difficulty", "cols", "rows", "key", "seed", "ticks", "sim_time",
+             "power_up_timer", "speed", "speed_boost", "speed_boost_timer", "score_multiplier",
+             "multiplier_timer", "over", "direction", "growth", "head_x", "head_y", "segments", "apple",
+             "power_ups", "free_count", "moved_count", "has_gauss", "gauss"]
+    values = dict(zip(names, snapshot.HEADER.unpack_from(data)))
+    values.update(fields)
+    body = snapshot.HEADER.pack(*[values[name] for name in names]) + data[snapshot.HEADER.size:-snapshot.CHECKSUM.size]
+    return body + snapshot.CHECKSUM.pack(zlib.crc32(body))
+
+class SnapshotTest(unittest.TestCase):
+    def assert_continues_alike(self, engine, copy, actions):
+        for action in actions:
+            self.assertEqual(engine.step(action), copy.step(action))
+            self.assertEqual(snapshot.take(engine), snapshot.take(copy))
+            if engine.over:
+                break
+
+    def test_restored_game_continues_the_same(self):
+        for difficulty in (0, 1, 2):
+            for board in (None, Board(60, 40)):
+                engine = Engine(difficulty, seed=3, board=board)
+                drive(engine, 300)
+                copy = snapshot.restore(snapshot.take(engine), Engine(1, seed=99))
+                self.assertEqual(snapshot.take(copy), snapshot.take(engine))
+                self.assert_continues_alike(engine, copy, turns(difficulty, 500))
+
+    def test_restore_rolls_back(self):
+        engine = Engine(2, seed=4)
+        drive(engine, 200)
+        saved = snapshot.take(engine)
+        actions = turns(1, 300)
+        for action in actions:
+            engine.step(action)
+        snapshot.restore(saved, engine)
+        self.assertEqual(snapshot.take(engine), saved)
+        self.assert_continues_alike(engine, snapshot.restore(saved), actions)
+
+    def test_start_of_the_game_is_left_out(self):
+        engine = Engine(2, seed=6, board=Board(300, 300))
+        start = snapshot.take(engine)
+        self.assertLess(len(start), snapshot.HEADER.size + snapshot.RNG.size + 100)
+        drive(engine, 100)
+        self.assertLess(len(snapshot.take(engine)), len(start) + 100*64)
+
+    def test_damaged_snapshots_are_rejected(self):
+        engine = Engine(1, seed=5)
+        drive(engine, 100)
+        data = snapshot.take(engine)
+        flipped = bytearray(data)
+        flipped[len(data) // 2] ^= 1
+        for bad in (data[:40], data[:-1], b"XXXX" + data[4:], bytes(flipped),
+                    reseal(data, version=snapshot.VERSION + 1),
+                    reseal(data, apple=engine.board.size),
+                    reseal(data, segments=engine.board.size),
+                    reseal(data, free_count=engine.board.size + 1)):
+            with self.assertRaises(snapshot.SnapshotError):
+                snapshot.restore(bad, Engine(1))
+
+class ReplayTest(unittest.TestCase):
+    def record(self, seed, difficulty=1, board=None):
+        engine = Engine(difficulty, seed=seed, board=board)
+        recording = Replay.start(engine)
+        pilot = Autopilot(engine)
+        rng = random.Random(seed)
+        while not engine.over:
+            action = rng.choice(ACTIONS) if rng.random() < 0.05 else pilot.action()
+            if action == engine.snake.direction:
+                action = None
+            if action is not None:
+                recording.record(engine.ticks + 1, action)
+            engine.step(action)
+        recording.finish(engine)
+        return recording, engine
+
+    def test_round_trip(self):
+        for difficulty, board in ((0, None), (2, None), (1, Board(60, 40))):
+            recording, engine = self.record(8, difficulty, board)
+            loaded = Replay.from_bytes(recording.to_bytes())
+            self.assertEqual((loaded.seed, loaded.difficulty, loaded.board, loaded.ticks, loaded.score),
+                             (recording.seed, recording.difficulty, recording.board, engine.ticks, engine.score))
+            self.assertEqual(loaded.inputs, recording.inputs)
+            self.assertTrue(loaded.verify())
+
+    def test_seek_matches_playing_through(self):
+        recording, engine = self.record(9, 2)
+        player = ReplayPlayer(recording, interval=50)
+        player.seek(recording.ticks)
+        for tick in (recording.ticks // 2, 10, recording.ticks - 1):
+            player.seek(tick)
+            self.assertEqual(snapshot.take(player.engine), snapshot.take(recording.simulate(tick)))
+
+    def test_damaged_replays_are_rejected(self):
+        data = self.record(10)[0].to_bytes()
+        for bad in (b"", data[:3], b"XXXX" + data[4:], data[:4] + b"\xff" + data[5:],
+                    data[:4] + b"\x02" + data[5:], data[:5] + b"\xff" + data[6:]):
+            with self.assertRaises(ReplayError):
+                Replay.from_bytes(bad)
+
+if __name__ == '__main__':
+    unittest.main()
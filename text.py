@@ -0,0 +1,62 @@
+from collections import OrderedDict
+import pygame
+
+class Text:
+    """Resolves each (face, size) font once and memoizes rendered text surfaces
+
+    Rendered strings live in an LRU so changing labels like the score or the
+    power-up countdowns don't grow the cache forever. Whole static screens are
+    cached separately, keyed by whatever makes them change (selection, score...).
+    """
+    def __init__(self, face='arial', max_rendered=256, max_screens=16):
+        self.face = face
+        self.max_rendered = max_rendered
+        self.max_screens = max_screens
+        self.fonts = {}
+        self.rendered = OrderedDict()
+        self.screens = OrderedDict()
+
+    def font(self, size, face=None):
+        key = (face or self.face, size)
+        font = self.fonts.get(key)
+        if font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()  # on the first label drawn, not at startup
+            font = pygame.font.SysFont(key[0], size)
+            self.fonts[key] = font
+        return font
+
+    def render(self, text, color, size, face=None):
+        """Return the rendered surface for text, rendering it only on a cache miss"""
+        key = (text, color, size, face or self.face)
+        surface = self.rendered.get(key)
+        if surface is None:
+            surface = self.font(size, face).render(text, True, color)
+            self.rendered[key] = surface
+            if len(self.rendered) > self.max_rendered:
+                self.rendered.popitem(last=False)
+        else:
+            self.rendered.move_to_end(key)
+        return surface
+
+    def draw(self, target, text, color, size, center=None, topleft=None):
+        """Blit text onto target, centered on center or anchored at topleft"""
+        surface = self.render(text, color, size)
+        if center is not None:
+            rect = surface.get_rect(center=center)
+        else:
+            rect = surface.get_rect(topleft=topleft)
+        return target.blit(surface, rect)
+
+    def screen(self, key, size, draw):
+        """Return a full-screen surface built by draw(surface) once per key"""
+        surface = self.screens.get(key)
+        if surface is None:
+            surface = pygame.Surface(size).convert()
+            draw(surface)
+            self.screens[key] = surface
+            if len(self.screens) > self.max_screens:
+                self.screens.popitem(last=False)
+        else:
+            self.screens.move_to_end(key)
+        return surface
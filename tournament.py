@@ -0,0 +1,228 @@
+"""Headless tournaments of snake policies over fixed seed sets, on every core
+
+Each game is an engine.Engine run with the same rules Game.play() steps,
+driven by a policy instead of the keyboard. Seeds are split into chunks and
+handed to a process pool; chunks stream back as they finish, are optionally
+appended to a JSON-lines file, and are folded into per-difficulty score
+histograms, so a run of millions of games keeps a bounded amount in memory.
+
+    python tournament.py --policy greedy --games 100000
+    python tournament.py --policy autopilot --games 10000 --max-ticks 20000
+    python tournament.py --policy random --difficulty 2 --games 1000000 --out hard.jsonl
+    python tournament.py --games 100000 --set POWER_UP_LIFETIME=8000 --set SPAWN_CHANCE=0.5
+    python tournament.py --policy autopilot --board 200x200 --games 100
+
+--set overrides one of engine's power-up balance constants in every worker,
+so a balance change can be validated against the same seeds as the baseline.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import engine
+from engine import Engine, Board, DIFFICULTIES, ACTIONS, OPPOSITE, SIZE, COLS, ROWS
+from autopilot import Autopilot
+
+CHUNK = 500  # games per task sent to a worker
+MAX_TICKS = 100000  # a game still running after this many ticks is stopped and scored as is
+TUNABLE = ["SPAWN_INTERVAL", "SPAWN_CHANCE", "POWER_UP_LIFETIME", "EFFECT_TIME"]
+
+MOVES = {'up': (0, -SIZE), 'down': (0, SIZE), 'left': (-SIZE, 0), 'right': (SIZE, 0)}
+
+def safe(game, action):
+    """Whether turning towards action keeps the snake alive for the next step"""
+    x, y = game.snake.head
+    dx, dy = MOVES[action]
+    i = game.board.index(x + dx, y + dy)
+    if i is None or isinstance(game.items.get(i), engine.Obstacle):
+        return False
+    occupied = game.snake.grid[i]
+    # The tail moves out of the way unless the snake is growing
+    if not game.snake.growth and game.snake.cells[-1] == i:
+        occupied -= 1
+    return occupied == 0
+
+def straight(game):
+    """Never turns"""
+    return lambda: None
+
+def random_walk(game):
+    """Turns at random, avoiding moves that die on the spot"""
+    rng = random.Random(game.seed)
+
+    def policy():
+        choices = [a for a in ACTIONS if a != OPPOSITE[game.snake.direction] and safe(game, a)]
+        return rng.choice(choices) if choices else None
+    return policy
+
+def greedy(game):
+    """Heads straight for the apple, avoiding moves that die on the spot"""
+    def policy():
+        x, y = game.snake.head
+        choices = [a for a in ACTIONS if a != OPPOSITE[game.snake.direction] and safe(game, a)]
+        if not choices:
+            return None
+        distance = lambda a: (abs(x + MOVES[a][0] - game.apple.x) + abs(y + MOVES[a][1] - game.apple.y),
+                              a != game.snake.direction)
+        return min(choices, key=distance)
+    return policy
+
+# Policy factories by name; each takes a new game and returns a callable giving its next action
+POLICIES = {
+    "straight": straight,
+    "random": random_walk,
+    "greedy": greedy,
+    "autopilot": lambda game: Autopilot(game).action,
+}
+
+def play_games(policy, difficulty, seeds, max_ticks=MAX_TICKS, overrides=None, board=None):
+    """Play one game per seed on board ((cols, rows), default size when None); returns (seed, score, ticks) for each.
+    Runs in the worker processes."""
+    for name, value in (overrides or {}).items():
+        setattr(engine, name, value)
+    board = Board(*board) if board else Board()
+    results = []
+    for seed in seeds:
+        game = Engine(difficulty, seed, board)
+        act = POLICIES[policy](game)
+        while not game.over and game.ticks < max_ticks:
+            action = act()
+            game.step(None if action == game.snake.direction else action)
+        results.append((seed, game.score, game.ticks))
+    return results
+
+class Summary:
+    """Score distribution of the games played at one difficulty"""
+    def __init__(self):
+        self.scores = Counter()
+        self.games = 0
+        self.ticks = 0
+
+    def add(self, results):
+        for seed, score, ticks in results:
+            self.scores[score] += 1
+            self.ticks += ticks
+        self.games += len(results)
+
+    def percentile(self, p):
+        rank = p * (self.games - 1)
+        seen = 0
+        for score in sorted(self.scores):
+            seen += self.scores[score]
+            if seen > rank:
+                return score
+        return 0
+
+    def report(self):
+        if not self.games:
+            return {"games": 0}
+        mean = sum(score * count for score, count in self.scores.items()) / self.games
+        variance = sum(count * (score - mean) ** 2 for score, count in self.scores.items()) / self.games
+        return {
+            "games": self.games,
+            "mean": round(mean, 4),
+            "stdev": round(variance ** 0.5, 4),
+            "min": min(self.scores),
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "max": max(self.scores),
+            "mean_ticks": round(self.ticks / self.games, 2),
+            "histogram": {str(score): count for score, count in sorted(self.scores.items())},
+        }
+
+def tasks(difficulties, seeds, chunk):
+    for difficulty in difficulties:
+        for start in range(0, len(seeds), chunk):
+            yield difficulty, seeds[start:start + chunk]
+
+def run(policy, difficulties, seeds, workers=None, chunk=CHUNK, max_ticks=MAX_TICKS,
+        overrides=None, out=None, progress=None, board=None):
+    """Play every seed at every difficulty across a process pool; returns {difficulty name: report}"""
+    summaries = {difficulty: Summary() for difficulty in difficulties}
+    total = len(difficulties) * len(seeds)
+    done = 0
+    start = time.perf_counter()
+    pending = tasks(difficulties, seeds, chunk)
+    workers = workers or os.cpu_count() or 1
+    # Keep a few chunks per worker in flight instead of queueing the whole seed set
+    limit = 4 * workers
+    with ProcessPoolExecutor(workers) as pool:
+        running = {}
+        while True:
+            for difficulty, batch in pending:
+                future = pool.submit(play_games, policy, difficulty, batch, max_ticks, overrides, board)
+                running[future] = difficulty
+                if len(running) >= limit:
+                    break
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                difficulty = running.pop(future)
+                results = future.result()
+                summaries[difficulty].add(results)
+                done += len(results)
+                if out is not None:
+                    for seed, score, ticks in results:
+                        out.write(json.dumps({"difficulty": difficulty, "seed": seed,
+                                              "score": score, "ticks": ticks}) + "\n")
+                if progress is not None:
+                    rate = done / (time.perf_counter() - start)
+                    progress.write(f"\r{done}/{total} games, {rate:.0f} games/s")
+                    progress.flush()
+    if progress is not None:
+        progress.write("\n")
+    return {DIFFICULTIES[d]["name"]: summaries[d].report() for d in difficulties}
+
+def override(text):
+    name, _, value = text.partition("=")
+    if name not in TUNABLE:
+        raise argparse.ArgumentTypeError(f"{name} is not one of {', '.join(TUNABLE)}")
+    return name, float(value) if "." in value else int(value)
+
+def board_size(text):
+    cols, _, rows = text.lower().partition("x")
+    try:
+        Board(int(cols), int(rows))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"bad board size {text!r}: {e}")
+    return int(cols), int(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play snake policies against fixed seed sets on every core")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--difficulty", type=int, action="append", choices=sorted(DIFFICULTIES),
+                        help="difficulty to play (repeatable; default all)")
+    parser.add_argument("--games", type=int, default=10000, help="seeds per difficulty")
+    parser.add_argument("--first-seed", type=int, default=0, help="seeds are first-seed .. first-seed+games-1")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk", type=int, default=CHUNK, help="games per task")
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS)
+    parser.add_argument("--set", type=override, action="append", default=[], metavar="NAME=VALUE",
+                        help=f"override a balance constant ({', '.join(TUNABLE)})")
+    parser.add_argument("--out", metavar="FILE", help="append one JSON line per game to FILE")
+    parser.add_argument("--board", type=board_size, metavar="COLSxROWS", help="board size (default: the window's)")
+    args = parser.parse_args(argv)
+
+    difficulties = args.difficulty or sorted(DIFFICULTIES)
+    seeds = range(args.first_seed, args.first_seed + args.games)
+    out = open(args.out, "a") if args.out else None
+    try:
+        report = run(args.policy, difficulties, seeds, args.workers, args.chunk, args.max_ticks,
+                     dict(args.set), out, sys.stderr, args.board)
+    finally:
+        if out is not None:
+            out.close()
+    board = list(args.board or (COLS, ROWS))
+    print(json.dumps({"policy": args.policy, "overrides": dict(args.set), "board": board,
+                      "difficulties": report}, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())